@@ -0,0 +1,49 @@
+from airflow.sdk import dag, task
+from airflow.exceptions import AirflowSkipException
+from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
+from datetime import datetime
+from include.camara.assets import DESPESAS_PARTICOES, DESPESAS_WAREHOUSE, fatias_dos_eventos
+from include.camara.warehouse import sql_carga
+
+SNOWFLAKE_CONN_ID = "snowflake_default"
+
+
+def executar_sql(comandos):
+    """Executa os comandos no Snowflake, em ordem, numa sessão."""
+    SnowflakeHook(snowflake_conn_id=SNOWFLAKE_CONN_ID).run(comandos)
+
+
+@dag(
+    # Disparada pelas partições gravadas por full_despesas e incremental_despesas (alias de assets)
+    schedule=[DESPESAS_PARTICOES],
+    start_date=datetime(2023, 1, 1),
+    catchup=False,
+    tags=['deputados', 'snowflake'],
+)
+def carga_despesas():
+
+    @task
+    def get_fatias(**context):
+        """Partições (ano, mes) dos eventos de asset que dispararam a execução, com os arquivos a ler."""
+        fatias = fatias_dos_eventos(context['triggering_asset_events'])
+        for fatia in fatias:
+            arquivos = f"{len(fatia['arquivos'])} arquivos" if fatia['arquivos'] else "partição inteira"
+            print(f"{fatia['ano']}-{fatia['mes']:02d}: {arquivos}")
+        return fatias
+
+    @task(outlets=[DESPESAS_WAREHOUSE])
+    def load_fatias(fatias, **context):
+        """MERGE no Snowflake só das fatias alteradas; avisa o dbt quais partições foram carregadas."""
+        comandos = sql_carga(fatias)
+        if not comandos:
+            # Sem partições não há evento no warehouse e o dbt não roda
+            raise AirflowSkipException("Nenhuma partição alterada")
+        executar_sql(comandos)
+        particoes = [[fatia['ano'], fatia['mes']] for fatia in fatias]
+        # O dbt recebe as partições no extra do evento
+        context['outlet_events'][DESPESAS_WAREHOUSE].extra = {'particoes': particoes}
+        return {'particoes': particoes, 'comandos': len(comandos)}
+
+    load_fatias(get_fatias())
+
+carga_despesas()
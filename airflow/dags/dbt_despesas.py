@@ -0,0 +1,64 @@
+from airflow.sdk import dag, task
+from airflow.exceptions import AirflowFailException
+import json
+import os
+import shutil
+import subprocess
+from datetime import datetime
+from include.camara.assets import DESPESAS_WAREHOUSE, particoes_dos_eventos
+
+DBT_BIN = os.getenv('CAMARA_DBT_BIN', 'dbt')
+DBT_PROJECT_DIR = os.getenv(
+    'CAMARA_DBT_PROJECT_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'dbt_camara')
+)
+# Só os modelos que dependem das despesas carregadas
+DBT_SELECT = "source:camara_raw.despesas+"
+
+
+def verificar_dbt():
+    """Falha sem retentativas se o binário do dbt ou o projeto não estão disponíveis no worker:
+    a imagem do Astro não traz nenhum dos dois (o projeto fica fora de airflow/)."""
+    if shutil.which(DBT_BIN) is None:
+        raise AirflowFailException(
+            f"Binário do dbt não encontrado: {DBT_BIN!r}. Instale o dbt-snowflake no worker "
+            "ou aponte CAMARA_DBT_BIN para ele."
+        )
+    if not os.path.isfile(os.path.join(DBT_PROJECT_DIR, 'dbt_project.yml')):
+        raise AirflowFailException(
+            f"Projeto dbt não encontrado em {os.path.abspath(DBT_PROJECT_DIR)}. Copie dbt_camara/ para o worker "
+            "ou aponte CAMARA_DBT_PROJECT_DIR para ele."
+        )
+
+
+@dag(
+    # Disparada pela carga das partições alteradas no Snowflake (carga_despesas)
+    schedule=[DESPESAS_WAREHOUSE],
+    start_date=datetime(2023, 1, 1),
+    catchup=False,
+    tags=['deputados', 'dbt'],
+)
+def dbt_despesas():
+
+    @task
+    def dbt_build(**context):
+        """dbt build dos modelos de despesas, com as partições carregadas na var `particoes`
+        (vazia quando a carga não informa as partições, como o load_stage da pipeline_camara):
+        o fct_despesas incremental reprocessa só essas partições."""
+        verificar_dbt()
+        particoes = particoes_dos_eventos(context['triggering_asset_events'])
+        comando = [
+            DBT_BIN, 'build',
+            '--project-dir', DBT_PROJECT_DIR,
+            '--select', DBT_SELECT,
+            '--vars', json.dumps({'particoes': particoes}),
+        ]
+        print(f"Executando: {' '.join(comando)}")
+        resultado = subprocess.run(comando, capture_output=True, text=True)
+        print(resultado.stdout)
+        print(resultado.stderr)
+        resultado.check_returncode()
+        return {'particoes': particoes, 'saida': resultado.stdout[-1000:]}
+
+    dbt_build()
+
+dbt_despesas()
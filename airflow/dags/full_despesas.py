@@ -1,16 +1,32 @@
 from airflow.sdk import dag, task
 from airflow.providers.amazon.aws.transfers.http_to_s3 import HttpToS3Operator
 import json
-import requests
 from datetime import datetime, timedelta
 import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from include.camara.client import API_BASE_URL, PAGINAS_SIMULTANEAS, get_client
+from include.camara.metadados import get_metadados
+from include.camara.assets import DESPESAS_PARTICOES, emitir_particoes
+from include.camara.dataset import PREFIXO_S3, DatasetSink, filesystem_airflow
+from include.camara.manifesto import Manifesto
+from include.camara.dedup import IndiceDespesas, indice_do_dataset
+from include.camara.landing import FORMATO_LANDING, aterrissar, chave_landing
+from include.camara.mandatos import log_poda, meses_ativos, podar_consultas
+from include.camara.planner import Consulta, executar_consulta
+from include.camara.resultados import caminho_execucao, ler_ids, publicar_ids, publicar_resultados
 
 AWS_CONN_ID = "aws_s3_conn"
 BUCKET_NAME = "learnsnowflakedbt-heitor"
 HTTP_CONN_ID = "http_camara_conn"
-ENDPOINT_DEPUTADOS = "https://dadosabertos.camara.leg.br/api/v2/deputados"
-ENDPOINT_DEPUTADOS_LEGISLATURA = "https://dadosabertos.camara.leg.br/api/v2/deputados?idLegislatura={legislatura_id}"
-ENDPOINT_DESPESAS = "https://dadosabertos.camara.leg.br/api/v2/deputados/{deputado_id}/despesas"
+DATASET_DESPESAS = f"{BUCKET_NAME}/{PREFIXO_S3}"
+# Landing store for per-unit results and id lists (XCom only carries the path and the counters)
+LANDING_EXECUCOES = f"{BUCKET_NAME}/camara"
+ENDPOINT_DEPUTADOS = f"{API_BASE_URL}/deputados"
+ENDPOINT_DEPUTADOS_LEGISLATURA = f"{API_BASE_URL}/deputados?idLegislatura={{legislatura_id}}"
+ENDPOINT_DESPESAS = f"{API_BASE_URL}/deputados/{{deputado_id}}/despesas"
+# Defaults for the shards and threadsPorTarefa params
+SHARDS = 8
+THREADS_POR_TAREFA = 8
 
 @dag(
     schedule='@daily', 
@@ -21,21 +37,34 @@ ENDPOINT_DESPESAS = "https://dadosabertos.camara.leg.br/api/v2/deputados/{deputa
         'anoInicio': 2020,
         'anoFim': 2024,
         'cargaFull': False,
-        'idLegislatura': None  # New parameter for legislature
+        'idLegislatura': None,  # New parameter for legislature
+        'shards': SHARDS,  # deputados split into this many mapped tasks per year (or month)
+        'unidadePorMes': False,  # full load: one mapped task per (year, month, shard) instead of (year, shard)
+        'threadsPorTarefa': THREADS_POR_TAREFA  # concurrent queries inside each mapped task
     }
 )
 def full_despesas():
 
-    load_full_deputados = HttpToS3Operator(
-        task_id="load_full_deputados",
-        endpoint="deputados",
-        method="GET",
-        s3_key="camara/deputados/deputados.json",
-        http_conn_id=HTTP_CONN_ID,
-        s3_bucket=BUCKET_NAME,
-        aws_conn_id=AWS_CONN_ID,
-        replace=True
-    )
+    if FORMATO_LANDING == 'json':
+        load_full_deputados = HttpToS3Operator(
+            task_id="load_full_deputados",
+            endpoint="deputados",
+            method="GET",
+            s3_key="camara/deputados/deputados.json",
+            http_conn_id=HTTP_CONN_ID,
+            s3_bucket=BUCKET_NAME,
+            aws_conn_id=AWS_CONN_ID,
+            replace=True
+        )
+    else:
+        @task(task_id="load_full_deputados")
+        def load_full_deputados_ndjson():
+            # One line per deputado, without the "dados" envelope
+            return aterrissar(get_client().fetch_all_pages("deputados"),
+                              f"{BUCKET_NAME}/{chave_landing('camara/deputados/ndjson/deputados')}",
+                              filesystem=filesystem_airflow(AWS_CONN_ID))
+
+        load_full_deputados = load_full_deputados_ndjson()
 
     @task
     def get_deputados_ids(**context):
@@ -48,22 +77,23 @@ def full_despesas():
         if id_legislatura:
             # Get deputados from specific legislature
             print(f"Loading deputados from legislature {id_legislatura}")
-            response = requests.get(ENDPOINT_DEPUTADOS_LEGISLATURA.format(legislatura_id=id_legislatura))
-            data = response.json()
-            deputados_ids = [deputado["id"] for deputado in data["dados"]]
+            deputados_ids = get_metadados().deputados_ids(id_legislatura)
             print(f"Found {len(deputados_ids)} deputados in legislature {id_legislatura}")
         else:
             # Get current deputados (default behavior)
             print("Loading current deputados")
-            response = requests.get(ENDPOINT_DEPUTADOS)
-            data = response.json()
-            deputados_ids = [deputado["id"] for deputado in data["dados"]]
+            deputados_ids = get_metadados().deputados_ids()
             print(f"Found {len(deputados_ids)} current deputados")
         
-        return {
-            'deputados_ids': deputados_ids,
-            'legislatura': id_legislatura
-        }
+        get_metadados().log_estatisticas()
+        
+        # The list goes to the landing store; every mapped unit reads it back from there
+        return publicar_ids(
+            deputados_ids,
+            caminho_execucao(LANDING_EXECUCOES, context['run_id'], 'deputados_ids'),
+            filesystem=filesystem_airflow(AWS_CONN_ID),
+            legislatura=id_legislatura
+        )
 
     @task
     def load_deputados_by_legislature(**context):
@@ -71,6 +101,17 @@ def full_despesas():
         params = context.get('params', {})
         id_legislatura = params.get('idLegislatura', None)
         
+        if FORMATO_LANDING == 'ndjson':
+            # One line per deputado (compressed NDJSON), without the "dados" envelope
+            if id_legislatura:
+                deputados = get_client().fetch_all_pages("deputados", {'idLegislatura': id_legislatura})
+                prefixo = f"camara/deputados/ndjson/historico/deputadosLegislatura{id_legislatura}"
+            else:
+                deputados = get_client().fetch_all_pages("deputados")
+                prefixo = "camara/deputados/ndjson/deputadosAtual"
+            return aterrissar(deputados, f"{BUCKET_NAME}/{chave_landing(prefixo)}",
+                              filesystem=filesystem_airflow(AWS_CONN_ID))
+
         if id_legislatura:
             # Load specific legislature deputados
             operator = HttpToS3Operator(
@@ -120,107 +161,150 @@ def full_despesas():
             return [logical_date.year]
 
     @task
-    def process_year_despesas(year, deputados_data, **context):
-        """Process despesas for all deputados for a specific year"""
+    def generate_units(years, **context):
+        """Units (year, month, shard) to map the despesas fetch over.
+
+        The deputados are split in `shards` groups (deputado_id % shards, so a
+        deputado always lands in the same shard); in full load each unit is a
+        whole year (yearly queries, split by month by the planner if needed)
+        unless `unidadePorMes`, which maps one unit per month. Incremental mode
+        maps only the logical month.
+        """
         params = context.get('params', {})
         carga_full = params.get('cargaFull', False)
-        id_legislatura = params.get('idLegislatura', None)
-        
-        deputados_list = deputados_data['deputados_ids']
+        shards = max(1, int(params.get('shards', SHARDS)))
+        logical_date = context['logical_date']
+        hoje = datetime.now()
+
+        units = []
+        for year in years:
+            if not carga_full:
+                months = [logical_date.month] if year == logical_date.year else []
+            elif params.get('unidadePorMes', False):
+                months = [mes for mes in range(1, 13) if (year, mes) <= (hoje.year, hoje.month)]
+            else:
+                months = [None]
+            units += [{'year': year, 'month': month, 'shard': shard, 'shards': shards}
+                      for month in months for shard in range(shards)]
+        print(f"{len(units)} units (year, month, shard) to process")
+        return units
+
+    @task(outlets=[DESPESAS_PARTICOES])
+    def process_unit_despesas(unit, deputados_data, **context):
+        """Process despesas for one shard of deputados in a year (or month)"""
+        params = context.get('params', {})
+        carga_full = params.get('cargaFull', False)
+        threads = max(1, int(params.get('threadsPorTarefa', THREADS_POR_TAREFA)))
+        year, month, shard, shards = unit['year'], unit['month'], unit['shard'], unit['shards']
+
         legislatura = deputados_data['legislatura']
-        
-        print(f"Processing year {year} with {len(deputados_list)} deputados from {'legislature ' + str(legislatura) if legislatura else 'current mandate'}")
-        
-        # Determine months to process
+        filesystem = filesystem_airflow(AWS_CONN_ID)
+        deputados_list = [dep_id for dep_id in ler_ids(deputados_data, filesystem) if dep_id % shards == shard]
+        origem = f"full{year}" + (f"m{month:02d}" if month else '') + f"s{shard:02d}de{shards:02d}"
+
+        print(f"Processing {origem}: {len(deputados_list)} deputados from "
+              f"{'legislature ' + str(legislatura) if legislatura else 'current mandate'}, {threads} threads")
+
+        # Full load asks for each deputado's whole year (or the unit's month); the planner pages and splits it if needed
+        consultas = [Consulta(deputado_id, year, month) for deputado_id in deputados_list]
+
+        # Connection pool sized to the concurrent queries (each one fetches up to PAGINAS_SIMULTANEAS pages)
+        client = get_client(pool_maxsize=threads * PAGINAS_SIMULTANEAS)
+        # The worker process may be reused: metrics are per task
+        client.metricas.zerar()
+
+        # In a full load, months outside each deputado's mandate (substitutes, early leavers) are not queried
+        podadas = []
         if carga_full:
-            months = list(range(1, 13))  # All months
-        else:
-            # Incremental mode - current month only
-            logical_date = context['logical_date']
-            if year == logical_date.year:
-                months = [logical_date.month]
-            else:
-                months = []  # Skip other years in incremental mode
-        
+            hoje = datetime.now()
+            meses = [(year, mes) for mes in ([month] if month else range(1, 13)) if (year, mes) <= (hoje.year, hoje.month)]
+            consultas, podadas = podar_consultas(consultas, meses_ativos(deputados_list, meses, legislatura))
+            client.metricas.registrar_poda(len(podadas))
+            log_poda(origem, consultas, podadas)
         results = []
-        
-        for deputado_id in deputados_list:
-            for mes in months:
+
+        def baixar(consulta):
+            despesas = executar_consulta(client, consulta)
+            for despesa in despesas:
+                despesa['deputado_id'] = consulta.deputado_id
+                despesa['legislatura_id'] = legislatura
+            return despesas
+
+        # One file per ano=/mes= partition of the dataset for the whole shard (a single one with monthly units),
+        # only with the (deputado, month) pairs whose hash changed since the last load, minus despesas already written.
+        # Queries run in parallel; despesas are written from this thread as they arrive
+        manifesto = Manifesto(DATASET_DESPESAS, filesystem=filesystem, shard=f"s{shard:02d}de{shards:02d}")
+        # The worker-local SQLite syncs with the segments next to the dataset: every worker sees what was published
+        indice = IndiceDespesas(indice_do_dataset(DATASET_DESPESAS), base=DATASET_DESPESAS, filesystem=filesystem)
+        with DatasetSink(DATASET_DESPESAS, origem=origem, filesystem=filesystem, manifesto=manifesto,
+                         indice=indice) as sink, ThreadPoolExecutor(max_workers=threads) as executor:
+            futuros = {executor.submit(baixar, consulta): consulta for consulta in consultas}
+            for futuro in as_completed(futuros):
+                consulta = futuros[futuro]
                 try:
-                    # Build S3 key with legislature info if available
-                    s3_key_prefix = f"camara/despesas/ano={year}/mes={mes:02d}"
-                    if legislatura:
-                        s3_key = f"{s3_key_prefix}/deputado={deputado_id}/despesas.json"
-                    else:
-                        s3_key = f"{s3_key_prefix}/deputado={deputado_id}/despesas.json"
-                    
-                    # Create and execute HttpToS3Operator
-                    operator = HttpToS3Operator(
-                        task_id=f"load_despesas_{deputado_id}_{year}_{mes:02d}",
-                        endpoint=f"deputados/{deputado_id}/despesas",
-                        method="GET",
-                        data={
-                            'ano': year,
-                            'mes': mes,
-                            'itens': 999,
-                            'ordem': 'DESC',
-                            'ordenarPor': 'ano'
-                        },
-                        s3_key=s3_key,
-                        http_conn_id=HTTP_CONN_ID,
-                        s3_bucket=BUCKET_NAME,
-                        aws_conn_id=AWS_CONN_ID,
-                        replace=True
-                    )
-                    
-                    result = operator.execute(context=context)
+                    despesas = futuro.result()
+                    sink.escrever(despesas)
                     results.append({
-                        'deputado_id': deputado_id,
+                        'deputado_id': consulta.deputado_id,
                         'ano': year,
-                        'mes': mes,
+                        'mes': consulta.mes,
                         'legislatura': legislatura,
                         'status': 'success',
-                        'result': result
+                        'linhas': len(despesas)
                     })
-                    
+
                 except Exception as e:
-                    print(f"Error processing deputado {deputado_id} for {year}-{mes:02d}: {str(e)}")
+                    periodo = f"{year}-{consulta.mes:02d}" if consulta.mes else str(year)
+                    print(f"Error processing deputado {consulta.deputado_id} for {periodo}: {str(e)}")
                     results.append({
-                        'deputado_id': deputado_id,
+                        'deputado_id': consulta.deputado_id,
                         'ano': year,
-                        'mes': mes,
+                        'mes': consulta.mes,
                         'legislatura': legislatura,
                         'status': 'error',
                         'error': str(e)
                     })
-        
-        success_count = len([r for r in results if r['status'] == 'success'])
-        error_count = len([r for r in results if r['status'] == 'error'])
-        print(f"Year {year} completed: {success_count} successes, {error_count} errors")
-        
-        return {
-            'year': year,
-            'legislatura': legislatura,
-            'total_processed': len(results),
-            'successes': success_count,
-            'errors': error_count,
-            'results': results
-        }
+
+        client.log_estatisticas()
+        manifesto.log_estatisticas()
+        indice.log_estatisticas()
+        client.metricas.exportar(origem)
+
+        # One entry per query goes to the landing store; XCom keeps the pointer and the counters
+        resumo = publicar_resultados(
+            results,
+            caminho_execucao(LANDING_EXECUCOES, context['run_id'], origem),
+            filesystem=filesystem,
+            year=year,
+            month=month,
+            shard=shard,
+            legislatura=legislatura,
+            podadas=len(podadas),
+            particoes=[[ano, mes] for ano, mes in manifesto.particoes_alteradas]
+        )
+        # One asset event per changed partition triggers the warehouse load (carga_despesas), which reads only
+        # the file this unit published in each partition
+        emitir_particoes(context['outlet_events'], manifesto.particoes_alteradas, DATASET_DESPESAS, origem,
+                         arquivos=sink.arquivos)
+        print(f"{origem} completed: {resumo['successes']} successes, {resumo['errors']} errors")
+        return resumo
 
     # Task flow
     load_deputados_task = load_deputados_by_legislature()
     deputados_data = get_deputados_ids()
     years = generate_years()
-    
-    # Process each year using expand - deputados_data will be broadcast to all years
-    year_results = process_year_despesas.partial(
+    units = generate_units(years)
+
+    # Each (year, month, shard) unit is its own mapped task: the worker slots set the overall throughput.
+    # deputados_data is broadcast to all units
+    unit_results = process_unit_despesas.partial(
         deputados_data=deputados_data
     ).expand(
-        year=years
+        unit=units
     )
 
     # Dependencies
     load_deputados_task >> deputados_data
-    deputados_data >> [years, year_results]
+    deputados_data >> [years, unit_results]
 
 full_despesas()
\ No newline at end of file
@@ -2,23 +2,36 @@ from airflow.sdk import dag, task
 from airflow.providers.amazon.aws.transfers.http_to_s3 import HttpToS3Operator
 from datetime import datetime, timedelta
 import pandas as pd
-import requests
 import boto3
-from io import BytesIO
-from airflow.providers.amazon.aws.hooks.s3 import S3Hook
 from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from include.camara.client import API_BASE_URL, PAGINAS_SIMULTANEAS, ConsultaIncompleta, get_client
+from include.camara.metadados import get_metadados
+from include.camara.assets import DESPESAS_PARTICOES, emitir_particoes
+from include.camara.dataset import PREFIXO_S3, compactar, escrever_particoes, filesystem_airflow
+from include.camara.manifesto import Manifesto
+from include.camara.dedup import IndiceDespesas, indice_do_dataset
+from include.camara.planner import Consulta, executar_consulta
+from include.camara.sondagem import EstadoSondagem, sondar
 
 AWS_CONN_ID = "aws_s3_conn"
 BUCKET_NAME = "learnsnowflakedbt-heitor"
 HTTP_CONN_ID = "http_camara_conn"
-ENDPOINT_DEP_BASE = "https://dadosabertos.camara.leg.br/api/v2/deputados"
-ENDPOINT_DESPESAS = "https://dadosabertos.camara.leg.br/api/v2/deputados/{deputado_id}/despesas"
+DATASET_DESPESAS = f"{BUCKET_NAME}/{PREFIXO_S3}"
+ENDPOINT_DEP_BASE = f"{API_BASE_URL}/deputados"
+ENDPOINT_DESPESAS = f"{API_BASE_URL}/deputados/{{deputado_id}}/despesas"
+# Requisições simultâneas na sondagem e nas cargas completas
+THREADS = 8
 
 @dag(
     schedule='@daily',
     start_date=datetime(2023, 1, 1),
     catchup=False,
     tags=['deputados', 'incremental'],
+    params={
+        'sondagem': True  # False: carga completa de todos os deputados, sem sondar antes
+    }
 )
 def incremental_despesas():
 
@@ -41,81 +54,135 @@ def incremental_despesas():
         """Obtém IDs dos deputados com mandato ativo."""
         data_inicio = f"{data_referencia['ano_atual']}-{data_referencia['mes_atual']:02d}-01"
         data_fim = f"{data_referencia['ano_atual']}-{data_referencia['mes_atual']:02d}-{data_referencia['dia_atual']:02d}"
-        url = f"{ENDPOINT_DEP_BASE}?itens=10000&dataInicio={data_inicio}&dataFim={data_fim}&ordem=ASC&ordenarPor=nome"
 
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise Exception(f"Erro ao buscar deputados: {url}")
+        metadados = get_metadados()
+        ids = metadados.deputados_ids(data_inicio=data_inicio, data_fim=data_fim)
+        if not ids:
+            raise Exception(f"Erro ao buscar deputados entre {data_inicio} e {data_fim}")
 
-        deputados = response.json()["dados"]
-        ids = [dep["id"] for dep in deputados]
         print(f"Encontrados {len(ids)} deputados em mandato ativo.")
+        metadados.log_estatisticas()
         return ids
 
     @task
-    def processa_despesas(dep_ids, data_referencia):
-        """Executa as chamadas para obter despesas dos deputados para os meses atual e anterior."""
+    def processa_despesas(dep_ids, data_referencia, **context):
+        """Sonda os meses atual e anterior de cada deputado e baixa por inteiro só os que mudaram."""
+        sondagem = context.get('params', {}).get('sondagem', True)
         
+        filesystem = filesystem_airflow(AWS_CONN_ID)
+        client = get_client(pool_maxsize=THREADS * PAGINAS_SIMULTANEAS)
+        # O processo do worker pode ser reaproveitado: as métricas são por tarefa
+        client.metricas.zerar()
+        # Hashes por (deputado, ano, mes): só o que mudou desde a última execução vai para o S3
+        manifesto = Manifesto(DATASET_DESPESAS, filesystem=filesystem)
+        # (deputado_id, codDocumento, hash) já gravados: duplicatas exatas não chegam ao Snowflake. O SQLite do
+        # worker importa os segmentos publicados ao lado do dataset, e os workers enxergam o que os outros gravaram
+        indice = IndiceDespesas(indice_do_dataset(DATASET_DESPESAS), base=DATASET_DESPESAS, filesystem=filesystem)
+        # (total, despesa mais recente) do ano e de cada mês de cada deputado na última carga completa
+        estado = EstadoSondagem(DATASET_DESPESAS, filesystem=filesystem)
         
-        s3_hook = S3Hook(aws_conn_id=AWS_CONN_ID)
-        
+        meses_por_ano = defaultdict(list)
         for ano, mes in [
             (data_referencia['ano_atual'], data_referencia['mes_atual']),
             (data_referencia['ano_anterior'], data_referencia['mes_anterior']),
         ]:
-            all_despesas = []
+            meses_por_ano[ano].append(mes)
+        
+        for ano, meses in meses_por_ano.items():
+            with ThreadPoolExecutor(max_workers=THREADS) as executor:
+                if sondagem:
+                    # Fase 1: uma requisição de 1 item por deputado para o ano todo; sem mudança desde a última
+                    # carga completa, o deputado é pulado
+                    sondas_ano = dict(zip(dep_ids, executor.map(lambda deputado_id: sondar(client, deputado_id, ano), dep_ids)))
+                    alterados = [
+                        deputado_id for deputado_id in dep_ids
+                        if sondas_ano[deputado_id] is None or estado.mudou(deputado_id, ano, None, sondas_ano[deputado_id])
+                    ]
+                    # Fase 2: o ano mudou (talvez num mês antigo): sonda cada mês da carga desses deputados
+                    unidades = [(deputado_id, mes) for deputado_id in alterados for mes in meses]
+                    sondas = dict(zip(unidades, executor.map(lambda unidade: sondar(client, unidade[0], ano, unidade[1]), unidades)))
+                    unidades = [
+                        unidade for unidade in unidades
+                        if sondas[unidade] is None or estado.mudou(unidade[0], ano, unidade[1], sondas[unidade])
+                    ]
+                else:
+                    sondas_ano = dict.fromkeys(dep_ids)
+                    alterados = list(dep_ids)
+                    unidades = [(deputado_id, mes) for deputado_id in dep_ids for mes in meses]
+                    sondas = dict.fromkeys(unidades)
+                print(f"{ano}: {len(alterados)} de {len(dep_ids)} deputados com mudança no ano, "
+                      f"{len(unidades)} meses (deputado, mes) a baixar dos meses {meses}")
+
+                # Fase 3: carga completa (paginada) dos meses alterados; se a sonda já trouxe o mês inteiro,
+                # não há o que pedir
+                def baixa(unidade):
+                    sonda = sondas[unidade]
+                    if sonda is not None and sonda['total'] <= len(sonda['dados']):
+                        return sonda['dados']
+                    return executar_consulta(client, Consulta(unidade[0], ano, unidade[1]))
+
+                futuros = {unidade: executor.submit(baixa, unidade) for unidade in unidades}
             
-            for deputado_id in dep_ids:
+            all_despesas = []
+            falhas = set()
+            for (deputado_id, mes), futuro in futuros.items():
                 try:
-                    url = ENDPOINT_DESPESAS.format(deputado_id=deputado_id)
-                    params = {
-                        'ano': ano,
-                        'mes': mes,
-                        'itens': 10000,
-                        'ordem': 'ASC',
-                        'ordenarPor': 'ano'
-                    }
-                    
-                    response = requests.get(url, params=params)
-                    if response.status_code == 200:
-                        data = response.json()
-                        if 'dados' in data and data['dados']:
-                            for despesa in data['dados']:
-                                despesa['deputado_id'] = deputado_id
-                            all_despesas.extend(data['dados'])
-                    else:
-                        print(f"Erro para deputado {deputado_id} em {mes}/{ano}: Status {response.status_code}")
-                        
-                except Exception as e:
+                    despesas = futuro.result()
+                except ConsultaIncompleta as e:
                     print(f"Erro para deputado {deputado_id} em {mes}/{ano}: {str(e)}")
+                    falhas.add(deputado_id)
+                    continue
+                for despesa in despesas:
+                    despesa['deputado_id'] = deputado_id
+                all_despesas.extend(despesas)
+                if sondas[(deputado_id, mes)] is not None:
+                    estado.registrar(deputado_id, ano, mes, sondas[(deputado_id, mes)])
+            for deputado_id in alterados:
+                if deputado_id not in falhas and sondas_ano[deputado_id] is not None:
+                    estado.registrar(deputado_id, ano, None, sondas_ano[deputado_id])
             
             if all_despesas:
-                # Consolida em DataFrame e salva como Parquet
-                df = pd.DataFrame(all_despesas).drop_duplicates(subset=['codDocumento', 'deputado_id'])
-                
-                # Salva em buffer de memória
-                buffer = BytesIO()
-                df.to_parquet(buffer, index=False)
-                buffer.seek(0)
-                
-                # Upload para S3 usando S3Hook
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                s3_key = f"camara/despesas/incremental/despesas-{ano}-{mes:02d}-{timestamp}.parquet"
-                s3_hook.load_bytes(
-                    bytes_data=buffer.getvalue(),
-                    key=s3_key,
-                    bucket_name=BUCKET_NAME,
-                    replace=True
+                # Grava nas partições ano=/mes= do dataset de despesas, com o schema tipado; o índice
+                # descarta as duplicatas exatas (do próprio lote ou de cargas anteriores) e registra as alteradas
+                arquivos = escrever_particoes(
+                    all_despesas, DATASET_DESPESAS, origem='incremental', filesystem=filesystem,
+                    manifesto=manifesto, indice=indice
                 )
                 
-                print(f"Salvo {len(all_despesas)} despesas em {s3_key}")
+                for arquivo in arquivos.values():
+                    print(f"Salvo {arquivo}")
+                if not arquivos:
+                    print(f"Despesas de {meses}/{ano} sem alterações, nada gravado")
             else:
-                print(f"Nenhuma despesa encontrada para {mes}/{ano}")
+                print(f"Nenhuma despesa a gravar para {meses}/{ano}")
+            # Só depois de publicados os arquivos: se a gravação falhar, os deputados são sondados como alterados de novo
+            estado.salvar()
+
+        client.log_estatisticas()
+        manifesto.log_estatisticas()
+        indice.log_estatisticas()
+        estado.log_estatisticas()
+        client.metricas.exportar('incremental')
+        # Partições alteradas: as únicas que a carga no Snowflake e o dbt precisam reprocessar
+        return [list(particao) for particao in manifesto.particoes_alteradas]
+
+    @task(outlets=[DESPESAS_PARTICOES])
+    def compacta_particoes(particoes, **context):
+        """Junta os arquivos diários das partições alteradas, mantendo a versão mais recente de cada despesa."""
+        resumos = compactar(
+            DATASET_DESPESAS,
+            filesystem=filesystem_airflow(AWS_CONN_ID),
+            particoes_filtro={tuple(particao) for particao in particoes},
+        )
+        print(f"{len(resumos)} partições compactadas")
+        # Depois da compactação, um evento de asset por partição alterada dispara a carga no Snowflake
+        emitir_particoes(context['outlet_events'], particoes, DATASET_DESPESAS, 'incremental')
 
 
     # Encadeamento da DAG
     data_referencia = get_data_referencia()
     deputados_ids = get_deputados_ids(data_referencia)
-    processa_despesas(dep_ids=deputados_ids, data_referencia=data_referencia)
+    particoes = processa_despesas(dep_ids=deputados_ids, data_referencia=data_referencia)
+    compacta_particoes(particoes)
 
 incremental_despesas()
@@ -2,10 +2,16 @@ from airflow.sdk import dag, task
 from airflow.providers.amazon.aws.transfers.http_to_s3 import HttpToS3Operator
 from airflow.providers.common.sql.operators.sql import SQLExecuteQueryOperator
 import json
-import requests
 import os
 from airflow.providers.amazon.aws.transfers.http_to_s3 import HttpToS3Operator
 from datetime import datetime, timedelta
+from include.camara.assets import DESPESAS_WAREHOUSE
+from include.camara.metadados import get_metadados
+from include.camara.client import get_client
+from include.camara.dataset import filesystem_airflow
+from include.camara.landing import FORMATO_LANDING, aterrissar, chave_json_despesas, chave_landing
+from include.camara.planner import Consulta, executar_consulta
+from include.camara.warehouse import CHAVE, COLUNAS
 
 AWS_CONN_ID = "aws_s3_conn"
 HTTP_CONN_ID = "http_camara_conn"
@@ -17,26 +23,32 @@ ENDPOINT_DESPESAS = "https://dadosabertos.camara.leg.br/api/v2/deputados/{deputa
 @dag(schedule=None, start_date=datetime(2020,1,1), catchup=False, tags=['deputados'])
 def pipeline_camara():
 
-	load_full_deputados = HttpToS3Operator(
-		task_id="load_full_deputados",
-	endpoint="deputados",
-	method="GET",
-	s3_key="camara/deputados/deputados.json",
-	http_conn_id=HTTP_CONN_ID,
-	s3_bucket=BUCKET_NAME,
-	aws_conn_id=AWS_CONN_ID,
-	replace=True
-	)
+	if FORMATO_LANDING == 'json':
+		load_full_deputados = HttpToS3Operator(
+			task_id="load_full_deputados",
+		endpoint="deputados",
+		method="GET",
+		s3_key="camara/deputados/deputados.json",
+		http_conn_id=HTTP_CONN_ID,
+		s3_bucket=BUCKET_NAME,
+		aws_conn_id=AWS_CONN_ID,
+		replace=True
+		)
+	else:
+		@task(task_id="load_full_deputados")
+		def load_full_deputados_ndjson():
+			# One line per deputado, without the "dados" envelope
+			deputados = get_client().fetch_all_pages("deputados")
+			return aterrissar(deputados, f"{BUCKET_NAME}/{chave_landing('camara/deputados/ndjson/deputados')}",
+							  filesystem=filesystem_airflow(AWS_CONN_ID))
+
+		load_full_deputados = load_full_deputados_ndjson()
 
 	@task
 	def get_deputados_ids():
 		
-		# Get data from the API
-		response = requests.get(ENDPOINT_DEPUTADOS)
-		data = response.json()
-		
-		# Extract IDs from the response
-		deputados_ids = [deputado["id"] for deputado in data["dados"]]
+		# Get current deputados IDs through the metadata cache
+		deputados_ids = get_metadados().deputados_ids()
 		
 		return deputados_ids[0:10]
 
@@ -50,6 +62,17 @@ def pipeline_camara():
 		ano_atual = logical_date.year
 		mes_atual = logical_date.month
 		
+		if FORMATO_LANDING == 'ndjson':
+			# Same despesas of the month, as compressed NDJSON with the deputado_id on each line
+			despesas = executar_consulta(get_client(), Consulta(deputado_id, ano_atual, mes_atual))
+			return aterrissar(
+				despesas,
+				f"{BUCKET_NAME}/" + chave_landing(
+					f"camara/despesas/ndjson/deputado_{deputado_id}/despesas_{ano_atual}_{mes_atual:02d}"),
+				extras={'deputado_id': deputado_id},
+				filesystem=filesystem_airflow(AWS_CONN_ID),
+			)
+
 		operator = HttpToS3Operator(
 			task_id=f"load_despesas_{deputado_id}",
 			endpoint=f"deputados/{deputado_id}/despesas",
@@ -61,7 +84,7 @@ def pipeline_camara():
 				'ordem': 'DESC',
 				'ordenarPor': 'ano'
 			},
-			s3_key=f"camara/despesas/deputado_{deputado_id}/despesas_{ano_atual}_{mes_atual:02d}.json",
+			s3_key=chave_json_despesas(deputado_id, ano_atual, mes_atual),
 			http_conn_id=HTTP_CONN_ID,
 			s3_bucket=BUCKET_NAME,
 			aws_conn_id=AWS_CONN_ID,
@@ -79,15 +102,20 @@ def pipeline_camara():
 
 	load_stage = SQLExecuteQueryOperator(
 	task_id="load_stage",
+	# Despesas loaded into Snowflake: triggers dbt (dbt_despesas), without a partition list
+	outlets=[DESPESAS_WAREHOUSE],
 	conn_id=SNOWFLAKE_CONN_ID,           
 	sql="sql/load_deputados.sql",  
 	params={
 		"database": "CAMARA",
-		"schema": "RAW"
+		"schema": "RAW",
+		"formato_landing": FORMATO_LANDING,
+		# Key and columns of the despesas MERGE, the same as carga_despesas (same table)
+		"chave": list(CHAVE),
+		"colunas": [list(coluna) for coluna in COLUNAS]
 	}
 )
-	a = load_full_deputados
-	b = load_stage
+	[load_full_deputados, load_despesas_tasks] >> load_stage
 
 	
 
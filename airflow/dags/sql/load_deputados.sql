@@ -3,6 +3,7 @@
 -- USE DATABASE CAMARA;
 -- USE SCHEMA RAW;
 
+{% if params.formato_landing == 'json' %}
 -- COPY INTO deputados
 COPY INTO CAMARA.RAW.DEPUTADOS_STAGE
 FROM @camara/deputados/deputados.json
@@ -20,58 +21,105 @@ FROM CAMARA.RAW.DEPUTADOS_STAGE,
 LATERAL FLATTEN(INPUT => DATA:dados) elemento;
 
 
+-- Só os JSON do HttpToS3Operator (chave_json_despesas): o mesmo prefixo guarda o dataset Parquet
+-- (camara/despesas/dataset) e o NDJSON (camara/despesas/ndjson), que não são desse formato
 COPY INTO CAMARA.RAW.DESPESAS_STAGE
 FROM @camara/despesas
+PATTERN = '(.*/)?deputado_[0-9]+/despesas_[0-9]{4}_[0-9]{2}[.]json'
 FILE_FORMAT = (TYPE = JSON);
 
 
 MERGE INTO CAMARA.RAW.DESPESAS AS target
 USING (
+    -- rn = 1: uma linha por despesa, pela mesma chave do ON (params.chave, a CHAVE de include/camara/warehouse.py);
+    -- as colunas (params.colunas) são as COLUNAS da carga_despesas, que grava na mesma tabela
+    SELECT linhas.*, ROW_NUMBER() OVER (
+        PARTITION BY {{ params.chave | join(', ') }}
+        ORDER BY data_documento DESC, cod_lote DESC
+    ) AS rn
+    FROM (
     SELECT
-        REGEXP_SUBSTR(METADATA$FILENAME, 'deputado=([0-9]+)', 1, 1, 'e', 1) AS deputado_id,
-        TRY_TO_NUMBER(elemento.value:codDocumento::STRING) AS cod_documento,
-        TRY_TO_NUMBER(elemento.value:ano::STRING) AS ano,
-        TRY_TO_NUMBER(elemento.value:mes::STRING) AS mes,
-        elemento.value:cnpjCpfFornecedor::STRING AS cnpj_fornecedor,
-        TRY_TO_NUMBER(elemento.value:codLote::STRING) AS cod_lote,
-        TO_DATE(LEFT(elemento.value:dataDocumento::STRING, 10), 'YYYY-MM-DD') AS data_documento,
-        elemento.value:nomeFornecedor::STRING AS nome_fornecedor,
-        elemento.value:numDocumento::STRING AS num_documento, -- MANTIDO COMO STRING
-        elemento.value:tipoDespesa::STRING AS tipo_despesa,
-        elemento.value:tipoDocumento::STRING AS tipo_documento,
-        elemento.value:urlDocumento::STRING AS url_documento,
-        TRY_TO_NUMBER(elemento.value:valorDocumento::STRING) AS valor_documento,
-        TRY_TO_NUMBER(elemento.value:valorLiquido::STRING) AS valor_liquido,
-        TRY_TO_NUMBER(elemento.value:valorGlosa::STRING) AS valor_glosa,
-        ROW_NUMBER() OVER (
-            PARTITION BY elemento.value:codDocumento::STRING
-            ORDER BY elemento.value:dataDocumento DESC
-        ) AS rn
-    FROM @camara/despesas/ (FILE_FORMAT => json_format),
+        {%- for origem, destino, tipo in params.colunas %}
+        {%- if origem == 'deputado_id' %}
+        -- O deputado só aparece no caminho: camara/despesas/deputado_{id}/despesas_YYYY_MM.json (chave_json_despesas)
+        TRY_CAST(REGEXP_SUBSTR(METADATA$FILENAME, 'deputado_([0-9]+)/', 1, 1, 'e', 1) AS {{ tipo }}) AS {{ destino }}{{ ',' if not loop.last }}
+        {%- else %}
+        TRY_CAST(elemento.value:{{ origem }}::STRING AS {{ tipo }}) AS {{ destino }}{{ ',' if not loop.last }}
+        {%- endif %}
+        {%- endfor %}
+    FROM @camara/despesas/ (
+        FILE_FORMAT => json_format,
+        PATTERN => '(.*/)?deputado_[0-9]+/despesas_[0-9]{4}_[0-9]{2}[.]json'
+    ),
     LATERAL FLATTEN(INPUT => PARSE_JSON($1):dados) elemento
+    ) linhas
 ) src
-ON target.cod_documento = src.cod_documento
+{% else %}
+-- NDJSON comprimido (include/camara/landing.py): um registro por linha, gzip ou zstd
+-- (COMPRESSION = AUTO), com o deputado_id nas despesas; não há envelope "dados" para abrir
+CREATE FILE FORMAT IF NOT EXISTS CAMARA.RAW.NDJSON_FORMAT
+    TYPE = JSON
+    COMPRESSION = AUTO
+    STRIP_OUTER_ARRAY = FALSE;
+
+-- COPY INTO deputados, com o instante da carga e a linha no arquivo: o stage acumula uma cópia da lista a cada
+-- arquivo novo, e a tabela DEPUTADOS fica com a versão mais recente de cada deputado
+ALTER TABLE CAMARA.RAW.DEPUTADOS_STAGE ADD COLUMN IF NOT EXISTS CARREGADO_EM TIMESTAMP_LTZ;
+ALTER TABLE CAMARA.RAW.DEPUTADOS_STAGE ADD COLUMN IF NOT EXISTS LINHA NUMBER;
+
+COPY INTO CAMARA.RAW.DEPUTADOS_STAGE (DATA, CARREGADO_EM, LINHA)
+FROM (
+    SELECT $1, METADATA$START_SCAN_TIME, METADATA$FILE_ROW_NUMBER
+    FROM @camara/deputados/ndjson/
+)
+PATTERN = 'deputados[.]ndjson[.](gz|zst)'
+FILE_FORMAT = (FORMAT_NAME = CAMARA.RAW.NDJSON_FORMAT);
+
+
+CREATE OR REPLACE TABLE CAMARA.RAW.DEPUTADOS AS
+SELECT
+    DATA:id::NUMBER        AS id,
+    DATA:nome::STRING      AS nome,
+    DATA:siglaPartido::STRING AS partido,
+    DATA:siglaUf::STRING   AS uf,
+    DATA:urlFoto::STRING   AS url_foto
+FROM CAMARA.RAW.DEPUTADOS_STAGE
+-- As linhas carregadas antes das colunas de carga (sem CARREGADO_EM) perdem para qualquer carga nova
+QUALIFY ROW_NUMBER() OVER (PARTITION BY DATA:id ORDER BY CARREGADO_EM DESC NULLS LAST, LINHA DESC NULLS LAST) = 1;
+
+
+-- Só os arquivos do mês carregado pela pipeline_camara (despesas_YYYY_MM de cada deputado), lidos direto
+-- do stage: o custo acompanha o mês, não o histórico, e a deduplicação (rn) fica restrita a essa fatia
+MERGE INTO CAMARA.RAW.DESPESAS AS target
+USING (
+    SELECT linhas.*, ROW_NUMBER() OVER (
+        PARTITION BY {{ params.chave | join(', ') }}
+        ORDER BY data_documento DESC, cod_lote DESC
+    ) AS rn
+    FROM (
+    SELECT
+        {%- for origem, destino, tipo in params.colunas %}
+        TRY_CAST($1:{{ origem }}::STRING AS {{ tipo }}) AS {{ destino }}{{ ',' if not loop.last }}
+        {%- endfor %}
+    FROM @camara/despesas/ndjson/ (
+        FILE_FORMAT => 'CAMARA.RAW.NDJSON_FORMAT',
+        PATTERN => '.*/despesas_{{ logical_date.year }}_{{ '%02d' % logical_date.month }}[.]ndjson[.](gz|zst)'
+    )
+    ) linhas
+) src
+{% endif %}
+-- A chave inclui ano e mes, como as partições do dataset e a carga_despesas
+ON {% for coluna in params.chave %}{{ 'AND ' if not loop.first }}target.{{ coluna }} = src.{{ coluna }} {% endfor %}
 WHEN MATCHED AND src.rn = 1 THEN UPDATE SET
-    deputado_id      = src.deputado_id,
-    ano              = src.ano,
-    mes              = src.mes,
-    cnpj_fornecedor  = src.cnpj_fornecedor,
-    cod_lote         = src.cod_lote,
-    data_documento   = src.data_documento,
-    nome_fornecedor  = src.nome_fornecedor,
-    num_documento    = src.num_documento,
-    tipo_despesa     = src.tipo_despesa,
-    tipo_documento   = src.tipo_documento,
-    url_documento    = src.url_documento,
-    valor_documento  = src.valor_documento,
-    valor_liquido    = src.valor_liquido,
-    valor_glosa      = src.valor_glosa
+    {%- for _, destino, _ in params.colunas if destino not in params.chave %}
+    {{ destino }} = src.{{ destino }}{{ ',' if not loop.last }}
+    {%- endfor %}
 WHEN NOT MATCHED AND src.rn = 1 THEN INSERT (
-    deputado_id, cod_documento, ano, mes, cnpj_fornecedor, cod_lote, data_documento,
-    nome_fornecedor, num_documento, tipo_despesa, tipo_documento, url_documento,
-    valor_documento, valor_liquido, valor_glosa
+    {%- for _, destino, _ in params.colunas %}
+    {{ destino }}{{ ',' if not loop.last }}
+    {%- endfor %}
 ) VALUES (
-    src.deputado_id, src.cod_documento, src.ano, src.mes, src.cnpj_fornecedor, src.cod_lote,
-    src.data_documento, src.nome_fornecedor, src.num_documento, src.tipo_despesa, src.tipo_documento,
-    src.url_documento, src.valor_documento, src.valor_liquido, src.valor_glosa
+    {%- for _, destino, _ in params.colunas %}
+    src.{{ destino }}{{ ',' if not loop.last }}
+    {%- endfor %}
 );
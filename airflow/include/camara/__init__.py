@@ -0,0 +1 @@
+"""Código compartilhado entre as DAGs e os scripts de ingestão da API da Câmara."""
@@ -0,0 +1,215 @@
+"""Ingestão das despesas pelos arquivos anuais da Câmara, em vez da API.
+
+A Câmara publica um arquivo por ano com todas as despesas da cota
+parlamentar (https://www.camara.leg.br/cotas/Ano-<ano>.csv.zip ou
+.json.zip). Carregar um ano pela API custa dezenas de milhares de
+requisições; o arquivo é um download só. `ler_arquivo_anual` lê o zip em
+streaming (sem descompactar em memória ou em disco) e converte cada linha
+para o formato das despesas da API, que seguem pelo mesmo DatasetSink
+(schema tipado, partições ano=/mes=, índice de duplicatas) que os produtores
+da API. `reconciliar` confere uma amostra de (deputado, ano, mes) contra a
+API: quantidade de despesas, soma do valor líquido e os codDocumento.
+"""
+import csv
+import hashlib
+import io
+import json
+import logging
+import random
+import zipfile
+from decimal import Decimal, InvalidOperation
+
+from include.camara.client import ConsultaIncompleta
+from include.camara.planner import Consulta, executar_consulta
+
+logger = logging.getLogger(__name__)
+
+URL_ARQUIVO_ANUAL = "https://www.camara.leg.br/cotas/Ano-{ano}.{formato}.zip"
+LOTE = 10_000
+AMOSTRA_PADRAO = 20
+
+# indTipoDocumento do arquivo -> tipoDocumento da API
+TIPOS_DOCUMENTO = {
+    0: "Nota Fiscal",
+    1: "Recibos/Outros",
+    2: "Documento de Despesa no Exterior",
+    4: "Nota Fiscal Eletrônica",
+}
+
+
+def _texto(valor):
+    return None if valor is None else str(valor).strip()
+
+
+def _inteiro(valor, padrao=None):
+    valor = _texto(valor)
+    if not valor:
+        return padrao
+    return int(float(valor.replace(',', '.')))
+
+
+def _valor(valor):
+    valor = _texto(valor)
+    if not valor:
+        return 0.0
+    if ',' in valor and '.' not in valor:
+        valor = valor.replace(',', '.')
+    return float(valor)
+
+
+def _data(valor):
+    valor = _texto(valor)
+    if not valor:
+        return None
+    return valor.replace(' ', 'T', 1) if 'T' not in valor else valor
+
+
+def para_despesa(linha):
+    """Uma linha do arquivo anual no formato de /deputados/{id}/despesas (mais
+    deputado_id e legislatura_id); None para linhas sem deputado (lideranças)."""
+    deputado_id = _inteiro(linha.get('ideCadastro'))
+    if deputado_id is None:
+        return None
+    cod_tipo = _inteiro(linha.get('indTipoDocumento'))
+    return {
+        'ano': _inteiro(linha.get('numAno')),
+        'mes': _inteiro(linha.get('numMes')),
+        'tipoDespesa': _texto(linha.get('txtDescricao')),
+        'codDocumento': _inteiro(linha.get('ideDocumento'), 0),
+        'tipoDocumento': TIPOS_DOCUMENTO.get(cod_tipo, _texto(linha.get('indTipoDocumento'))),
+        'codTipoDocumento': cod_tipo,
+        'dataDocumento': _data(linha.get('datEmissao')),
+        'numDocumento': _texto(linha.get('txtNumero')),
+        'valorDocumento': _valor(linha.get('vlrDocumento')),
+        'urlDocumento': _texto(linha.get('urlDocumento')) or None,
+        'nomeFornecedor': _texto(linha.get('txtFornecedor')),
+        'cnpjCpfFornecedor': _texto(linha.get('txtCNPJCPF')),
+        'valorLiquido': _valor(linha.get('vlrLiquido')),
+        'valorGlosa': _valor(linha.get('vlrGlosa')),
+        'numRessarcimento': _texto(linha.get('numRessarcimento')) or "",
+        'codLote': _inteiro(linha.get('numLote'), 0),
+        'parcela': _inteiro(linha.get('numParcela'), 0),
+        'deputado_id': deputado_id,
+        'legislatura_id': _inteiro(linha.get('codLegislatura')),
+    }
+
+
+def _objetos_json(texto, tamanho_bloco=1 << 20):
+    """Objetos do array "dados" de um JSON {"dados": [...]}, lidos em blocos."""
+    decodificador = json.JSONDecoder()
+    buffer = ''
+    while '[' not in buffer:
+        bloco = texto.read(tamanho_bloco)
+        if not bloco:
+            return
+        buffer += bloco
+    buffer = buffer[buffer.index('[') + 1:]
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith(']'):
+            return
+        try:
+            objeto, fim = decodificador.raw_decode(buffer)
+        except json.JSONDecodeError:
+            bloco = texto.read(tamanho_bloco)
+            if not bloco:
+                raise
+            buffer += bloco
+            continue
+        yield objeto
+        buffer = buffer[fim:]
+
+
+def ler_arquivo_anual(caminho):
+    """Despesas (formato da API) de um Ano-<ano>.csv.zip ou .json.zip, em streaming."""
+    with zipfile.ZipFile(caminho) as arquivo:
+        membros = [m for m in arquivo.namelist() if m.lower().endswith(('.csv', '.json'))]
+        if not membros:
+            raise ValueError(f"{caminho} não contém um .csv ou .json")
+        for membro in membros:
+            with arquivo.open(membro) as bruto:
+                texto = io.TextIOWrapper(bruto, encoding='utf-8-sig', newline='')
+                linhas = (csv.DictReader(texto, delimiter=';') if membro.lower().endswith('.csv')
+                          else _objetos_json(texto))
+                for linha in linhas:
+                    despesa = para_despesa(linha)
+                    if despesa is not None:
+                        yield despesa
+
+
+def _assinatura(cod_documento):
+    return int.from_bytes(hashlib.blake2b(str(cod_documento).encode(), digest_size=8).digest(), 'big')
+
+
+class ResumoUnidades:
+    """Por (deputado_id, ano, mes): despesas, soma do valor líquido e uma
+    assinatura dos codDocumento que não depende da ordem (soma de hashes)."""
+
+    def __init__(self):
+        self.unidades = {}
+
+    def adicionar(self, despesas):
+        for despesa in despesas:
+            chave = (despesa['deputado_id'], despesa['ano'], despesa['mes'])
+            linhas, soma, assinatura = self.unidades.get(chave, (0, Decimal(0), 0))
+            self.unidades[chave] = (linhas + 1, soma + _decimal(despesa['valorLiquido']),
+                                    (assinatura + _assinatura(despesa['codDocumento'])) % (1 << 64))
+
+    def __len__(self):
+        return len(self.unidades)
+
+
+def _decimal(valor):
+    try:
+        return Decimal(str(valor)).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError):
+        return Decimal(0)
+
+
+def ingerir_arquivo_anual(caminho, sink, lote=LOTE):
+    """Grava as despesas do arquivo no sink em lotes; devolve o ResumoUnidades lido."""
+    resumo = ResumoUnidades()
+    buffer = []
+    for despesa in ler_arquivo_anual(caminho):
+        buffer.append(despesa)
+        if len(buffer) >= lote:
+            resumo.adicionar(buffer)
+            sink.escrever(buffer)
+            buffer = []
+    resumo.adicionar(buffer)
+    sink.escrever(buffer)
+    logger.info(f"{caminho}: {sum(u[0] for u in resumo.unidades.values())} despesas de {len(resumo)} "
+                f"unidades (deputado, ano, mes) lidas")
+    return resumo
+
+
+def reconciliar(resumo, client, amostra=AMOSTRA_PADRAO, seed=None):
+    """Compara uma amostra das unidades do arquivo com a API (uma consulta mensal
+    por unidade). Devolve as divergências: [{unidade, arquivo, api}]."""
+    unidades = sorted(resumo.unidades)
+    escolhidas = random.Random(seed).sample(unidades, min(amostra, len(unidades)))
+    divergencias = []
+    for deputado_id, ano, mes in escolhidas:
+        try:
+            despesas = executar_consulta(client, Consulta(deputado_id, ano, mes))
+        except ConsultaIncompleta as e:
+            logger.warning(f"Reconciliação: {e}; unidade ignorada")
+            continue
+        api = ResumoUnidades()
+        api.adicionar({**d, 'deputado_id': deputado_id} for d in despesas)
+        esperado = resumo.unidades[(deputado_id, ano, mes)]
+        obtido = api.unidades.get((deputado_id, ano, mes), (0, Decimal(0), 0))
+        if esperado != obtido:
+            divergencias.append({
+                'unidade': (deputado_id, ano, mes),
+                'arquivo': {'despesas': esperado[0], 'valor_liquido': str(esperado[1])},
+                'api': {'despesas': obtido[0], 'valor_liquido': str(obtido[1])},
+            })
+    conferidas = len(escolhidas)
+    if divergencias:
+        for divergencia in divergencias:
+            logger.warning(f"Reconciliação: unidade {divergencia['unidade']} diverge da API: "
+                           f"arquivo {divergencia['arquivo']}, API {divergencia['api']}")
+    logger.info(f"Reconciliação: {conferidas - len(divergencias)} de {conferidas} unidades iguais à API "
+                f"(despesas, valor líquido e codDocumento)")
+    return divergencias
@@ -0,0 +1,77 @@
+"""Assets do Airflow entre o landing, a carga no warehouse e o dbt.
+
+Cada partição ano=/mes= do dataset de despesas gravada por uma DAG produtora
+(full_despesas, incremental_despesas) vira um evento de asset
+(`s3://<dataset>/ano=YYYY/mes=MM`) emitido pelo alias DESPESAS_PARTICOES,
+com ano, mes, origem e, quando o produtor os conhece, os arquivos publicados
+(relativos ao dataset) no extra. A DAG carga_despesas é agendada pelo alias:
+só roda quando chega alguma partição nova e lê as fatias a carregar dos
+eventos que a dispararam (`fatias_dos_eventos`). Depois da carga ela emite
+DESPESAS_WAREHOUSE com as partições no extra, que dispara o dbt.
+
+Uma execução produtora sem partições alteradas não emite nada, e nada roda
+depois dela.
+"""
+import posixpath
+
+from airflow.sdk import Asset, AssetAlias
+
+DESPESAS_PARTICOES = AssetAlias("camara_despesas_particoes")
+DESPESAS_WAREHOUSE = Asset(name="camara_raw_despesas", uri="snowflake://camara/raw/despesas")
+# Acima disso a fatia lê a partição inteira: a lista não vale o tamanho na XCom
+MAX_ARQUIVOS_FATIA = 50
+
+
+def uri_particao(base, ano, mes):
+    """URI do asset de uma partição do dataset (base sem esquema: 'bucket/prefixo')."""
+    return f"s3://{base}/ano={int(ano)}/mes={int(mes):02d}"
+
+
+def emitir_particoes(outlet_events, particoes, base, origem, arquivos=None):
+    """Emite pelo alias um evento por partição (ano, mes) gravada; devolve quantos.
+
+    arquivos: {(ano, mes): caminho} publicados (p.ex. DatasetSink.arquivos); com
+    ele, só as partições com arquivo são emitidas, com o caminho no extra.
+    """
+    particoes = sorted({(int(ano), int(mes)) for ano, mes in particoes})
+    if arquivos is not None:
+        particoes = [particao for particao in particoes if particao in arquivos]
+    for ano, mes in particoes:
+        extra = {'ano': ano, 'mes': mes, 'origem': origem}
+        if arquivos is not None:
+            extra['arquivos'] = [posixpath.relpath(arquivos[(ano, mes)], base)]
+        outlet_events[DESPESAS_PARTICOES].add(Asset(uri_particao(base, ano, mes)), extra=extra)
+    return len(particoes)
+
+
+def particoes_dos_eventos(triggering_asset_events):
+    """[[ano, mes]] (sem repetição, em ordem) dos eventos que dispararam a execução,
+    pelo extra de cada evento ('ano'/'mes' ou 'particoes')."""
+    particoes = set()
+    for eventos in triggering_asset_events.values():
+        for evento in eventos:
+            extra = evento.extra or {}
+            if 'ano' in extra and 'mes' in extra:
+                particoes.add((int(extra['ano']), int(extra['mes'])))
+            particoes.update((int(ano), int(mes)) for ano, mes in extra.get('particoes', []))
+    return [list(particao) for particao in sorted(particoes)]
+
+
+def fatias_dos_eventos(triggering_asset_events, max_arquivos=MAX_ARQUIVOS_FATIA):
+    """[{'ano', 'mes', 'arquivos'}] a carregar, em ordem: os arquivos listados nos eventos
+    de cada partição, ou None (a partição inteira) se algum evento não os lista."""
+    arquivos = {}
+    for eventos in triggering_asset_events.values():
+        for evento in eventos:
+            extra = evento.extra or {}
+            if 'ano' not in extra or 'mes' not in extra:
+                continue
+            particao = (int(extra['ano']), int(extra['mes']))
+            if 'arquivos' not in extra:
+                arquivos[particao] = None
+            elif arquivos.get(particao, ()) is not None:
+                arquivos[particao] = sorted(set(arquivos.get(particao, [])) | set(extra['arquivos']))
+    return [
+        {'ano': ano, 'mes': mes, 'arquivos': lista if lista is not None and len(lista) <= max_arquivos else None}
+        for (ano, mes), lista in sorted(arquivos.items())
+    ]
@@ -0,0 +1,172 @@
+"""Checkpoint local (SQLite) da extração de despesas.
+
+Cada unidade concluída (legislatura, deputado, ano, mes) é gravada com o
+número de linhas, o hash do conteúdo e as próprias despesas (JSON comprimido),
+para que uma execução interrompida possa ser retomada baixando só as
+unidades que faltam e ainda assim gerar o arquivo completo da legislatura.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from collections import defaultdict
+from datetime import datetime
+
+CHECKPOINT_PADRAO = "../data/despesas/checkpoint.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS unidades (
+    legislatura INTEGER NOT NULL,
+    deputado_id INTEGER NOT NULL,
+    ano INTEGER NOT NULL,
+    mes INTEGER NOT NULL,
+    linhas INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    concluido_em TEXT NOT NULL,
+    PRIMARY KEY (legislatura, deputado_id, ano, mes)
+);
+CREATE TABLE IF NOT EXISTS legislaturas (
+    legislatura INTEGER PRIMARY KEY,
+    unidades_previstas INTEGER NOT NULL,
+    arquivo TEXT,
+    finalizada_em TEXT
+);
+"""
+
+
+def hash_payload(despesas):
+    """Hash estável de uma lista de despesas (independe da ordem das chaves)."""
+    conteudo = json.dumps(despesas, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+class CheckpointStore:
+    """Unidades concluídas da extração, compartilháveis entre threads e processos."""
+
+    def __init__(self, path=CHECKPOINT_PADRAO):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def registrar_plano(self, legislatura, unidades_previstas):
+        """Guarda quantas unidades a legislatura tem, para o relatório de status."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO legislaturas (legislatura, unidades_previstas) VALUES (?, ?) "
+                "ON CONFLICT(legislatura) DO UPDATE SET unidades_previstas = excluded.unidades_previstas",
+                (legislatura, unidades_previstas),
+            )
+
+    def registrar(self, legislatura, deputado_id, ano, meses, despesas):
+        """Marca como concluídos os meses cobertos por uma consulta, separando as despesas por mês."""
+        por_mes = defaultdict(list)
+        for despesa in despesas:
+            por_mes[int(despesa['mes'])].append(despesa)
+
+        agora = datetime.now().isoformat(timespec='seconds')
+        linhas = []
+        for mes in meses:
+            despesas_mes = por_mes.get(mes, [])
+            payload = zlib.compress(json.dumps(despesas_mes, ensure_ascii=False, default=str).encode('utf-8'))
+            linhas.append((legislatura, deputado_id, ano, mes, len(despesas_mes),
+                           hash_payload(despesas_mes), payload, agora))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO unidades VALUES (?, ?, ?, ?, ?, ?, ?, ?)", linhas
+            )
+
+    def concluidas(self, legislatura):
+        """Conjunto de (deputado_id, ano, mes) já concluídos na legislatura."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT deputado_id, ano, mes FROM unidades WHERE legislatura = ?", (legislatura,)
+            )
+            return {tuple(linha) for linha in cursor}
+
+    def progresso(self, legislatura):
+        """(unidades concluídas, unidades previstas) da legislatura."""
+        with self._lock:
+            concluidas, = self._conn.execute(
+                "SELECT COUNT(*) FROM unidades WHERE legislatura = ?", (legislatura,)
+            ).fetchone()
+            previstas = self._conn.execute(
+                "SELECT unidades_previstas FROM legislaturas WHERE legislatura = ?", (legislatura,)
+            ).fetchone()
+        return concluidas, previstas[0] if previstas else 0
+
+    def carregar(self, legislatura, unidades=None):
+        """Gera as despesas gravadas da legislatura, por deputado/ano/mês.
+
+        unidades: se informado, só as (deputado_id, ano, mes) desse conjunto.
+        Lê por uma conexão própria, sem trazer a legislatura inteira para a memória.
+        """
+        leitura = sqlite3.connect(self.path, timeout=60)
+        try:
+            cursor = leitura.execute(
+                "SELECT deputado_id, ano, mes, payload FROM unidades WHERE legislatura = ? AND linhas > 0 "
+                "ORDER BY deputado_id, ano, mes",
+                (legislatura,),
+            )
+            for deputado_id, ano, mes, payload in cursor:
+                if unidades is None or (deputado_id, ano, mes) in unidades:
+                    yield from json.loads(zlib.decompress(payload))
+        finally:
+            leitura.close()
+
+    def finalizada(self, legislatura):
+        """Se a legislatura já foi extraída por completo e gravada no dataset."""
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT finalizada_em FROM legislaturas WHERE legislatura = ?", (legislatura,)
+            ).fetchone()
+        return bool(linha and linha[0])
+
+    def finalizar(self, legislatura, arquivo):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE legislaturas SET arquivo = ?, finalizada_em = ? WHERE legislatura = ?",
+                (arquivo, datetime.now().isoformat(timespec='seconds'), legislatura),
+            )
+
+    def limpar(self, legislatura):
+        """Descarta as unidades de uma legislatura (nova extração sem --resume)."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM unidades WHERE legislatura = ?", (legislatura,))
+            self._conn.execute(
+                "UPDATE legislaturas SET arquivo = NULL, finalizada_em = NULL WHERE legislatura = ?",
+                (legislatura,),
+            )
+
+    def status(self):
+        """Conclusão por legislatura: unidades concluídas/previstas, linhas e arquivo final."""
+        with self._lock:
+            cursor = self._conn.execute("""
+                SELECT l.legislatura, l.unidades_previstas, COUNT(u.legislatura), COALESCE(SUM(u.linhas), 0),
+                       l.arquivo, l.finalizada_em
+                FROM legislaturas l
+                LEFT JOIN unidades u ON u.legislatura = l.legislatura
+                GROUP BY l.legislatura
+                ORDER BY l.legislatura DESC
+            """)
+            return [
+                {
+                    'legislatura': leg,
+                    'unidades_previstas': previstas,
+                    'unidades_concluidas': concluidas,
+                    'percentual': concluidas / previstas if previstas else 0.0,
+                    'linhas': linhas,
+                    'arquivo': arquivo,
+                    'finalizada_em': finalizada_em,
+                }
+                for leg, previstas, concluidas, linhas, arquivo, finalizada_em in cursor
+            ]
+
+    def close(self):
+        self._conn.close()
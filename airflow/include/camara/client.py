@@ -0,0 +1,362 @@
+"""Cliente HTTP compartilhado para a API de Dados Abertos da Câmara.
+
+Todas as chamadas à API (scripts de `ingestao/` e DAGs) passam por aqui, para
+reaproveitar conexões keep-alive em vez de abrir um novo handshake TCP/TLS
+a cada requisição e, com um RespostaCache, só baixar de novo o que mudou.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from include.camara.httpcache import cache_padrao
+from include.camara.metricas import MetricasRequisicoes, rota
+from include.camara.ratelimit import limitador_padrao, retry_after_segundos
+
+logger = logging.getLogger(__name__)
+
+API_BASE_URL = os.getenv("CAMARA_API_BASE_URL", "https://dadosabertos.camara.leg.br/api/v2")
+DEFAULT_TIMEOUT = (5, 30)  # (conexão, leitura) em segundos
+PAGINAS_SIMULTANEAS = 4
+PARAMETROS_POOL = ('pool_connections', 'pool_maxsize', 'pool_block')
+
+
+class ConsultaIncompleta(Exception):
+    """Alguma página de uma consulta não pôde ser obtida; `dados` traz o que veio."""
+
+    def __init__(self, mensagem, dados=None):
+        super().__init__(mensagem)
+        self.dados = dados or []
+
+
+def link(data, rel):
+    """Devolve o href de um link da resposta ('next', 'last', ...) ou None."""
+    for item in (data or {}).get('links') or []:
+        if item.get('rel') == rel:
+            return item.get('href')
+    return None
+
+
+def numero_pagina(href):
+    """Extrai o parâmetro pagina de um href de link (0 se ausente)."""
+    if not href:
+        return 0
+    try:
+        return int(parse_qs(urlsplit(href).query).get('pagina', ['0'])[0])
+    except ValueError:
+        return 0
+
+
+class _ContadorConexoes:
+    """Contador de conexões abertas, compartilhado pelos pools de um cliente."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.abertas = 0
+
+    def incrementa(self):
+        with self._lock:
+            self.abertas += 1
+
+
+def _resposta_do_cache(url, corpo):
+    """requests.Response 200 montado a partir de um corpo guardado no cache."""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.encoding = 'utf-8'
+    response._content = corpo
+    response.headers['Content-Type'] = 'application/json'
+    response.from_cache = True
+    response.conteudo_alterado = False
+    return response
+
+
+def _pool_com_contador(base, contador):
+    class Pool(base):
+        def _new_conn(self):
+            contador.incrementa()
+            return super()._new_conn()
+
+    return Pool
+
+
+class CamaraHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter que conta quantas conexões foram de fato abertas."""
+
+    def __init__(self, contador, **kwargs):
+        self.contador = contador
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _pool_com_contador(HTTPConnectionPool, self.contador),
+            'https': _pool_com_contador(HTTPSConnectionPool, self.contador),
+        }
+
+
+class CamaraClient:
+    """Sessão HTTP com pool de conexões, gzip e timeouts para a API da Câmara.
+
+    pool_maxsize é o número de conexões mantidas por host; deve ser pelo menos
+    o número de threads que usam o cliente ao mesmo tempo. Com um rate_limiter,
+    cada requisição espera um token e informa o status recebido ao limitador.
+    Com um cache (httpcache.RespostaCache), os GETs são condicionais e as
+    respostas trazem `from_cache` e `conteudo_alterado`. Cada requisição fica
+    registrada em `metricas` (metricas.MetricasRequisicoes).
+    """
+
+    def __init__(self, base_url=API_BASE_URL, pool_maxsize=10, pool_connections=4,
+                 pool_block=False, timeout=DEFAULT_TIMEOUT, rate_limiter=None, cache=None, metricas=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.metricas = metricas or MetricasRequisicoes()
+        self._prefixo = urlsplit(self.base_url).path
+        self._contador = _ContadorConexoes()
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+        self.pool = {}
+        self.configurar_pool(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+
+    def configurar_pool(self, **pool):
+        """Monta um novo adapter se a configuração do pool (PARAMETROS_POOL) mudou;
+        devolve True se trocou. As requisições em andamento terminam no adapter
+        anterior, cujas conexões são fechadas quando ele é coletado."""
+        novo = {**self.pool, **pool}
+        if novo == self.pool:
+            return False
+        adapter = CamaraHTTPAdapter(self._contador, **novo)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if self.pool:
+            logger.info(f"Pool de conexões do cliente reconfigurado: {self.pool} -> {novo}")
+        self.pool = novo
+        return True
+
+    def url(self, endpoint):
+        """Aceita um endpoint relativo ('deputados/1/despesas') ou uma URL completa."""
+        if endpoint.startswith(('http://', 'https://')):
+            return endpoint
+        return f"{self.base_url}/{endpoint.lstrip('/')}"
+
+    def rota(self, url):
+        """Rota da URL relativa à base, sem ids, para as métricas ('/deputados/{id}/despesas')."""
+        caminho = urlsplit(url).path
+        if self._prefixo and caminho.startswith(self._prefixo):
+            caminho = caminho[len(self._prefixo):]
+        return rota(caminho)
+
+    def get(self, endpoint, params=None, timeout=None):
+        """GET simples, sem retry; devolve o requests.Response.
+
+        Com cache, um 304 vira um 200 com o corpo guardado (from_cache=True).
+        """
+        url = self.url(endpoint)
+        chave, cabecalhos = None, {}
+        if self.cache:
+            chave = self.cache.chave(url, params)
+            corpo = self.cache.fresca(chave)
+            if corpo is not None:
+                self.metricas.registrar_cache()
+                return _resposta_do_cache(chave, corpo)
+            cabecalhos = self.cache.condicionais(chave)
+
+        if self.rate_limiter:
+            self.metricas.registrar_espera(self.rate_limiter.acquire())
+        with self._lock:
+            self.requisicoes += 1
+        inicio = time.perf_counter()
+        try:
+            response = self.session.get(url, params=params, headers=cabecalhos, timeout=timeout or self.timeout)
+        except requests.exceptions.RequestException:
+            self.metricas.registrar_requisicao(self.rota(url), 'erro', time.perf_counter() - inicio)
+            raise
+        self.metricas.registrar_requisicao(self.rota(url), response.status_code, time.perf_counter() - inicio,
+                                           len(response.content))
+        if self.rate_limiter:
+            self.rate_limiter.registrar(response.status_code, response.headers.get('Retry-After'))
+
+        response.from_cache = False
+        response.conteudo_alterado = True
+        if chave and response.status_code == 304:
+            return _resposta_do_cache(response.url, self.cache.nao_modificado(chave))
+        if chave and response.status_code == 200:
+            response.conteudo_alterado = self.cache.gravar(chave, response.headers, response.content)
+        return response
+
+    def get_json(self, endpoint, params=None, max_retries=3, delay=1):
+        """GET com retry automático; devolve o JSON ou None em caso de falha.
+
+        429 e 5xx são repetidos. Com rate_limiter, a espera de um 429 fica a cargo
+        dele (Retry-After e redução da taxa); um 5xx, que o limitador só conta ao
+        fim da janela, e qualquer erro sem limitador respeitam o Retry-After ou
+        fazem backoff exponencial.
+        """
+        url = self.url(endpoint)
+        for tentativa in range(max_retries):
+            if tentativa:
+                self.metricas.registrar_retentativa()
+            try:
+                response = self.get(url, params=params)
+                if response.status_code == 200:
+                    return response.json()
+                elif response.status_code == 429 or response.status_code >= 500:
+                    logger.warning(f"Status {response.status_code} para URL: {response.url} (tentativa {tentativa + 1})")
+                    if response.status_code >= 500 or self.rate_limiter is None:
+                        retry_after = retry_after_segundos(response.headers.get('Retry-After'))
+                        time.sleep(retry_after if retry_after is not None else delay * (2 ** tentativa))
+                    continue
+                else:
+                    logger.warning(f"Status {response.status_code} para URL: {response.url}")
+                    return None
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Erro na requisição (tentativa {tentativa + 1}): {e}")
+                if tentativa < max_retries - 1:
+                    time.sleep(delay)
+        return None
+
+    def fetch_all_pages(self, endpoint, params=None, itens=100, max_pages=None, max_workers=PAGINAS_SIMULTANEAS):
+        """Busca todas as páginas de um endpoint paginado, na ordem das páginas.
+
+        itens=None não envia o parâmetro (quando ele já está na URL).
+        """
+        params = dict(params or {})
+        if itens:
+            params['itens'] = itens
+
+        primeira = self.get_json(endpoint, params={**params, 'pagina': 1})
+        if not primeira or not primeira.get('dados'):
+            self.metricas.registrar_consulta(1)
+            return []
+        try:
+            return self.paginas_restantes(endpoint, params, primeira, max_pages=max_pages, max_workers=max_workers)
+        except ConsultaIncompleta as e:
+            logger.warning(str(e))
+            return e.dados
+
+    def paginas_restantes(self, endpoint, params, primeira, max_pages=None, max_workers=PAGINAS_SIMULTANEAS):
+        """Completa uma consulta a partir da resposta da página 1.
+
+        Com o link rel=last, busca as páginas 2..N em paralelo (sem a página
+        vazia final); sem ele, segue rel=next ou, em último caso, pagina até
+        receber 'dados' vazio. Levanta ConsultaIncompleta se faltar alguma página.
+        """
+        all_data = list(primeira['dados'])
+        ultima = numero_pagina(link(primeira, 'last'))
+        if max_pages:
+            ultima = min(ultima, max_pages)
+
+        if ultima:
+            paginas = range(2, ultima + 1)
+            self.metricas.registrar_consulta(1 + len(paginas))
+            if not paginas:
+                return all_data
+            faltando = []
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(paginas))) as executor:
+                respostas = executor.map(lambda p: self.get_json(endpoint, params={**params, 'pagina': p}), paginas)
+                for pagina, data in zip(paginas, respostas):
+                    if data is None:
+                        faltando.append(pagina)
+                    elif data.get('dados'):
+                        all_data.extend(data['dados'])
+            if faltando:
+                raise ConsultaIncompleta(f"Páginas {faltando} de {self.url(endpoint)} {params} não puderam ser obtidas", all_data)
+            return all_data
+
+        data, page = primeira, 1
+        while not max_pages or page < max_pages:
+            proxima = link(data, 'next')
+            page += 1
+            if proxima:
+                data = self.get_json(proxima)
+            elif 'links' in data:
+                break
+            else:
+                data = self.get_json(endpoint, params={**params, 'pagina': page})
+            if data is None:
+                raise ConsultaIncompleta(f"Página {page} de {self.url(endpoint)} {params} não pôde ser obtida", all_data)
+            if not data.get('dados'):
+                break
+            all_data.extend(data['dados'])
+        self.metricas.registrar_consulta(page)
+        return all_data
+
+    def estatisticas_conexoes(self):
+        """Conexões abertas vs. reaproveitadas desde a criação do cliente."""
+        abertas = self._contador.abertas
+        return {
+            'requisicoes': self.requisicoes,
+            'conexoes_abertas': abertas,
+            'conexoes_reutilizadas': max(self.requisicoes - abertas, 0),
+        }
+
+    def log_estatisticas(self):
+        stats = self.estatisticas_conexoes()
+        logger.info(
+            f"Cliente Câmara: {stats['requisicoes']} requisições, "
+            f"{stats['conexoes_abertas']} conexões abertas, "
+            f"{stats['conexoes_reutilizadas']} reutilizadas"
+        )
+        self.metricas.log_resumo()
+        if self.cache:
+            self.cache.log_estatisticas()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(**kwargs):
+    """Devolve o cliente compartilhado do processo, criando-o na primeira chamada.
+
+    O cliente é criado sob demanda para que processos filhos
+    (ProcessPoolExecutor) abram seu próprio pool. Por padrão usa o limitador de
+    taxa compartilhado entre processos (limitador_padrao) e o cache de
+    respostas em disco (cache_padrao). Com o cliente já criado, os parâmetros
+    do pool (PARAMETROS_POOL) diferentes dos dele remontam o adapter, e os
+    demais kwargs, se diferentes, levantam ValueError: outro cliente não
+    substitui o que já está em uso.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            kwargs.setdefault('rate_limiter', limitador_padrao())
+            kwargs.setdefault('cache', cache_padrao())
+            _client = CamaraClient(**kwargs)
+            return _client
+
+        pool = {chave: kwargs.pop(chave) for chave in PARAMETROS_POOL if chave in kwargs}
+        if 'base_url' in kwargs:
+            kwargs['base_url'] = kwargs['base_url'].rstrip('/')
+        divergentes = sorted(chave for chave, valor in kwargs.items() if getattr(_client, chave, None) != valor)
+        if divergentes:
+            raise ValueError(
+                f"O cliente compartilhado já foi criado com outros valores de {', '.join(divergentes)}; "
+                "use CamaraClient diretamente para um cliente diferente"
+            )
+        _client.configurar_pool(**pool)
+        return _client
@@ -0,0 +1,290 @@
+"""Dataset Parquet de despesas particionado por ano e mês (layout Hive).
+
+Todos os produtores (scripts de `ingestao/` e DAGs) gravam no mesmo layout:
+
+    <base>/ano=2024/mes=03/<timestamp>-<origem>-<id>.parquet
+
+Os arquivos mantêm as colunas ano e mes (o Snowflake carrega por
+MATCH_BY_COLUMN_NAME) e o nome começa pelo instante da escrita, então a ordem
+alfabética dos arquivos de uma partição é a ordem de chegada. A compactação
+junta os arquivos pequenos de cada partição em arquivos de até
+`tamanho_alvo` bytes, mantendo só a versão mais recente de cada despesa.
+
+O DatasetSink também grava o mesmo layout em JSON Lines comprimido
+(formato 'ndjson', arquivos .ndjson.gz), para cargas que não leem Parquet;
+`particoes`, `abrir` e a compactação só consideram os arquivos Parquet.
+
+`base` é um caminho local ou uma URI aceita pelo pyarrow, p.ex.
+`s3://bucket/camara/despesas/dataset?endpoint_override=localhost:9000&scheme=http`
+para um S3 local (MinIO).
+"""
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from include.camara.schema import DESPESAS_SCHEMA
+from include.camara.sink import MAX_LINHAS_BUFFER, NdjsonSink, ParquetSink
+
+logger = logging.getLogger(__name__)
+
+DATASET_PADRAO = os.getenv("CAMARA_DESPESAS_DATASET", "../data/despesas/dataset")
+PREFIXO_S3 = "camara/despesas/dataset"
+TAMANHO_ALVO = 64 * 1024 * 1024
+CHAVE_DESPESA = ('deputado_id', 'codDocumento')
+
+# formato: (extensão, classe do sink de cada partição)
+FORMATOS = {
+    'parquet': ('.parquet', ParquetSink),
+    'ndjson': ('.ndjson.gz', NdjsonSink),
+}
+
+PARTICIONAMENTO = ds.partitioning(pa.schema([('ano', pa.int16()), ('mes', pa.int8())]), flavor='hive')
+
+
+def resolver(base, filesystem=None):
+    """(filesystem, caminho) para um caminho local ou URI (s3://, file://)."""
+    if filesystem is not None:
+        return filesystem, base
+    if '://' in base:
+        return pafs.FileSystem.from_uri(base)
+    return pafs.LocalFileSystem(), os.path.abspath(base)
+
+
+def filesystem_airflow(aws_conn_id):
+    """S3FileSystem com as credenciais (e o endpoint_url, se houver) de uma conexão AWS do Airflow."""
+    from airflow.providers.amazon.aws.hooks.s3 import S3Hook
+
+    hook = S3Hook(aws_conn_id=aws_conn_id)
+    credenciais = hook.get_credentials()
+    endpoint = hook.conn_config.endpoint_url
+    opcoes = {}
+    if endpoint:
+        esquema, _, endereco = endpoint.rpartition('://')
+        opcoes = {'endpoint_override': endereco, 'scheme': esquema or 'https'}
+    return pafs.S3FileSystem(
+        access_key=credenciais.access_key,
+        secret_key=credenciais.secret_key,
+        session_token=credenciais.token,
+        region=hook.conn_region_name,
+        **opcoes,
+    )
+
+
+def caminho_particao(base, ano, mes):
+    return f"{base}/ano={int(ano)}/mes={int(mes):02d}"
+
+
+def _nome_arquivo(origem, instante=None, extensao='.parquet'):
+    instante = instante or datetime.now().strftime("%Y%m%dT%H%M%S")
+    return f"{instante}-{origem}-{uuid.uuid4().hex[:8]}{extensao}"
+
+
+def _instante(caminho):
+    return os.path.basename(caminho).split('-', 1)[0]
+
+
+class DatasetSink:
+    """Como o ParquetSink, mas separa as despesas por (ano, mes): um arquivo
+    por partição, publicado só em fechar().
+
+    max_linhas limita o total em memória somando todas as partições; ao
+    atingi-lo, cada partição com despesas pendentes grava um row group.
+
+    Com um manifesto (manifesto.Manifesto), cada lote passado a escrever()
+    deve conter unidades (deputado, ano, mes) inteiras: as que não mudaram
+    desde a última gravação são puladas, e o manifesto é salvo em fechar().
+    Com um índice (dedup.IndiceDespesas), as despesas que sobram são comparadas
+    uma a uma: duplicatas exatas de despesas já gravadas são descartadas e as
+    alteradas ficam registradas no índice, também salvo em fechar().
+
+    formato: chave de FORMATOS ('parquet' ou 'ndjson').
+    """
+
+    def __init__(self, base=DATASET_PADRAO, origem='ingestao', max_linhas=MAX_LINHAS_BUFFER,
+                 schema=DESPESAS_SCHEMA, filesystem=None, manifesto=None, indice=None, formato='parquet'):
+        self.filesystem, self.base = resolver(base, filesystem)
+        self.extensao, self._classe_sink = FORMATOS[formato]
+        self.manifesto = manifesto
+        self.indice = indice
+        self.origem = origem
+        self.max_linhas = max_linhas
+        self.schema = schema
+        self._instante = datetime.now().strftime("%Y%m%dT%H%M%S")
+        self._sinks = {}
+        self._pendentes = 0
+        self.arquivos = {}
+
+    @property
+    def linhas(self):
+        return sum(sink.linhas for sink in self._sinks.values())
+
+    def _sink(self, particao):
+        if particao not in self._sinks:
+            nome = _nome_arquivo(self.origem, self._instante, self.extensao)
+            caminho = f"{caminho_particao(self.base, *particao)}/{nome}"
+            # O limite é global: cada partição só grava quando o DatasetSink manda
+            self._sinks[particao] = self._classe_sink(caminho, max_linhas=float('inf'), schema=self.schema,
+                                                      filesystem=self.filesystem)
+        return self._sinks[particao]
+
+    def escrever(self, despesas):
+        if self.manifesto is not None:
+            despesas = self.manifesto.filtrar(despesas)
+        if self.indice is not None:
+            despesas = self.indice.filtrar(despesas)
+        for despesa in despesas:
+            self._sink((int(despesa['ano']), int(despesa['mes']))).escrever([despesa])
+            self._pendentes += 1
+            if self._pendentes >= self.max_linhas:
+                self._flush()
+
+    def _flush(self):
+        for sink in self._sinks.values():
+            sink._flush()
+        self._pendentes = 0
+
+    def fechar(self):
+        """Publica os arquivos; devolve (e guarda em .arquivos) {(ano, mes): caminho} das partições escritas."""
+        for particao, sink in sorted(self._sinks.items()):
+            if sink.fechar():
+                self.arquivos[particao] = sink.path
+        self._pendentes = 0
+        if self.manifesto is not None:
+            self.manifesto.salvar()
+        if self.indice is not None:
+            self.indice.salvar()
+        return self.arquivos
+
+    def descartar(self):
+        for sink in self._sinks.values():
+            sink.descartar()
+        self._pendentes = 0
+        if self.manifesto is not None:
+            self.manifesto.descartar()
+        if self.indice is not None:
+            self.indice.descartar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.fechar()
+        else:
+            self.descartar()
+
+
+def escrever_particoes(despesas, base=DATASET_PADRAO, origem='ingestao', schema=DESPESAS_SCHEMA, filesystem=None,
+                       manifesto=None, indice=None):
+    """Grava uma lista de despesas no dataset, um arquivo por (ano, mes).
+    Devolve {(ano, mes): caminho}."""
+    sink = DatasetSink(base, origem, schema=schema, filesystem=filesystem, manifesto=manifesto, indice=indice)
+    try:
+        sink.escrever(despesas)
+    except BaseException:
+        sink.descartar()
+        raise
+    return sink.fechar()
+
+
+def particoes(base=DATASET_PADRAO, filesystem=None):
+    """{(ano, mes): [arquivos em ordem de chegada]} do dataset."""
+    filesystem, base = resolver(base, filesystem)
+    if filesystem.get_file_info(base).type == pafs.FileType.NotFound:
+        return {}
+
+    encontrados = defaultdict(list)
+    for info in filesystem.get_file_info(pafs.FileSelector(base, recursive=True)):
+        if info.type != pafs.FileType.File or not info.base_name.endswith('.parquet'):
+            continue
+        chaves = dict(parte.split('=', 1) for parte in info.path[len(base):].split('/')[:-1] if '=' in parte)
+        if 'ano' in chaves and 'mes' in chaves:
+            encontrados[(int(chaves['ano']), int(chaves['mes']))].append(info.path)
+    return {particao: sorted(arquivos, key=os.path.basename) for particao, arquivos in sorted(encontrados.items())}
+
+
+def abrir(base=DATASET_PADRAO, filesystem=None, particoes_filtro=None):
+    """pyarrow.dataset.Dataset com os arquivos publicados (ignora .tmp de escritas em andamento)."""
+    filesystem, base = resolver(base, filesystem)
+    arquivos = [
+        arquivo
+        for particao, lista in particoes(base, filesystem).items()
+        if particoes_filtro is None or particao in particoes_filtro
+        for arquivo in lista
+    ]
+    return ds.dataset(arquivos, schema=DESPESAS_SCHEMA, format='parquet', filesystem=filesystem,
+                      partitioning=PARTICIONAMENTO, partition_base_dir=base)
+
+
+def _ultima_versao(tabela, chave=CHAVE_DESPESA):
+    """Mantém a última linha de cada chave (as linhas chegam em ordem de escrita)."""
+    ordem = tabela.append_column('_ordem', pa.array(range(tabela.num_rows), pa.int64()))
+    ultimas = ordem.select([*chave, '_ordem']).group_by(list(chave), use_threads=False).aggregate([('_ordem', 'max')])
+    return tabela.take(ultimas['_ordem_max'])
+
+
+def _ler(arquivo, filesystem, schema):
+    with filesystem.open_input_file(arquivo) as f:
+        return pq.read_table(f).select(schema.names).cast(schema)
+
+
+def compactar_particao(base, ano, mes, arquivos, filesystem, tamanho_alvo=TAMANHO_ALVO, schema=DESPESAS_SCHEMA):
+    """Reescreve os arquivos de uma partição em arquivos de até tamanho_alvo
+    bytes, sem versões antigas da mesma despesa. Os novos arquivos são
+    publicados antes de apagar os antigos: uma falha no meio deixa linhas
+    repetidas, que a próxima compactação remove."""
+    bytes_antes = sum(info.size for info in filesystem.get_file_info(arquivos))
+    tabela = pa.concat_tables(_ler(arquivo, filesystem, schema) for arquivo in arquivos)
+    compactada = _ultima_versao(tabela).sort_by([('deputado_id', 'ascending'), ('dataDocumento', 'ascending')])
+
+    # Estima linhas por arquivo pelo tamanho médio de linha dos arquivos de entrada
+    linhas_por_arquivo = max(1, int(tamanho_alvo * tabela.num_rows / max(bytes_antes, 1)))
+    # O instante do arquivo mais novo mantém a ordem em relação aos que chegarem depois
+    instante = _instante(arquivos[-1])
+    novos = []
+    for inicio in range(0, compactada.num_rows, linhas_por_arquivo):
+        destino = f"{caminho_particao(base, ano, mes)}/{_nome_arquivo('compactado', instante)}"
+        with ParquetSink(destino, schema=schema, filesystem=filesystem) as sink:
+            sink.escrever_tabela(compactada.slice(inicio, linhas_por_arquivo))
+        novos.append(sink.path)
+
+    for arquivo in arquivos:
+        filesystem.delete_file(arquivo)
+
+    return {
+        'ano': ano, 'mes': mes,
+        'arquivos_antes': len(arquivos), 'arquivos_depois': len(novos),
+        'linhas_antes': tabela.num_rows, 'linhas_depois': compactada.num_rows,
+        'bytes_antes': bytes_antes,
+        'bytes_depois': sum(info.size for info in filesystem.get_file_info(novos)),
+    }
+
+
+def compactar(base=DATASET_PADRAO, filesystem=None, tamanho_alvo=TAMANHO_ALVO, particoes_filtro=None):
+    """Compacta as partições com mais de um arquivo.
+
+    particoes_filtro: {(ano, mes)} a considerar (p.ex. só as que a DAG acabou de escrever).
+    Devolve um resumo por partição compactada.
+    """
+    filesystem, base = resolver(base, filesystem)
+    resumos = []
+    for (ano, mes), arquivos in particoes(base, filesystem).items():
+        if particoes_filtro is not None and (ano, mes) not in particoes_filtro:
+            continue
+        if len(arquivos) < 2:
+            continue
+        resumo = compactar_particao(base, ano, mes, arquivos, filesystem, tamanho_alvo)
+        logger.info(
+            f"Partição ano={ano}/mes={mes:02d}: {resumo['arquivos_antes']} -> {resumo['arquivos_depois']} arquivos, "
+            f"{resumo['linhas_antes']} -> {resumo['linhas_depois']} linhas, "
+            f"{resumo['bytes_antes'] / 1024:.0f} -> {resumo['bytes_depois'] / 1024:.0f} KB"
+        )
+        resumos.append(resumo)
+    return resumos
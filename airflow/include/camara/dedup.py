@@ -0,0 +1,393 @@
+"""Índice persistente de despesas já gravadas, para deduplicar na ingestão.
+
+Guarda (deputado_id, codDocumento, hash do conteúdo) de cada despesa
+publicada num SQLite compacto (WITHOUT ROWID, hash de 8 bytes), com um filtro
+de Bloom em memória na frente: a maioria das despesas novas é reconhecida sem
+consultar o SQLite. Cada despesa é classificada como
+
+- nova: chave nunca vista;
+- duplicada: mesma chave e mesmo conteúdo de uma já gravada (descartada);
+- alterada: mesma chave com conteúdo diferente (segue para o dataset e fica
+  registrada na tabela `alteracoes`).
+
+Como o manifesto, o índice só é atualizado em `salvar()`, depois que os
+arquivos foram publicados.
+
+O SQLite é local ao processo. Com `base` (o dataset que o índice protege,
+p.ex. no S3), cada `salvar()` também publica as chaves gravadas num segmento
+ao lado do dataset (`<base>/_indice/<instante>-<uuid>.parquet`), e um índice
+aberto importa os segmentos que o seu SQLite ainda não viu: workers
+diferentes (cada um com o seu SQLite) enxergam o que os outros publicaram
+até o início da tarefa. Tarefas simultâneas só não se enxergam entre si,
+o que não importa para os shards da full_despesas (um deputado fica sempre no
+mesmo shard, e a chave inclui o deputado).
+
+Para que a abertura não cresça com o número de execuções, o `salvar()` que
+deixa mais de LIMITE_SEGMENTOS segmentos os junta num só (a versão mais
+recente de cada chave, com o instante do segmento mais novo no nome e a lista
+dos segmentos que substitui nos metadados) e apaga os originais; quem já
+importou todos eles marca o compactado como visto sem lê-lo. O filtro de
+Bloom fica gravado no próprio SQLite, com o número de chaves que cobre, e só
+é reconstruído quando esse número não bate ou a capacidade acaba.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from include.camara.dataset import DATASET_PADRAO, resolver
+from include.camara.manifesto import COLUNAS_INGESTAO
+
+logger = logging.getLogger(__name__)
+
+INDICE_PADRAO = os.getenv(
+    'CAMARA_INDICE_DESPESAS',
+    os.path.join(tempfile.gettempdir(), 'camara_indice_despesas.sqlite'),
+)
+LIMITE_SEGMENTOS = int(os.getenv('CAMARA_INDICE_SEGMENTOS', '16'))
+
+
+def indice_do_dataset(base):
+    """Caminho do índice de um dataset: INDICE_PADRAO para o dataset padrão e um
+    arquivo ao lado dele para os demais, para que gravar em outro destino não
+    descarte despesas que só existem no primeiro."""
+    if base == DATASET_PADRAO:
+        return INDICE_PADRAO
+    raiz, extensao = os.path.splitext(INDICE_PADRAO)
+    return f"{raiz}-{hashlib.blake2b(base.encode('utf-8'), digest_size=4).hexdigest()}{extensao}"
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS despesas (
+    deputado_id INTEGER NOT NULL,
+    cod_documento INTEGER NOT NULL,
+    hash BLOB NOT NULL,
+    PRIMARY KEY (deputado_id, cod_documento)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS alteracoes (
+    deputado_id INTEGER NOT NULL,
+    cod_documento INTEGER NOT NULL,
+    hash_anterior BLOB NOT NULL,
+    hash BLOB NOT NULL,
+    detectada_em TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segmentos (
+    nome TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS bloom (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    chaves INTEGER NOT NULL,
+    capacidade INTEGER NOT NULL,
+    taxa_falsos REAL NOT NULL,
+    filtro BLOB NOT NULL
+);
+"""
+
+_SCHEMA_SEGMENTO = pa.schema([
+    ('deputado_id', pa.int64()),
+    ('cod_documento', pa.int64()),
+    ('hash', pa.binary(8)),
+])
+
+
+class BloomFilter:
+    """Filtro de Bloom simples (k posições por dupla de hashes de 64 bits)."""
+
+    def __init__(self, capacidade, taxa_falsos=0.01):
+        self.capacidade, self.taxa_falsos = capacidade, taxa_falsos
+        self.bits = max(8, int(-capacidade * math.log(taxa_falsos) / math.log(2) ** 2))
+        self.k = max(1, round(self.bits / capacidade * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+
+    @classmethod
+    def restaurar(cls, capacidade, taxa_falsos, filtro):
+        """Filtro a partir dos bytes de um gravado com a mesma capacidade e taxa."""
+        bloom = cls(capacidade, taxa_falsos)
+        bloom._array = bytearray(filtro)
+        return bloom
+
+    def __bytes__(self):
+        return bytes(self._array)
+
+    def _posicoes(self, chave):
+        digest = hashlib.blake2b(chave, digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.k))
+
+    def add(self, chave):
+        for posicao in self._posicoes(chave):
+            self._array[posicao >> 3] |= 1 << (posicao & 7)
+
+    def __contains__(self, chave):
+        return all(self._array[posicao >> 3] & (1 << (posicao & 7)) for posicao in self._posicoes(chave))
+
+
+def _nome_segmento(instante, sufixo=None):
+    return '-'.join(filter(None, (instante, sufixo, uuid.uuid4().hex[:8]))) + '.parquet'
+
+
+def _substituidos(schema):
+    """Segmentos que um segmento compactado substitui (vazio para os demais)."""
+    return json.loads((schema.metadata or {}).get(b'segmentos', b'[]'))
+
+
+def compactar_segmentos(diretorio, nomes, filesystem):
+    """Junta os segmentos `nomes` (em ordem de publicação) num só, com a versão
+    mais recente de cada chave, e apaga os originais. O compactado é publicado
+    antes de apagar: uma falha no meio deixa chaves repetidas, que a próxima
+    compactação junta. Devolve o nome do compactado (None se outro processo já
+    compactou todos)."""
+    tabelas, substituidos = [], list(nomes)
+    for nome in nomes:
+        try:
+            with filesystem.open_input_file(f"{diretorio}/{nome}") as f:
+                tabela = pq.read_table(f)
+        except FileNotFoundError:
+            # Outro processo compactou ao mesmo tempo: o compactado dele já tem essas chaves
+            continue
+        substituidos.extend(_substituidos(tabela.schema))
+        tabelas.append(tabela.replace_schema_metadata(None))
+    if not tabelas:
+        return None
+    tabela = pa.concat_tables(tabelas)
+    tabela = tabela.append_column('ordem', pa.array(range(tabela.num_rows), pa.int64()))
+    ultimas = tabela.group_by(['deputado_id', 'cod_documento'], use_threads=False).aggregate([('ordem', 'max')])
+    compactada = tabela.take(ultimas['ordem_max']).drop_columns(['ordem'])
+    # Também os que os compactados de entrada substituíam: quem já os tinha importado não relê nada
+    compactada = compactada.replace_schema_metadata({'segmentos': json.dumps(sorted(set(substituidos)))})
+
+    # O instante do segmento mais novo mantém a ordem em relação aos que chegarem depois
+    destino = _nome_segmento(nomes[-1].split('-')[0], 'compactado')
+    with filesystem.open_output_stream(f"{diretorio}/{destino}") as f:
+        pq.write_table(compactada, f)
+    for nome in nomes:
+        try:
+            filesystem.delete_file(f"{diretorio}/{nome}")
+        except FileNotFoundError:
+            pass
+    logger.info(f"Índice de despesas: {len(nomes)} segmentos compactados em {destino} "
+                f"({tabela.num_rows} -> {compactada.num_rows} chaves)")
+    return destino
+
+
+def _chave_bytes(deputado_id, cod_documento):
+    return f"{deputado_id}:{cod_documento}".encode()
+
+
+def hash_despesa(despesa):
+    """Hash de 8 bytes do conteúdo vindo da API (sem as colunas da ingestão)."""
+    conteudo = json.dumps({k: v for k, v in despesa.items() if k not in COLUNAS_INGESTAO},
+                          sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(conteudo.encode('utf-8'), digest_size=8).digest()
+
+
+class IndiceDespesas:
+    """Índice (deputado_id, codDocumento) -> hash, compartilhável entre threads.
+
+    base/filesystem: dataset protegido pelo índice; com ele, as chaves
+    publicadas por outros processos (segmentos em `<base>/_indice/`) são
+    importadas na abertura e as deste processo, publicadas em salvar().
+    """
+
+    def __init__(self, path=INDICE_PADRAO, taxa_falsos=0.01, base=None, filesystem=None):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._pendentes = {}
+        self._alteracoes = []
+        self.contadores = {'novas': 0, 'alteradas': 0, 'duplicadas': 0, 'consultas_sqlite': 0,
+                           'segmentos_importados': 0}
+        self._bloom = self._carregar_bloom(taxa_falsos)
+        self._segmentos = None
+        if base is not None:
+            self.filesystem, base = resolver(base, filesystem)
+            self._segmentos = f"{base}/_indice"
+            self._importar_segmentos()
+
+    def _carregar_bloom(self, taxa_falsos):
+        """O filtro gravado, se cobre exatamente as chaves do SQLite (chaves nunca são
+        removidas, então basta comparar o número) e ainda tem capacidade; senão, um novo."""
+        total, = self._conn.execute("SELECT COUNT(*) FROM despesas").fetchone()
+        gravado = self._conn.execute("SELECT chaves, capacidade, taxa_falsos, filtro FROM bloom").fetchone()
+        if gravado and gravado[0] == total and total <= gravado[1] and gravado[2] == taxa_falsos:
+            return BloomFilter.restaurar(gravado[1], taxa_falsos, gravado[3])
+
+        # Folga para as chaves que entrarem depois sem degradar a taxa de falsos positivos
+        bloom = BloomFilter(max(2 * total, 1_000_000), taxa_falsos)
+        for deputado_id, cod_documento in self._conn.execute("SELECT deputado_id, cod_documento FROM despesas"):
+            bloom.add(_chave_bytes(deputado_id, cod_documento))
+        with self._conn:
+            self._gravar_bloom(bloom)
+        return bloom
+
+    def _gravar_bloom(self, bloom):
+        """Grava o filtro com o número de chaves do SQLite (dentro da transação que as alterou)."""
+        total, = self._conn.execute("SELECT COUNT(*) FROM despesas").fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO bloom VALUES (0, ?, ?, ?, ?)",
+            (total, bloom.capacidade, bloom.taxa_falsos, bytes(bloom)),
+        )
+
+    def _listar_segmentos(self):
+        selecao = pafs.FileSelector(self._segmentos, allow_not_found=True)
+        return sorted(info.base_name for info in self.filesystem.get_file_info(selecao)
+                      if info.base_name.endswith('.parquet'))
+
+    def _importar_segmentos(self):
+        """Traz para o SQLite (e para o filtro de Bloom) os segmentos publicados que
+        ele ainda não tem. Um segmento apagado entre a listagem e a leitura foi
+        compactado: a segunda listagem encontra o compactado."""
+        for _ in range(2):
+            vistos = {nome for nome, in self._conn.execute("SELECT nome FROM segmentos")}
+            faltando = False
+            for nome in self._listar_segmentos():
+                if nome in vistos:
+                    continue
+                try:
+                    with self.filesystem.open_input_file(f"{self._segmentos}/{nome}") as f:
+                        arquivo = pq.ParquetFile(f)
+                        substituidos = _substituidos(arquivo.schema_arrow)
+                        # Compactado de segmentos já importados: nada de novo
+                        tabela = None if substituidos and vistos.issuperset(substituidos) else arquivo.read()
+                except FileNotFoundError:
+                    faltando = True
+                    continue
+                with self._conn:
+                    if tabela is not None:
+                        chaves = list(zip(*(tabela.column(coluna).to_pylist() for coluna in _SCHEMA_SEGMENTO.names)))
+                        self._conn.executemany("INSERT OR REPLACE INTO despesas VALUES (?, ?, ?)", chaves)
+                        for deputado_id, cod_documento, _ in chaves:
+                            self._bloom.add(_chave_bytes(deputado_id, cod_documento))
+                        self.contadores['segmentos_importados'] += 1
+                    self._conn.executemany("INSERT OR IGNORE INTO segmentos VALUES (?)",
+                                           [(nome,)] + [(substituido,) for substituido in substituidos])
+                vistos.update([nome, *substituidos])
+            if not faltando:
+                break
+        if self.contadores['segmentos_importados']:
+            with self._conn:
+                self._gravar_bloom(self._bloom)
+
+    def _publicar_segmento(self, pendentes):
+        # Microssegundos no instante: segmentos do mesmo segundo ficam na ordem de publicação
+        nome = _nome_segmento(datetime.now().strftime('%Y%m%dT%H%M%S%f'))
+        tabela = pa.table({
+            'deputado_id': [d for d, _ in pendentes],
+            'cod_documento': [c for _, c in pendentes],
+            'hash': list(pendentes.values()),
+        }, schema=_SCHEMA_SEGMENTO)
+        self.filesystem.create_dir(self._segmentos, recursive=True)
+        with self.filesystem.open_output_stream(f"{self._segmentos}/{nome}") as f:
+            pq.write_table(tabela, f)
+        return nome
+
+    def _hash_gravado(self, chave, chave_bytes):
+        if chave in self._pendentes:
+            return self._pendentes[chave]
+        if chave_bytes not in self._bloom:
+            return None
+        self.contadores['consultas_sqlite'] += 1
+        linha = self._conn.execute(
+            "SELECT hash FROM despesas WHERE deputado_id = ? AND cod_documento = ?", chave
+        ).fetchone()
+        return linha[0] if linha else None
+
+    def classificar(self, despesa):
+        """'nova', 'alterada' ou 'duplicada' (e anota a despesa para o próximo salvar)."""
+        try:
+            chave = (int(despesa['deputado_id']), int(despesa['codDocumento']))
+        except (KeyError, TypeError, ValueError):
+            # Sem chave não há como comparar: segue como nova, fora do índice
+            self.contadores['novas'] += 1
+            return 'nova'
+
+        digest = hash_despesa(despesa)
+        chave_bytes = _chave_bytes(*chave)
+        with self._lock:
+            anterior = self._hash_gravado(chave, chave_bytes)
+            if anterior == digest:
+                self.contadores['duplicadas'] += 1
+                return 'duplicada'
+            self._pendentes[chave] = digest
+            self._bloom.add(chave_bytes)
+            if anterior is None:
+                self.contadores['novas'] += 1
+                return 'nova'
+            self.contadores['alteradas'] += 1
+            self._alteracoes.append((*chave, anterior, digest))
+            return 'alterada'
+
+    def filtrar(self, despesas):
+        """Descarta as duplicatas exatas (de execuções anteriores ou do próprio lote)."""
+        return [despesa for despesa in despesas if self.classificar(despesa) != 'duplicada']
+
+    def salvar(self):
+        """Grava as chaves e hashes anotados (chamar depois de publicar os arquivos)
+        e, com base, publica-os num segmento para os outros processos."""
+        agora = datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conn:
+            publicou = self._segmentos is not None and bool(self._pendentes)
+            if publicou:
+                # O segmento antes do SQLite local: se a publicação falhar, nada foi anotado
+                self._conn.execute("INSERT INTO segmentos VALUES (?)", (self._publicar_segmento(self._pendentes),))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO despesas VALUES (?, ?, ?)",
+                ((d, c, h) for (d, c), h in self._pendentes.items()),
+            )
+            self._conn.executemany(
+                "INSERT INTO alteracoes VALUES (?, ?, ?, ?, ?)",
+                ((d, c, anterior, h, agora) for d, c, anterior, h in self._alteracoes),
+            )
+            if self._pendentes:
+                self._gravar_bloom(self._bloom)
+            self._pendentes.clear()
+            self._alteracoes.clear()
+
+        if publicou:
+            # O compactado não é marcado como visto aqui: pode trazer segmentos que este
+            # SQLite ainda não importou; a próxima abertura decide pelos metadados
+            nomes = self._listar_segmentos()
+            if len(nomes) > LIMITE_SEGMENTOS:
+                compactar_segmentos(self._segmentos, nomes, self.filesystem)
+
+    def descartar(self):
+        """Esquece o que foi anotado desde o último salvar (o filtro de Bloom só
+        fica com alguns bits a mais, o que custa no máximo uma consulta ao SQLite)."""
+        with self._lock:
+            self._pendentes.clear()
+            self._alteracoes.clear()
+
+    def alteracoes(self, desde=None):
+        """(deputado_id, codDocumento, detectada_em) das despesas alteradas, opcionalmente desde uma data ISO."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT deputado_id, cod_documento, detectada_em FROM alteracoes WHERE detectada_em >= ? "
+                "ORDER BY detectada_em, deputado_id, cod_documento",
+                (desde or '',),
+            )
+            return cursor.fetchall()
+
+    def log_estatisticas(self):
+        c = self.contadores
+        logger.info(
+            f"Índice de despesas: {c['novas']} novas, {c['alteradas']} alteradas, {c['duplicadas']} duplicadas "
+            f"descartadas; {c['consultas_sqlite']} consultas ao SQLite "
+            f"({c['novas'] + c['alteradas'] + c['duplicadas'] - c['consultas_sqlite']} resolvidas pelo filtro de Bloom ou pelo lote)"
+            + (f"; {c['segmentos_importados']} segmentos de outros processos importados" if self._segmentos else '')
+        )
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,149 @@
+"""Cache local de respostas HTTP com requisições condicionais.
+
+Cada resposta 200 da API é guardada (comprimida) num SQLite, com a chave
+formada pela URL normalizada e seus parâmetros, junto com o ETag, o
+Last-Modified e o hash do conteúdo. Na próxima vez a mesma URL é pedida com
+If-None-Match / If-Modified-Since; um 304 devolve o corpo guardado sem
+baixá-lo de novo. Quando a API não manda validadores, o hash mostra se o
+conteúdo mudou (conteudo_alterado=False), para que quem chama possa pular o
+processamento. Com `ttl` > 0, entradas mais novas que isso são servidas sem
+requisição nenhuma.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS respostas (
+    chave TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    hash TEXT NOT NULL,
+    tamanho INTEGER NOT NULL,
+    corpo BLOB NOT NULL,
+    gravado_em REAL NOT NULL
+);
+"""
+
+
+def normalizar(url, params=None):
+    """URL canônica: host em minúsculas, sem barra final e com os parâmetros
+    (da query e de params) ordenados, para que a mesma consulta dê a mesma chave."""
+    partes = urlsplit(url)
+    query = parse_qsl(partes.query, keep_blank_values=True)
+    query += [(chave, str(valor)) for chave, valor in (params or {}).items() if valor is not None]
+    return urlunsplit((partes.scheme, partes.netloc.lower(), partes.path.rstrip('/'), urlencode(sorted(query)), ''))
+
+
+class RespostaCache:
+    """Respostas guardadas por URL normalizada, compartilháveis entre threads e processos."""
+
+    def __init__(self, path, ttl=0):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._contadores = {
+            'condicionais': 0,      # requisições enviadas com If-None-Match/If-Modified-Since
+            'nao_modificadas': 0,   # 304
+            'iguais': 0,            # 200 com o mesmo hash do corpo guardado
+            'alteradas': 0,         # 200 com conteúdo novo ou diferente
+            'evitadas': 0,          # servidas pelo ttl, sem requisição
+            'bytes_economizados': 0,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    chave = staticmethod(normalizar)
+
+    def _entrada(self, chave, colunas):
+        return self._conn.execute(f"SELECT {colunas} FROM respostas WHERE chave = ?", (chave,)).fetchone()
+
+    def fresca(self, chave):
+        """Corpo guardado se mais novo que o ttl (sem requisição), senão None."""
+        if not self.ttl:
+            return None
+        with self._lock:
+            entrada = self._entrada(chave, "corpo, tamanho, gravado_em")
+            if not entrada or time.time() - entrada[2] >= self.ttl:
+                return None
+            self._contadores['evitadas'] += 1
+            self._contadores['bytes_economizados'] += entrada[1]
+        return zlib.decompress(entrada[0])
+
+    def condicionais(self, chave):
+        """Cabeçalhos para uma requisição condicional (vazio se não há validadores)."""
+        with self._lock:
+            entrada = self._entrada(chave, "etag, last_modified")
+            cabecalhos = {}
+            if entrada and entrada[0]:
+                cabecalhos['If-None-Match'] = entrada[0]
+            if entrada and entrada[1]:
+                cabecalhos['If-Modified-Since'] = entrada[1]
+            if cabecalhos:
+                self._contadores['condicionais'] += 1
+        return cabecalhos
+
+    def nao_modificado(self, chave):
+        """Trata um 304: renova a entrada e devolve o corpo guardado."""
+        with self._lock, self._conn:
+            corpo, tamanho = self._entrada(chave, "corpo, tamanho")
+            self._conn.execute("UPDATE respostas SET gravado_em = ? WHERE chave = ?", (time.time(), chave))
+            self._contadores['nao_modificadas'] += 1
+            self._contadores['bytes_economizados'] += tamanho
+        return zlib.decompress(corpo)
+
+    def gravar(self, chave, cabecalhos, corpo):
+        """Guarda uma resposta 200; devolve False se o conteúdo é igual ao já guardado."""
+        digest = hashlib.sha256(corpo).hexdigest()
+        with self._lock, self._conn:
+            anterior = self._entrada(chave, "hash")
+            alterado = not anterior or anterior[0] != digest
+            self._contadores['alteradas' if alterado else 'iguais'] += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chave, cabecalhos.get('ETag'), cabecalhos.get('Last-Modified'), digest, len(corpo),
+                 zlib.compress(corpo), time.time()),
+            )
+        return alterado
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(self._contadores)
+
+    def log_estatisticas(self):
+        stats = self.estatisticas()
+        logger.info(
+            f"Cache HTTP: {stats['evitadas']} requisições evitadas, {stats['nao_modificadas']} respostas 304 "
+            f"(de {stats['condicionais']} condicionais), {stats['iguais']} iguais ao cache por hash, "
+            f"{stats['alteradas']} novas/alteradas; {stats['bytes_economizados'] / 1024 / 1024:.1f} MB não baixados"
+        )
+
+    def limpar(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM respostas")
+
+    def close(self):
+        self._conn.close()
+
+
+def cache_padrao():
+    """Cache compartilhado pelos processos da máquina, ou None se desligado.
+
+    CAMARA_HTTP_CACHE é o arquivo (vazio desliga o cache) e CAMARA_HTTP_CACHE_TTL
+    os segundos em que uma resposta é servida sem nem consultar a API (padrão 0:
+    sempre revalida).
+    """
+    caminho = os.getenv('CAMARA_HTTP_CACHE', os.path.join(tempfile.gettempdir(), 'camara_http_cache.sqlite'))
+    if not caminho:
+        return None
+    return RespostaCache(caminho, ttl=float(os.getenv('CAMARA_HTTP_CACHE_TTL', '0')))
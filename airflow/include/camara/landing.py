@@ -0,0 +1,65 @@
+"""Aterrissagem bruta das respostas da API em NDJSON comprimido.
+
+O HttpToS3Operator grava no S3 a resposta da API como veio: um JSON sem
+compressão por requisição, com os registros dentro de "dados" (que o
+Snowflake precisa abrir com FLATTEN) e, nas despesas, sem o deputado (que
+só aparece no nome do arquivo). Aqui as páginas vêm pelo CamaraClient (gzip
+na transferência, pool de conexões, limitador de taxa) e `aterrissar` grava
+um registro por linha, com campos fixos acrescentados (p.ex. deputado_id),
+num único arquivo gzip ou zstd, que o Snowflake lê com COMPRESSION = AUTO.
+
+FORMATO_LANDING escolhe entre 'ndjson' e o 'json' do HttpToS3Operator;
+COMPRESSAO_LANDING entre 'gzip' e 'zstd'.
+"""
+import logging
+import os
+
+import pyarrow.fs as pafs
+
+from include.camara.sink import NdjsonSink
+
+logger = logging.getLogger(__name__)
+
+FORMATO_LANDING = os.getenv('CAMARA_FORMATO_LANDING', 'ndjson')
+COMPRESSAO_LANDING = os.getenv('CAMARA_COMPRESSAO_LANDING', 'gzip')
+
+# compressão: extensão dos arquivos
+COMPRESSOES = {
+    'gzip': '.ndjson.gz',
+    'zstd': '.ndjson.zst',
+}
+
+
+def _validar(compressao):
+    if compressao not in COMPRESSOES:
+        raise ValueError(f"Compressão {compressao!r} não suportada; use uma de {sorted(COMPRESSOES)}")
+
+
+def chave_landing(prefixo, compressao=COMPRESSAO_LANDING):
+    """Caminho do arquivo NDJSON de um prefixo sem extensão ('camara/deputados/deputados')."""
+    _validar(compressao)
+    return prefixo + COMPRESSOES[compressao]
+
+
+def chave_json_despesas(deputado_id, ano, mes):
+    """Caminho do JSON das despesas de um deputado no mês gravado pelo HttpToS3Operator
+    (FORMATO_LANDING 'json'); o load_deputados.sql tira o deputado_id desse caminho."""
+    return f"camara/despesas/deputado_{deputado_id}/despesas_{ano}_{mes:02d}.json"
+
+
+def aterrissar(registros, caminho, extras=None, compressao=COMPRESSAO_LANDING, filesystem=None):
+    """Grava os registros (dicts) em `caminho` como NDJSON comprimido, com `extras`
+    em cada linha, substituindo o arquivo anterior. Sem registros, grava um arquivo
+    vazio, para que uma resposta vazia também substitua a anterior.
+    Devolve {'caminho', 'linhas', 'bytes'}."""
+    filesystem = filesystem or pafs.LocalFileSystem()
+    extras = extras or {}
+    _validar(compressao)
+    with NdjsonSink(caminho, filesystem=filesystem, compressao=compressao) as sink:
+        sink.escrever({**registro, **extras} for registro in registros)
+    if not sink.linhas:
+        filesystem.create_dir(os.path.dirname(sink.path), recursive=True)
+        filesystem.open_output_stream(sink.path, compression=compressao).close()
+    tamanho = filesystem.get_file_info(sink.path).size
+    logger.info(f"{sink.path}: {sink.linhas} registros, {tamanho} bytes ({compressao})")
+    return {'caminho': sink.path, 'linhas': sink.linhas, 'bytes': tamanho}
@@ -0,0 +1,106 @@
+"""Poda do plano de despesas pelos períodos de mandato.
+
+O planner pede todos os anos da legislatura para cada deputado, mas
+suplentes e deputados que saíram antes do fim só estiveram em exercício em
+parte dela, e as consultas fora desse período voltam vazias. `meses_ativos`
+monta os meses em exercício de cada deputado a partir da lista de deputados
+em exercício em cada ano (/deputados com dataInicio/dataFim: uma consulta
+por ano, no cache de metadados, em vez de um /historico por deputado), com
+uma margem de MARGEM_MESES meses para cada lado; `podar_consultas` descarta
+as consultas que não cobrem nenhum desses meses.
+"""
+import calendar
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime
+
+from include.camara.metadados import get_metadados
+
+logger = logging.getLogger(__name__)
+
+MARGEM_MESES = int(os.getenv('CAMARA_MARGEM_MANDATO', 1))
+
+
+def meses_periodo(data_inicio, data_fim, agora=None):
+    """Meses (ano, mes) de data_inicio a data_fim ('AAAA-MM-DD'), até o mês corrente."""
+    agora = agora or datetime.now()
+    ano, mes = int(data_inicio[:4]), int(data_inicio[5:7])
+    fim = min((int(data_fim[:4]), int(data_fim[5:7])), (agora.year, agora.month))
+    meses = []
+    while (ano, mes) <= fim:
+        meses.append((ano, mes))
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
+
+
+def _deslocar(ano, mes, n):
+    indice = ano * 12 + mes - 1 + n
+    return indice // 12, indice % 12 + 1
+
+
+def meses_ativos(dep_ids, meses, legislatura_id=None, margem=MARGEM_MESES, por_mes=False, metadados=None):
+    """{deputado_id: {(ano, mes)}} dos meses em que cada deputado esteve em exercício.
+
+    Pede a lista de deputados em exercício em cada ano de `meses` (ou, com
+    por_mes, em cada mês), alargando o período em `margem` meses para cada lado:
+    quem aparece nela fica com todos os meses do período. A consulta anual já
+    basta para podar as consultas anuais do planner, com 12 vezes menos
+    requisições. Um período cuja lista veio vazia (falha da API) conta como
+    ativo para todos; se nenhum veio, devolve None e nada é podado.
+    """
+    if not meses:
+        return None
+    metadados = metadados or get_metadados()
+    periodos = defaultdict(list)
+    for ano, mes in meses:
+        periodos[(ano, mes) if por_mes else ano].append((ano, mes))
+
+    ativos = {dep_id: set() for dep_id in dep_ids}
+    desconhecidos = []
+    for meses_do_periodo in periodos.values():
+        inicio = _deslocar(*meses_do_periodo[0], -margem)
+        fim = _deslocar(*meses_do_periodo[-1], margem)
+        em_exercicio = metadados.deputados_ids(
+            legislatura_id,
+            data_inicio=date(*inicio, 1).isoformat(),
+            data_fim=date(*fim, calendar.monthrange(*fim)[1]).isoformat(),
+        )
+        if not em_exercicio:
+            desconhecidos += meses_do_periodo
+            continue
+        for dep_id in em_exercicio:
+            if dep_id in ativos:
+                ativos[dep_id].update(meses_do_periodo)
+    if len(desconhecidos) == len(meses):
+        logger.warning("Nenhuma lista de deputados em exercício disponível; o plano não será podado")
+        return None
+    if desconhecidos:
+        logger.warning(f"Sem lista de deputados em exercício para {len(desconhecidos)} meses; não são podados")
+        for meses_dep in ativos.values():
+            meses_dep.update(desconhecidos)
+    return ativos
+
+
+def podar_consultas(consultas, ativos):
+    """Separa as consultas em (mantidas, podadas): podada é a que não cobre nenhum
+    mês em exercício do deputado. Deputados fora de `ativos` não são podados."""
+    if ativos is None:
+        return list(consultas), []
+    mantidas, podadas = [], []
+    for consulta in consultas:
+        meses_dep = ativos.get(consulta.deputado_id)
+        if meses_dep is None or any((consulta.ano, mes) in meses_dep for mes in consulta.meses_cobertos()):
+            mantidas.append(consulta)
+        else:
+            podadas.append(consulta)
+    return mantidas, podadas
+
+
+def log_poda(descricao, mantidas, podadas):
+    total = len(mantidas) + len(podadas)
+    if total:
+        logger.info(
+            f"{descricao}: {len(podadas)} de {total} consultas fora do mandato podadas "
+            f"({len(podadas) / total:.0%}, ao menos {len(podadas)} requisições a menos)"
+        )
@@ -0,0 +1,161 @@
+"""Manifesto de hashes das despesas por (deputado, ano, mes).
+
+Guarda, ao lado do dataset (`<base>/_manifesto/ano=YYYY/mes=MM.json`), o hash
+do conteúdo de cada unidade gravada. Um DatasetSink com manifesto passa cada
+lote por `filtrar`: só as unidades cujo hash mudou vão para o dataset, e
+`particoes_alteradas` diz quais partições a carga no Snowflake e o dbt
+precisam reprocessar. O manifesto só é gravado (`salvar`) depois que os
+arquivos foram publicados, junto com um registro em
+`<base>/_manifesto/alteracoes/` das partições alteradas, para cargas que não
+recebem a lista por XCom (`particoes_alteradas_desde`).
+
+Tarefas que gravam as mesmas partições ao mesmo tempo (os shards de
+deputados da full_despesas) passam um `shard` cada: os hashes vão para
+`mes=MM-<shard>.json`, e uma não sobrescreve o arquivo da outra. O deputado
+deve cair sempre no mesmo shard; um deputado sem hash no arquivo do seu
+shard só é gravado de novo (e as duplicatas exatas ficam no índice).
+
+O hash ignora as colunas que a ingestão acrescenta (deputado_id,
+legislatura_id...), para que o mesmo conteúdo da API tenha o mesmo hash em
+qualquer produtor. Um mês que deixa de ter despesas não é detectado: sem
+linhas não há o que gravar.
+"""
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+import pyarrow.fs as pafs
+
+from include.camara.dataset import DATASET_PADRAO, resolver
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_INGESTAO = {'deputado_id', 'legislatura_id', 'ano_legislatura'}
+
+
+def hash_unidade(despesas):
+    """Hash estável de uma unidade: não depende da ordem das despesas nem das chaves."""
+    linhas = sorted(
+        json.dumps({k: v for k, v in d.items() if k not in COLUNAS_INGESTAO},
+                   sort_keys=True, ensure_ascii=False, default=str)
+        for d in despesas
+    )
+    return hashlib.sha256('\n'.join(linhas).encode('utf-8')).hexdigest()
+
+
+class Manifesto:
+    """Hashes por partição, carregados sob demanda e gravados em salvar()."""
+
+    def __init__(self, base=DATASET_PADRAO, filesystem=None, shard=None):
+        self.filesystem, self.base = resolver(base, filesystem)
+        self.shard = shard
+        self._lock = threading.Lock()
+        self._particoes = {}
+        self._pendentes = defaultdict(dict)
+        self._alteradas = set()
+        self.unidades = {'alteradas': 0, 'iguais': 0}
+
+    def _caminho(self, ano, mes):
+        sufixo = f"-{self.shard}" if self.shard is not None else ''
+        return f"{self.base}/_manifesto/ano={int(ano)}/mes={int(mes):02d}{sufixo}.json"
+
+    def _hashes(self, ano, mes):
+        if (ano, mes) not in self._particoes:
+            try:
+                with self.filesystem.open_input_stream(self._caminho(ano, mes)) as f:
+                    self._particoes[(ano, mes)] = json.loads(f.read())
+            except FileNotFoundError:
+                self._particoes[(ano, mes)] = {}
+        return self._particoes[(ano, mes)]
+
+    def registrar(self, deputado_id, ano, mes, despesas):
+        """Anota o hash da unidade; devolve True se ela é nova ou mudou."""
+        ano, mes = int(ano), int(mes)
+        digest = hash_unidade(despesas)
+        with self._lock:
+            anterior = self._hashes(ano, mes).get(str(deputado_id))
+            alterada = anterior is None or anterior['hash'] != digest
+            self.unidades['alteradas' if alterada else 'iguais'] += 1
+            if alterada and despesas:
+                self._alteradas.add((ano, mes))
+            if alterada:
+                self._pendentes[(ano, mes)][str(deputado_id)] = {
+                    'hash': digest,
+                    'linhas': len(despesas),
+                    'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+                }
+        return alterada
+
+    def filtrar(self, despesas):
+        """Devolve só as despesas das unidades (deputado_id, ano, mes) novas ou alteradas.
+
+        Cada lote deve trazer as unidades inteiras (p.ex. tudo de uma consulta):
+        uma unidade repartida entre lotes teria cada parte comparada com o hash do todo.
+        """
+        por_unidade = defaultdict(list)
+        for despesa in despesas:
+            por_unidade[(despesa['deputado_id'], int(despesa['ano']), int(despesa['mes']))].append(despesa)
+
+        alteradas = []
+        for (deputado_id, ano, mes), linhas in por_unidade.items():
+            if self.registrar(deputado_id, ano, mes, linhas):
+                alteradas.extend(linhas)
+        return alteradas
+
+    @property
+    def particoes_alteradas(self):
+        """[(ano, mes)] em que alguma unidade alterada tem despesas a gravar, em ordem."""
+        with self._lock:
+            return sorted(self._alteradas)
+
+    def _gravar_json(self, caminho, conteudo):
+        self.filesystem.create_dir(caminho.rsplit('/', 1)[0], recursive=True)
+        with self.filesystem.open_output_stream(caminho) as f:
+            f.write(json.dumps(conteudo, sort_keys=True).encode('utf-8'))
+
+    def salvar(self):
+        """Grava os hashes das unidades alteradas e o registro das partições
+        alteradas (chamar depois de publicar os arquivos)."""
+        with self._lock:
+            particoes = sorted(p for p in self._pendentes if p in self._alteradas)
+            for (ano, mes), unidades in sorted(self._pendentes.items()):
+                hashes = self._hashes(ano, mes)
+                hashes.update(unidades)
+                self._gravar_json(self._caminho(ano, mes), hashes)
+            if particoes:
+                instante = datetime.now().strftime("%Y%m%dT%H%M%S")
+                self._gravar_json(
+                    f"{self.base}/_manifesto/alteracoes/{instante}-{uuid.uuid4().hex[:8]}.json",
+                    {'gravado_em': instante, 'particoes': [list(p) for p in particoes]},
+                )
+            self._pendentes.clear()
+
+    def descartar(self):
+        """Esquece as unidades anotadas desde o último salvar (os arquivos não foram publicados)."""
+        with self._lock:
+            self._pendentes.clear()
+            self._alteradas.clear()
+
+    def log_estatisticas(self):
+        logger.info(
+            f"Manifesto: {self.unidades['alteradas']} unidades (deputado, ano, mes) alteradas, "
+            f"{self.unidades['iguais']} iguais puladas; partições alteradas: "
+            f"{', '.join(f'{a}-{m:02d}' for a, m in self.particoes_alteradas) or 'nenhuma'}"
+        )
+
+
+def particoes_alteradas_desde(base=DATASET_PADRAO, instante=None, filesystem=None):
+    """[(ano, mes)] alteradas nos registros gravados depois de `instante`
+    ('YYYYmmddTHHMMSS'; None = todos), em ordem."""
+    filesystem, base = resolver(base, filesystem)
+    selecao = pafs.FileSelector(f"{base}/_manifesto/alteracoes", allow_not_found=True)
+    particoes = set()
+    for info in filesystem.get_file_info(selecao):
+        if info.base_name.endswith('.json') and (instante is None or info.base_name.split('-', 1)[0] > instante):
+            with filesystem.open_input_stream(info.path) as f:
+                particoes.update(tuple(p) for p in json.loads(f.read())['particoes'])
+    return sorted(particoes)
@@ -0,0 +1,171 @@
+"""Cache dos metadados da Câmara: legislaturas, listas de deputados e histórico de mandatos.
+
+Esses dados mudam pouco, mas eram pedidos de novo a cada execução (e, em
+despesas.py, uma vez por deputado). O MetadadosCache memoriza as respostas no
+processo e num SQLite local com validade (TTL), compartilhado entre
+processos e execuções; `estatisticas()` conta acertos e faltas.
+"""
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from include.camara.client import get_client
+
+logger = logging.getLogger(__name__)
+
+CACHE_PADRAO = os.getenv(
+    'CAMARA_METADADOS_CACHE',
+    os.path.join(tempfile.gettempdir(), 'camara_metadados.sqlite'),
+)
+TTL_PADRAO = float(os.getenv('CAMARA_METADADOS_TTL', 24 * 3600))
+# Legislaturas passadas não mudam; só a atual ganha dataFim quando termina
+TTL_LEGISLATURAS = 7 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadados (
+    chave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL,
+    gravado_em REAL NOT NULL
+);
+"""
+
+
+class MetadadosCache:
+    """Respostas de endpoints de metadados, em memória e em disco, com validade.
+
+    client: CamaraClient usado nas faltas (padrão: get_client()).
+    offline: nunca chama a API; usa o que houver no cache, mesmo vencido, e
+    devolve None nas faltas, guardando as chaves em `faltando` (p.ex. para
+    estimar um plano sem requisições).
+    """
+
+    def __init__(self, path=CACHE_PADRAO, ttl=TTL_PADRAO, client=None, offline=False):
+        self.path = path
+        self.ttl = ttl
+        self.offline = offline
+        self.faltando = set()
+        self._client = client
+        self._memoria = {}
+        self._lock = threading.Lock()
+        self._contadores = {'memoria': 0, 'disco': 0, 'faltas': 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    @property
+    def client(self):
+        return self._client or get_client()
+
+    def obter(self, chave, carregar, ttl=None):
+        """Valor da chave, do cache se ainda válido; senão chama carregar() e grava.
+
+        Resultados vazios (API fora do ar, legislatura sem deputados ainda) não
+        são gravados, para não prender uma falha pelo TTL inteiro.
+        """
+        ttl = float('inf') if self.offline else self.ttl if ttl is None else ttl
+        agora = time.time()
+        with self._lock:
+            if chave in self._memoria and agora - self._memoria[chave][1] < ttl:
+                self._contadores['memoria'] += 1
+                return self._memoria[chave][0]
+            linha = self._conn.execute(
+                "SELECT valor, gravado_em FROM metadados WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha and agora - linha[1] < ttl:
+                self._contadores['disco'] += 1
+                valor = json.loads(linha[0])
+                self._memoria[chave] = (valor, linha[1])
+                return valor
+            self._contadores['faltas'] += 1
+
+        if self.offline:
+            self.faltando.add(chave)
+            return None
+        valor = carregar()
+        if valor:
+            with self._lock, self._conn:
+                self._memoria[chave] = (valor, agora)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO metadados VALUES (?, ?, ?)",
+                    (chave, json.dumps(valor, ensure_ascii=False), agora),
+                )
+        return valor
+
+    def _lista(self, endpoint, params=None, ttl=None):
+        chave = json.dumps([endpoint, sorted((params or {}).items())])
+        return self.obter(chave, lambda: self.client.fetch_all_pages(endpoint, params), ttl)
+
+    def legislaturas(self):
+        """Todas as legislaturas (id, dataInicio, dataFim), da mais recente para a mais antiga."""
+        return self._lista('legislaturas', {'ordem': 'DESC', 'ordenarPor': 'id'}, ttl=TTL_LEGISLATURAS)
+
+    def legislatura(self, legislatura_id):
+        """Uma legislatura pelo id (None se não existir)."""
+        for leg in self.legislaturas() or []:
+            if leg['id'] == int(legislatura_id):
+                return leg
+        return None
+
+    def deputados(self, legislatura_id=None, data_inicio=None, data_fim=None):
+        """Deputados de uma legislatura, em exercício num período, ou os atuais (sem filtros)."""
+        params = {'ordem': 'ASC', 'ordenarPor': 'nome'}
+        if legislatura_id is not None:
+            params['idLegislatura'] = int(legislatura_id)
+        if data_inicio:
+            params['dataInicio'] = data_inicio
+        if data_fim:
+            params['dataFim'] = data_fim
+        return self._lista('deputados', params)
+
+    def deputados_ids(self, legislatura_id=None, data_inicio=None, data_fim=None):
+        return [dep['id'] for dep in self.deputados(legislatura_id, data_inicio, data_fim) or []]
+
+    def historico(self, deputado_id):
+        """Mudanças de situação do deputado (posse, licença, fim de mandato...), com dataHora."""
+        return self._lista(f'deputados/{int(deputado_id)}/historico')
+
+    def estatisticas(self):
+        with self._lock:
+            acertos = self._contadores['memoria'] + self._contadores['disco']
+            total = acertos + self._contadores['faltas']
+            return {
+                'acertos': acertos,
+                'acertos_memoria': self._contadores['memoria'],
+                'acertos_disco': self._contadores['disco'],
+                'faltas': self._contadores['faltas'],
+                'taxa_acerto': acertos / total if total else 0.0,
+            }
+
+    def log_estatisticas(self):
+        stats = self.estatisticas()
+        logger.info(
+            f"Cache de metadados: {stats['acertos']} acertos ({stats['acertos_memoria']} em memória, "
+            f"{stats['acertos_disco']} em disco), {stats['faltas']} faltas ({stats['taxa_acerto']:.0%} de acerto)"
+        )
+
+    def limpar(self):
+        with self._lock, self._conn:
+            self._memoria.clear()
+            self._conn.execute("DELETE FROM metadados")
+
+    def close(self):
+        self._conn.close()
+
+
+_metadados = None
+_metadados_lock = threading.Lock()
+
+
+def get_metadados(**kwargs):
+    """Devolve o cache de metadados do processo, criando-o na primeira chamada
+    (os kwargs só têm efeito na criação)."""
+    global _metadados
+    with _metadados_lock:
+        if _metadados is None:
+            _metadados = MetadadosCache(**kwargs)
+        return _metadados
@@ -0,0 +1,213 @@
+"""Métricas das requisições à API da Câmara, agregadas por execução.
+
+O CamaraClient (e o modo async de despesas_v2) registra em um
+MetricasRequisicoes cada requisição: rota, status, latência e bytes
+recebidos, além das retentativas, do tempo esperando o limitador de taxa,
+das respostas servidas pelo cache, das páginas por consulta e das consultas
+podadas pelo período de mandato (que não chegaram a ser feitas). `relatorio()`
+devolve o agregado (JSON), `openmetrics()` o mesmo no formato texto do
+OpenMetrics/Prometheus, e `exportar()` grava o relatório (e, se pedido, o
+texto OpenMetrics) num diretório, um arquivo por execução (CAMARA_METRICAS_DIR).
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_PADRAO = os.getenv('CAMARA_METRICAS_DIR', os.path.join(tempfile.gettempdir(), 'camara_metricas'))
+LIMITES_LATENCIA = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LIMITES_PAGINAS = (1, 2, 3, 5, 10, 20, 50)
+
+
+def rota(path):
+    """Rota de um caminho da API, sem os ids: '/deputados/{id}/despesas'."""
+    return re.sub(r'/\d+(?=/|$)', '/{id}', path.rstrip('/')) or '/'
+
+
+class _Histograma:
+    """Contagens por limite superior (não cumulativas) mais soma e observações."""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.valores = array('d')
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.valores.append(valor)
+
+    def percentil(self, p, ordenados):
+        if not ordenados:
+            return 0.0
+        return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+    def resumo(self):
+        ordenados = sorted(self.valores)
+        n = len(ordenados)
+        acumulado, buckets = 0, {}
+        for limite, contagem in zip((*self.limites, '+Inf'), self.contagens):
+            acumulado += contagem
+            buckets[str(limite)] = acumulado
+        return {
+            'observacoes': n,
+            'soma': round(self.soma, 6),
+            'media': round(self.soma / n, 6) if n else 0.0,
+            'p50': self.percentil(0.5, ordenados),
+            'p90': self.percentil(0.9, ordenados),
+            'p99': self.percentil(0.99, ordenados),
+            'max': ordenados[-1] if n else 0.0,
+            'buckets': buckets,
+        }
+
+
+class MetricasRequisicoes:
+    """Contadores e histogramas das requisições de um processo, seguros entre threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        with self._lock:
+            self.inicio = time.time()
+            self._status = Counter()
+            self._por_rota = defaultdict(lambda: {'requisicoes': 0, 'latencia': 0.0, 'bytes': 0})
+            self._latencia = _Histograma(LIMITES_LATENCIA)
+            self._paginas = _Histograma(LIMITES_PAGINAS)
+            self.bytes_recebidos = 0
+            self.retentativas = 0
+            self.espera_limitador = 0.0
+            self.respostas_cache = 0
+            self.consultas_podadas = 0
+
+    def registrar_requisicao(self, rota, status, segundos, tamanho=0):
+        """Uma requisição enviada (status 'erro' para falhas de conexão/timeout)."""
+        with self._lock:
+            self._status[(rota, str(status))] += 1
+            por_rota = self._por_rota[rota]
+            por_rota['requisicoes'] += 1
+            por_rota['latencia'] += segundos
+            por_rota['bytes'] += tamanho
+            self._latencia.observar(segundos)
+            self.bytes_recebidos += tamanho
+
+    def registrar_retentativa(self):
+        with self._lock:
+            self.retentativas += 1
+
+    def registrar_espera(self, segundos):
+        """Tempo bloqueado no limitador de taxa antes de uma requisição (somado entre
+        threads/corrotinas, então pode passar da duração da execução)."""
+        if segundos:
+            with self._lock:
+                self.espera_limitador += segundos
+
+    def registrar_cache(self):
+        """Resposta servida pelo cache sem requisição (ttl)."""
+        with self._lock:
+            self.respostas_cache += 1
+
+    def registrar_poda(self, consultas):
+        """Consultas descartadas do plano por estarem fora do mandato do deputado."""
+        with self._lock:
+            self.consultas_podadas += consultas
+
+    def registrar_consulta(self, paginas):
+        """Uma consulta paginada concluída com `paginas` requisições de página."""
+        with self._lock:
+            self._paginas.observar(paginas)
+
+    def relatorio(self):
+        with self._lock:
+            fim = time.time()
+            por_status = Counter()
+            for (_, status), n in self._status.items():
+                por_status[status] += n
+            return {
+                'inicio': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'),
+                'fim': datetime.fromtimestamp(fim).isoformat(timespec='seconds'),
+                'duracao_s': round(fim - self.inicio, 3),
+                'requisicoes': sum(por_status.values()),
+                'por_status': dict(sorted(por_status.items())),
+                'por_rota': {
+                    rota: {
+                        'requisicoes': r['requisicoes'],
+                        'latencia_media_s': round(r['latencia'] / r['requisicoes'], 6),
+                        'bytes': r['bytes'],
+                    }
+                    for rota, r in sorted(self._por_rota.items())
+                },
+                'latencia_s': self._latencia.resumo(),
+                'bytes_recebidos': self.bytes_recebidos,
+                'retentativas': self.retentativas,
+                'espera_limitador_s': round(self.espera_limitador, 3),
+                'respostas_cache': self.respostas_cache,
+                'consultas_podadas': self.consultas_podadas,
+                'paginas_por_consulta': self._paginas.resumo(),
+            }
+
+    def openmetrics(self):
+        """O relatório no formato de exposição texto do OpenMetrics."""
+        with self._lock:
+            linhas = ['# TYPE camara_api_requisicoes counter',
+                      '# HELP camara_api_requisicoes Requisicoes enviadas a API, por rota e status.']
+            linhas += [f'camara_api_requisicoes_total{{rota="{rota_}",status="{status}"}} {n}'
+                       for (rota_, status), n in sorted(self._status.items())]
+            linhas += self._histograma_openmetrics('camara_api_latencia_segundos', self._latencia)
+            linhas += self._histograma_openmetrics('camara_api_paginas_por_consulta', self._paginas)
+            for nome, valor in [('camara_api_bytes_recebidos', self.bytes_recebidos),
+                                ('camara_api_retentativas', self.retentativas),
+                                ('camara_api_espera_limitador_segundos', round(self.espera_limitador, 6)),
+                                ('camara_api_respostas_cache', self.respostas_cache),
+                                ('camara_api_consultas_podadas', self.consultas_podadas)]:
+                linhas += [f'# TYPE {nome} counter', f'{nome}_total {valor}']
+        linhas.append('# EOF')
+        return '\n'.join(linhas) + '\n'
+
+    @staticmethod
+    def _histograma_openmetrics(nome, histograma):
+        linhas = [f'# TYPE {nome} histogram']
+        acumulado = 0
+        for limite, contagem in zip((*histograma.limites, '+Inf'), histograma.contagens):
+            acumulado += contagem
+            linhas.append(f'{nome}_bucket{{le="{limite}"}} {acumulado}')
+        linhas += [f'{nome}_sum {round(histograma.soma, 6)}', f'{nome}_count {acumulado}']
+        return linhas
+
+    def exportar(self, origem, diretorio=None, openmetrics=None):
+        """Grava o relatório (<instante>-<origem>-<pid>.json e, se pedido, .prom);
+        devolve o caminho do JSON. openmetrics=None segue CAMARA_METRICAS_OPENMETRICS."""
+        diretorio = diretorio or DIRETORIO_PADRAO
+        if openmetrics is None:
+            openmetrics = os.getenv('CAMARA_METRICAS_OPENMETRICS', '') == '1'
+        os.makedirs(diretorio, exist_ok=True)
+        nome = os.path.join(diretorio, f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{origem}-{os.getpid()}")
+        with open(f"{nome}.json", 'w') as f:
+            json.dump({'origem': origem, **self.relatorio()}, f, indent=2)
+        if openmetrics:
+            with open(f"{nome}.prom", 'w') as f:
+                f.write(self.openmetrics())
+        logger.info(f"Métricas das requisições gravadas em {nome}.json")
+        return f"{nome}.json"
+
+    def log_resumo(self):
+        r = self.relatorio()
+        lat, pag = r['latencia_s'], r['paginas_por_consulta']
+        logger.info(
+            f"Requisições: {r['requisicoes']} ({', '.join(f'{s}: {n}' for s, n in r['por_status'].items()) or '-'}), "
+            f"latência p50 {lat['p50']:.3f}s / p90 {lat['p90']:.3f}s / p99 {lat['p99']:.3f}s, "
+            f"{r['bytes_recebidos'] / 1024 / 1024:.1f} MB recebidos, {r['retentativas']} retentativas, "
+            f"{r['espera_limitador_s']:.1f}s esperando o limitador, {pag['observacoes']} consultas "
+            f"({pag['media']:.1f} páginas em média)"
+        )
@@ -0,0 +1,180 @@
+"""Planejador de consultas de despesas que minimiza o número de requisições.
+
+Em vez de uma consulta por mês (12 x anos x deputados), pede o ano inteiro de
+cada deputado com o maior `itens` aceito pela API e usa os links da resposta
+para buscar as demais páginas. Só divide em meses quando a consulta anual
+passaria de `max_paginas` páginas.
+"""
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from include.camara.client import ConsultaIncompleta, link, numero_pagina
+from include.camara.mandatos import podar_consultas
+
+logger = logging.getLogger(__name__)
+
+ITENS_MAXIMO = 100
+MAX_PAGINAS = 20
+LINHAS_MES_PADRAO = 30
+
+
+class Consulta(NamedTuple):
+    """Uma consulta a /deputados/{id}/despesas; mes=None pede o ano inteiro."""
+    deputado_id: int
+    ano: int
+    mes: Optional[int] = None
+
+    @property
+    def endpoint(self):
+        return f"deputados/{self.deputado_id}/despesas"
+
+    def params(self, itens=ITENS_MAXIMO, extra=None):
+        params = {'ano': self.ano, 'itens': itens, **(extra or {})}
+        if self.mes is not None:
+            params['mes'] = self.mes
+        return params
+
+    def meses_cobertos(self, agora=None):
+        """Meses que a consulta cobre (todos até o mês corrente, se anual)."""
+        if self.mes is not None:
+            return [self.mes]
+        return [c.mes for c in self.meses(agora)]
+
+    def meses(self, agora=None):
+        """Divide uma consulta anual em consultas mensais (até o mês corrente)."""
+        agora = agora or datetime.now()
+        ultimo_mes = agora.month if self.ano == agora.year else 12
+        return [Consulta(self.deputado_id, self.ano, mes) for mes in range(1, ultimo_mes + 1)]
+
+
+def anos_legislatura(legislatura_info, agora=None):
+    agora = agora or datetime.now()
+    return range(legislatura_info['anoInicio'], min(legislatura_info['anoFim'], agora.year) + 1)
+
+
+def planejar_consultas(dep_ids, anos, linhas_estimadas=None, itens=ITENS_MAXIMO, max_paginas=MAX_PAGINAS,
+                       concluidas=None, periodo=None):
+    """Uma consulta anual por deputado, ou mensais quando o histórico indica
+    que o ano passaria de max_paginas páginas.
+
+    linhas_estimadas: {(deputado_id, ano, mes): linhas}, p.ex. de uma carga anterior.
+    concluidas: {(deputado_id, ano, mes)} já baixados (checkpoint); anos completos
+    são pulados e anos parciais viram consultas só dos meses que faltam.
+    periodo: {(ano, mes)} a baixar (padrão: todos); anos só em parte no período
+    também viram consultas mensais.
+    """
+    linhas_ano = _linhas_por_ano(linhas_estimadas)
+    concluidas = concluidas or set()
+    consultas = []
+    for dep_id in dep_ids:
+        for ano in anos:
+            consulta = Consulta(dep_id, ano)
+            meses = consulta.meses()
+            faltando = [c for c in meses if (dep_id, ano, c.mes) not in concluidas
+                        and (periodo is None or (ano, c.mes) in periodo)]
+            if not faltando:
+                continue
+            if len(faltando) < len(meses) or math.ceil(linhas_ano.get((dep_id, ano), 0) / itens) > max_paginas:
+                consultas.extend(faltando)
+            else:
+                consultas.append(consulta)
+    return consultas
+
+
+def _linhas_por_ano(linhas_estimadas):
+    linhas_ano = defaultdict(int)
+    for (dep_id, ano, _mes), linhas in (linhas_estimadas or {}).items():
+        linhas_ano[(dep_id, ano)] += linhas
+    return linhas_ano
+
+
+def _linhas(linhas_estimadas, dep_id, ano, mes):
+    if linhas_estimadas is None:
+        return LINHAS_MES_PADRAO
+    return linhas_estimadas.get((dep_id, ano, mes), 0)
+
+
+def estimar_requisicoes_planejadas(consultas, linhas_estimadas=None, itens=ITENS_MAXIMO):
+    """Requisições do plano: uma por página, sem a página vazia final (usa rel=last)."""
+    total = 0
+    for consulta in consultas:
+        meses = consulta.meses_cobertos()
+        linhas = sum(_linhas(linhas_estimadas, consulta.deputado_id, consulta.ano, mes) for mes in meses)
+        total += max(1, math.ceil(linhas / itens))
+    return total
+
+
+def estimar_requisicoes_mensais(dep_ids, anos, linhas_estimadas=None, itens=100, agora=None):
+    """Requisições da abordagem atual: uma consulta por mês, paginando com
+    itens=100 até receber uma página vazia."""
+    total = 0
+    for dep_id in dep_ids:
+        for ano in anos:
+            for consulta in Consulta(dep_id, ano).meses(agora):
+                linhas = _linhas(linhas_estimadas, dep_id, ano, consulta.mes)
+                total += math.ceil(linhas / itens) + 1
+    return total
+
+
+def resumo_plano(dep_ids, anos, linhas_estimadas=None, itens=ITENS_MAXIMO, max_paginas=MAX_PAGINAS, ativos=None):
+    """Compara o plano com a abordagem mês a mês, sem fazer requisições.
+
+    ativos: meses em exercício por deputado (ver mandatos.meses_ativos) para podar o plano.
+    """
+    consultas = planejar_consultas(dep_ids, anos, linhas_estimadas, itens=itens, max_paginas=max_paginas)
+    consultas, podadas = podar_consultas(consultas, ativos)
+    planejadas = estimar_requisicoes_planejadas(consultas, linhas_estimadas, itens=itens)
+    atuais = estimar_requisicoes_mensais(dep_ids, anos, linhas_estimadas)
+    return {
+        'deputados': len(dep_ids),
+        'consultas': len(consultas),
+        'consultas_mensais': sum(1 for c in consultas if c.mes is not None),
+        'consultas_podadas': len(podadas),
+        'requisicoes_planejadas': planejadas,
+        'requisicoes_atuais': atuais,
+        'reducao': 1 - planejadas / atuais if atuais else 0.0,
+        'estimativa': 'histórico' if linhas_estimadas is not None else f'{LINHAS_MES_PADRAO} linhas/mês',
+    }
+
+
+def executar_consulta(client, consulta, itens=ITENS_MAXIMO, max_paginas=MAX_PAGINAS, extra_params=None):
+    """Executa uma consulta buscando as páginas 2..N em paralelo a partir do
+    link rel=last; se uma consulta anual tiver mais de max_paginas páginas,
+    refaz mês a mês. Levanta ConsultaIncompleta se alguma página falhar."""
+    params = consulta.params(itens, extra_params)
+    data = client.get_json(consulta.endpoint, params={**params, 'pagina': 1})
+    if data is None:
+        raise ConsultaIncompleta(f"Consulta {consulta} falhou na página 1")
+    if not data.get('dados'):
+        client.metricas.registrar_consulta(1)
+        return []
+
+    if consulta.mes is None and numero_pagina(link(data, 'last')) > max_paginas:
+        logger.info(f"Consulta {consulta} passa de {max_paginas} páginas, dividindo por mês")
+        despesas = []
+        for mensal in consulta.meses():
+            try:
+                despesas.extend(executar_consulta(client, mensal, itens, max_paginas, extra_params))
+            except ConsultaIncompleta as e:
+                raise ConsultaIncompleta(str(e), despesas + e.dados) from e
+        return despesas
+
+    return client.paginas_restantes(consulta.endpoint, params, data)
+
+
+def linhas_do_dataset(base, legislatura):
+    """Contagem de linhas por (deputado_id, ano, mes) de uma carga anterior da
+    legislatura no dataset, para estimar o plano; None se não houver carga."""
+    import pyarrow.dataset as ds
+
+    from include.camara.dataset import abrir
+
+    tabela = abrir(base).to_table(columns=['deputado_id', 'ano', 'mes'],
+                                  filter=ds.field('legislatura_id') == legislatura)
+    if not tabela.num_rows:
+        return None
+    contagem = tabela.group_by(['deputado_id', 'ano', 'mes']).aggregate([([], 'count_all')])
+    return {(linha['deputado_id'], linha['ano'], linha['mes']): linha['count_all'] for linha in contagem.to_pylist()}
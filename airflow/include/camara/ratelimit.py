@@ -0,0 +1,244 @@
+"""Limitador de taxa (token bucket) adaptativo para a API da Câmara.
+
+O estado do bucket fica num backend compartilhado: em memória (threads de um
+mesmo processo) ou num arquivo local com lock (vários processos na mesma
+máquina, p.ex. o ProcessPoolExecutor de ingestao/despesas.py e os workers do
+Airflow). A taxa sobe enquanto a API responde bem e cai quando aparecem 429 ou
+5xx; um Retry-After bloqueia todos os consumidores até o horário indicado.
+
+A taxa aprendida só vale enquanto o estado está em uso: um estado parado há
+mais de `validade` segundos (p.ex. o de uma execução que terminou durante uma
+instabilidade da API) ou gravado com outra taxa inicial (CAMARA_RATE_LIMIT
+mudou) recomeça da taxa inicial.
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after_segundos(valor):
+    """Converte um cabeçalho Retry-After (segundos ou data HTTP) em segundos."""
+    if not valor:
+        return None
+    try:
+        return max(float(valor), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(valor).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class MemoryBackend:
+    """Estado do bucket em memória, compartilhado entre threads do processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._estado = {}
+
+    @contextmanager
+    def transacao(self):
+        with self._lock:
+            yield self._estado
+
+
+class FileBackend:
+    """Estado do bucket num arquivo JSON com lock, compartilhado entre processos."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @staticmethod
+    def _trava(f):
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    @staticmethod
+    def _destrava(f):
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @contextmanager
+    def transacao(self):
+        with self._lock, open(self.path, 'a+') as f:
+            self._trava(f)
+            try:
+                f.seek(0)
+                conteudo = f.read()
+                try:
+                    estado = json.loads(conteudo) if conteudo.strip() else {}
+                except json.JSONDecodeError:
+                    estado = {}
+                yield estado
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(estado))
+                f.flush()
+            finally:
+                self._destrava(f)
+
+
+class RateLimiter:
+    """Token bucket com ajuste AIMD da taxa a partir das respostas observadas.
+
+    A cada `janela` respostas, a taxa é multiplicada por `fator_aumento` se não
+    houve erro, ou por `fator_reducao` se a fração de 429/5xx passou de
+    `limiar_erros`. Um 429 também reduz a taxa na hora (no máximo uma vez por
+    segundo) e esvazia o bucket. Um estado sem uso há mais de `validade`
+    segundos, ou de outra taxa_inicial, volta à taxa inicial.
+    """
+
+    def __init__(self, backend=None, taxa_inicial=10.0, taxa_minima=0.5, taxa_maxima=50.0,
+                 janela=20, limiar_erros=0.1, fator_reducao=0.5, fator_aumento=1.1, validade=3600.0):
+        self.backend = backend or MemoryBackend()
+        self.taxa_inicial = taxa_inicial
+        self.taxa_minima = taxa_minima
+        self.taxa_maxima = taxa_maxima
+        self.janela = janela
+        self.limiar_erros = limiar_erros
+        self.fator_reducao = fator_reducao
+        self.fator_aumento = fator_aumento
+        self.validade = validade
+
+    def _prepara(self, estado, agora):
+        if 'taxa' in estado and estado.get('taxa_inicial') != self.taxa_inicial:
+            logger.info(f"Taxa inicial mudou para {self.taxa_inicial:.2f} req/s: taxa aprendida descartada")
+            estado.pop('taxa')
+        elif 'taxa' in estado and agora - estado['atualizado_em'] > self.validade:
+            logger.info(f"Estado do limitador sem uso há mais de {self.validade:.0f}s: "
+                        f"taxa volta de {estado['taxa']:.2f} para {self.taxa_inicial:.2f} req/s")
+            estado.pop('taxa')
+        if 'taxa' not in estado:
+            estado.update({
+                'taxa': self.taxa_inicial,
+                'taxa_inicial': self.taxa_inicial,
+                'tokens': 1.0,
+                'atualizado_em': agora,
+                # Um Retry-After ainda em vigor continua valendo
+                'bloqueado_ate': estado.get('bloqueado_ate', 0.0),
+                'ultima_reducao': 0.0,
+                'janela_total': 0,
+                'janela_erros': 0,
+            })
+        estado['taxa'] = min(max(estado['taxa'], self.taxa_minima), self.taxa_maxima)
+        capacidade = max(1.0, estado['taxa'])
+        decorrido = max(agora - estado['atualizado_em'], 0.0)
+        estado['tokens'] = min(capacidade, estado['tokens'] + decorrido * estado['taxa'])
+        estado['atualizado_em'] = agora
+
+    def _ajusta_taxa(self, estado, fator, motivo):
+        anterior = estado['taxa']
+        estado['taxa'] = min(max(anterior * fator, self.taxa_minima), self.taxa_maxima)
+        if estado['taxa'] != anterior:
+            logger.info(f"Taxa da API ajustada de {anterior:.2f} para {estado['taxa']:.2f} req/s ({motivo})")
+
+    def _tenta_consumir(self):
+        """Consome um token se possível; senão devolve quanto tempo esperar."""
+        with self.backend.transacao() as estado:
+            agora = time.time()
+            self._prepara(estado, agora)
+            if agora < estado['bloqueado_ate']:
+                return estado['bloqueado_ate'] - agora
+            if estado['tokens'] >= 1:
+                estado['tokens'] -= 1
+                return 0.0
+            return (1 - estado['tokens']) / estado['taxa']
+
+    def acquire(self):
+        """Bloqueia até haver um token disponível; devolve o tempo esperado em segundos."""
+        esperado = 0.0
+        while True:
+            espera = self._tenta_consumir()
+            if espera <= 0:
+                return esperado
+            time.sleep(espera)
+            esperado += espera
+
+    async def acquire_async(self):
+        """Versão de acquire para o modo asyncio. A transação no backend (flock e
+        E/S de arquivo no FileBackend) roda numa thread, fora do event loop."""
+        esperado = 0.0
+        while True:
+            espera = await asyncio.to_thread(self._tenta_consumir)
+            if espera <= 0:
+                return esperado
+            await asyncio.sleep(espera)
+            esperado += espera
+
+    def registrar(self, status, retry_after=None):
+        """Informa o status de uma resposta para ajustar a taxa."""
+        erro = status == 429 or status >= 500
+        with self.backend.transacao() as estado:
+            agora = time.time()
+            self._prepara(estado, agora)
+
+            if status == 429:
+                espera = retry_after_segundos(retry_after)
+                if espera:
+                    estado['bloqueado_ate'] = max(estado['bloqueado_ate'], agora + espera)
+                estado['tokens'] = 0.0
+                if agora - estado['ultima_reducao'] >= 1.0:
+                    self._ajusta_taxa(estado, self.fator_reducao, "429")
+                    estado['ultima_reducao'] = agora
+
+            estado['janela_total'] += 1
+            estado['janela_erros'] += int(erro)
+            if estado['janela_total'] >= self.janela:
+                proporcao = estado['janela_erros'] / estado['janela_total']
+                if proporcao > self.limiar_erros:
+                    self._ajusta_taxa(estado, self.fator_reducao, f"{proporcao:.0%} de 429/5xx")
+                    estado['ultima_reducao'] = agora
+                elif proporcao == 0:
+                    self._ajusta_taxa(estado, self.fator_aumento, "sem erros")
+                estado['janela_total'] = 0
+                estado['janela_erros'] = 0
+
+    async def registrar_async(self, status, retry_after=None):
+        """Versão de registrar para o modo asyncio (também fora do event loop)."""
+        await asyncio.to_thread(self.registrar, status, retry_after)
+
+    def taxa_atual(self):
+        with self.backend.transacao() as estado:
+            self._prepara(estado, time.time())
+            return estado['taxa']
+
+
+def limitador_padrao():
+    """Limitador compartilhado por todos os processos da máquina.
+
+    CAMARA_RATE_LIMIT define a taxa inicial (req/s), CAMARA_RATE_LIMIT_MAX o teto
+    e CAMARA_RATE_LIMIT_FILE o arquivo de estado; a taxa aprendida persiste
+    entre execuções próximas (sempre limitada ao teto) e é descartada quando
+    CAMARA_RATE_LIMIT muda ou depois de CAMARA_RATE_LIMIT_VALIDADE segundos
+    sem uso (padrão: 1 hora).
+    """
+    caminho = os.getenv(
+        'CAMARA_RATE_LIMIT_FILE',
+        os.path.join(tempfile.gettempdir(), 'camara_api_ratelimit.json'),
+    )
+    return RateLimiter(FileBackend(caminho), taxa_inicial=float(os.getenv('CAMARA_RATE_LIMIT', '10')),
+                       taxa_maxima=float(os.getenv('CAMARA_RATE_LIMIT_MAX', '50')),
+                       validade=float(os.getenv('CAMARA_RATE_LIMIT_VALIDADE', '3600')))
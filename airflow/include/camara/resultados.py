@@ -0,0 +1,61 @@
+"""Resultados das tarefas mapeadas no landing store, fora da XCom.
+
+Numa carga full de várias legislaturas, cada tarefa mapeada da full_despesas
+devolvia pela XCom uma entrada por consulta (deputado, ano, mes), e a
+get_deputados_ids a lista inteira de ids: milhares de linhas por tarefa no
+banco de metadados do Airflow. Aqui essas listas vão para um NDJSON
+comprimido ao lado do landing (`<base>/_execucoes/<run_id>/<nome>.ndjson.gz`)
+e a XCom leva só o caminho e os contadores. `ler_resultados` e `ler_ids`
+leem de volta quem precisar do detalhe.
+"""
+import json
+import re
+
+import pyarrow.fs as pafs
+
+from include.camara.landing import aterrissar, chave_landing
+
+
+def caminho_execucao(base, run_id, nome):
+    """Caminho do objeto `nome` de uma execução da DAG (run_id) no landing store."""
+    return chave_landing(f"{base}/_execucoes/{re.sub(r'[^A-Za-z0-9_.=-]+', '_', run_id)}/{nome}")
+
+
+def _ler(caminho, filesystem=None):
+    filesystem = filesystem or pafs.LocalFileSystem()
+    with filesystem.open_input_stream(caminho, compression='detect') as f:
+        for linha in f.read().decode('utf-8').splitlines():
+            if linha:
+                yield json.loads(linha)
+
+
+def publicar_resultados(resultados, caminho, filesystem=None, **contadores):
+    """Grava as entradas por consulta ({'status', 'linhas'...}) em `caminho` e
+    devolve o resumo para a XCom: o caminho, os totais e os `contadores` extras."""
+    resultados = list(resultados)
+    aterrissar(resultados, caminho, filesystem=filesystem)
+    return {
+        'resultados': caminho,
+        'total_processed': len(resultados),
+        'successes': sum(1 for r in resultados if r['status'] == 'success'),
+        'errors': sum(1 for r in resultados if r['status'] == 'error'),
+        'linhas': sum(r.get('linhas', 0) for r in resultados),
+        **contadores,
+    }
+
+
+def ler_resultados(resumo, filesystem=None):
+    """As entradas por consulta de um resumo devolvido por publicar_resultados."""
+    return list(_ler(resumo['resultados'], filesystem))
+
+
+def publicar_ids(ids, caminho, filesystem=None, **extras):
+    """Grava os ids de deputados em `caminho`; devolve {'deputados': caminho, 'total', **extras}."""
+    ids = list(ids)
+    aterrissar(({'deputado_id': dep_id} for dep_id in ids), caminho, filesystem=filesystem)
+    return {'deputados': caminho, 'total': len(ids), **extras}
+
+
+def ler_ids(ponteiro, filesystem=None):
+    """Os ids gravados por publicar_ids, na mesma ordem."""
+    return [linha['deputado_id'] for linha in _ler(ponteiro['deputados'], filesystem)]
@@ -0,0 +1,113 @@
+"""Schema Arrow explícito das despesas brutas.
+
+Todo Parquet de despesas (scripts de `ingestao/` e DAGs) é escrito com este
+schema, em vez dos dtypes que o pandas infere do JSON: valores em decimal,
+datas em date32, ids inteiros e os textos muito repetidos (tipo de despesa,
+tipo de documento, fornecedor) como dicionário.
+"""
+import logging
+from datetime import date
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+_VALOR = pa.decimal128(12, 2)
+_CATEGORIA = pa.dictionary(pa.int32(), pa.string())
+_CENTAVO = Decimal('0.01')
+
+# Quase únicas por linha: dicionário só custaria a página de dicionário
+_SEM_DICIONARIO = {'codDocumento', 'numDocumento', 'urlDocumento'}
+
+DESPESAS_SCHEMA = pa.schema([
+    ('ano', pa.int16()),
+    ('mes', pa.int8()),
+    ('tipoDespesa', _CATEGORIA),
+    ('codDocumento', pa.int64()),
+    ('tipoDocumento', _CATEGORIA),
+    ('codTipoDocumento', pa.int32()),
+    ('dataDocumento', pa.date32()),
+    ('numDocumento', pa.string()),
+    ('valorDocumento', _VALOR),
+    ('urlDocumento', pa.string()),
+    ('nomeFornecedor', _CATEGORIA),
+    ('cnpjCpfFornecedor', _CATEGORIA),
+    ('valorLiquido', _VALOR),
+    ('valorGlosa', _VALOR),
+    ('numRessarcimento', pa.string()),
+    ('codLote', pa.int64()),
+    ('parcela', pa.int16()),
+    # Colunas adicionadas na ingestão
+    ('deputado_id', pa.int32()),
+    ('legislatura_id', pa.int16()),
+    ('ano_legislatura', _CATEGORIA),
+])
+
+
+def _vazio(valor):
+    return valor is None or valor == '' or valor != valor  # NaN
+
+
+def _inteiro(valor):
+    return None if _vazio(valor) else int(valor)
+
+
+def _decimal(valor):
+    return None if _vazio(valor) else Decimal(str(valor)).quantize(_CENTAVO)
+
+
+def _data(valor):
+    return None if _vazio(valor) else date.fromisoformat(str(valor)[:10])
+
+
+def _texto(valor):
+    return None if _vazio(valor) else str(valor)
+
+
+def _conversor(tipo):
+    if pa.types.is_integer(tipo):
+        return _inteiro
+    if pa.types.is_decimal(tipo):
+        return _decimal
+    if pa.types.is_date(tipo):
+        return _data
+    return _texto
+
+
+def para_tabela(registros, schema=DESPESAS_SCHEMA):
+    """Converte uma lista de dicts (JSON da API) numa pa.Table com o schema dado.
+
+    Colunas do schema ausentes nos registros ficam nulas; chaves fora do schema
+    são descartadas com um aviso.
+    """
+    registros = list(registros)
+    extras = {chave for registro in registros for chave in registro} - set(schema.names)
+    if extras:
+        logger.warning(f"Colunas fora do schema descartadas: {sorted(extras)}")
+
+    colunas = []
+    for campo in schema:
+        converte = _conversor(campo.type.value_type if pa.types.is_dictionary(campo.type) else campo.type)
+        valores = [converte(registro.get(campo.name)) for registro in registros]
+        if pa.types.is_dictionary(campo.type):
+            coluna = pa.array(valores, type=campo.type.value_type).dictionary_encode()
+        else:
+            coluna = pa.array(valores, type=campo.type)
+        colunas.append(coluna)
+    return pa.Table.from_arrays(colunas, schema=schema)
+
+
+def opcoes_parquet(schema=DESPESAS_SCHEMA):
+    """Opções do ParquetWriter: dicionário nas colunas repetitivas (categorias,
+    mas também ano, mês, data e deputado); as quase únicas ficam em plain."""
+    return {
+        'use_dictionary': [campo.name for campo in schema if campo.name not in _SEM_DICIONARIO],
+        'compression': 'snappy',
+    }
+
+
+def escrever_parquet(registros, destino, schema=DESPESAS_SCHEMA):
+    """Escreve registros num Parquet (caminho ou buffer) com o schema e as opções padrão."""
+    pq.write_table(para_tabela(registros, schema), destino, **opcoes_parquet(schema))
@@ -0,0 +1,187 @@
+"""Escrita incremental de despesas em Parquet, com memória limitada.
+
+Em vez de juntar todas as despesas de uma legislatura numa lista e só no fim
+chamar `pd.DataFrame(...).to_parquet`, o ParquetSink recebe os lotes à medida
+que os deputados terminam e grava um row group a cada `max_linhas` linhas.
+O arquivo é escrito em `<path>.tmp` e só aparece no caminho final em
+`fechar()`, para que uma extração interrompida não deixe um Parquet parcial.
+Em S3 o objeto só fica visível quando o upload termina, então o sink grava
+direto no caminho final. O NdjsonSink tem a mesma interface e grava JSON
+Lines comprimido, um registro por linha.
+"""
+import json
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from include.camara.schema import opcoes_parquet, para_tabela
+
+logger = logging.getLogger(__name__)
+
+MAX_LINHAS_BUFFER = 50_000
+
+
+class ParquetSink:
+    """Acumula no máximo `max_linhas` despesas em memória antes de gravar um row group.
+
+    Com `schema` (p.ex. schema.DESPESAS_SCHEMA), os lotes são convertidos por
+    para_tabela. Sem ele, o schema vem do primeiro lote inferido pelo pandas
+    (colunas sem nenhum valor viram string) e colunas que só aparecem depois
+    são descartadas com um aviso.
+    """
+
+    def __init__(self, path, max_linhas=MAX_LINHAS_BUFFER, schema=None, filesystem=None):
+        self.filesystem = filesystem or pafs.LocalFileSystem()
+        self._local = isinstance(self.filesystem, pafs.LocalFileSystem)
+        self.path = os.path.abspath(path) if self._local else path
+        self.max_linhas = max_linhas
+        self.linhas = 0
+        self._tmp = f"{self.path}.tmp" if self._local else self.path
+        self._buffer = []
+        self._writer = None
+        self._schema = schema
+        self._opcoes = opcoes_parquet(schema) if schema is not None else {}
+
+    def escrever(self, despesas):
+        """Adiciona despesas (lista ou gerador de dicts), gravando um row group a cada max_linhas."""
+        for despesa in despesas:
+            self._buffer.append(despesa)
+            if len(self._buffer) >= self.max_linhas:
+                self._flush()
+
+    def _tabela(self, registros):
+        if self._opcoes:
+            return para_tabela(registros, self._schema)
+
+        df = pd.DataFrame(registros)
+        if self._schema is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            campos = [pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in table.schema]
+            self._schema = pa.schema(campos, metadata=table.schema.metadata)
+
+        extras = set(df.columns) - set(self._schema.names)
+        if extras:
+            logger.warning(f"Colunas fora do schema de {self.path} descartadas: {sorted(extras)}")
+        df = df.reindex(columns=self._schema.names)
+        return pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+
+    def escrever_tabela(self, table):
+        """Grava uma pa.Table já no schema do sink (p.ex. lida de outro Parquet)."""
+        self._flush()
+        self._gravar(table)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        table = self._tabela(self._buffer)
+        self._buffer = []
+        self._gravar(table)
+
+    def _gravar(self, table):
+        if self._writer is None:
+            self.filesystem.create_dir(os.path.dirname(self.path), recursive=True)
+            self._writer = pq.ParquetWriter(self._tmp, self._schema, filesystem=self.filesystem, **self._opcoes)
+
+        self._writer.write_table(table)
+        self.linhas += table.num_rows
+
+    def fechar(self):
+        """Grava o que resta e publica o arquivo; devolve o total de linhas (0 = nenhum arquivo)."""
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            if self._tmp != self.path:
+                self.filesystem.move(self._tmp, self.path)
+        return self.linhas
+
+    def descartar(self):
+        """Abandona o arquivo em construção."""
+        self._buffer = []
+        self.linhas = 0
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self.filesystem.delete_file(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.fechar()
+        else:
+            self.descartar()
+
+
+class NdjsonSink:
+    """Como o ParquetSink, mas grava JSON Lines comprimido (gzip ou zstd).
+
+    Com `schema`, cada registro passa por para_tabela antes de virar JSON, com
+    os mesmos tipos do Parquet (valores decimais como texto, datas ISO); sem ele,
+    os dicts são gravados como vieram.
+    """
+
+    def __init__(self, path, max_linhas=MAX_LINHAS_BUFFER, schema=None, filesystem=None, compressao='gzip'):
+        self.filesystem = filesystem or pafs.LocalFileSystem()
+        self._local = isinstance(self.filesystem, pafs.LocalFileSystem)
+        self.path = os.path.abspath(path) if self._local else path
+        self.max_linhas = max_linhas
+        self.linhas = 0
+        self.compressao = compressao
+        self._tmp = f"{self.path}.tmp" if self._local else self.path
+        self._buffer = []
+        self._stream = None
+        self._schema = schema
+
+    def escrever(self, despesas):
+        for despesa in despesas:
+            self._buffer.append(despesa)
+            if len(self._buffer) >= self.max_linhas:
+                self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        registros = para_tabela(self._buffer, self._schema).to_pylist() if self._schema is not None else self._buffer
+        self._buffer = []
+        if self._stream is None:
+            self.filesystem.create_dir(os.path.dirname(self.path), recursive=True)
+            self._stream = self.filesystem.open_output_stream(self._tmp, compression=self.compressao)
+        self._stream.write(''.join(
+            json.dumps(registro, ensure_ascii=False, default=str, separators=(',', ':')) + '\n'
+            for registro in registros
+        ).encode('utf-8'))
+        self.linhas += len(registros)
+
+    def fechar(self):
+        """Grava o que resta e publica o arquivo; devolve o total de linhas (0 = nenhum arquivo)."""
+        self._flush()
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+            if self._tmp != self.path:
+                self.filesystem.move(self._tmp, self.path)
+        return self.linhas
+
+    def descartar(self):
+        """Abandona o arquivo em construção."""
+        self._buffer = []
+        self.linhas = 0
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+            self.filesystem.delete_file(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.fechar()
+        else:
+            self.descartar()
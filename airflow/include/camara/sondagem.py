@@ -0,0 +1,120 @@
+"""Sondagem barata de mudanças nas despesas de um deputado num ano (ou mês).
+
+A carga incremental baixava todo dia o mês atual e o anterior de todos os
+deputados em exercício, embora a maioria não mude de um dia para o outro.
+`sondar` pede só a página 1 com ITENS_SONDA item, ordenada por dataDocumento
+decrescente: o link rel=last dessa resposta dá o total de despesas do período
+(uma por página) e o item é a mais recente. O par (total, hash do item) é comparado com o estado da última carga
+completa (`EstadoSondagem`, guardado ao lado do dataset em
+`<base>/_sondagem/ano=YYYY.json`, ou `ano=YYYY/mes=MM.json` por mês), e só os
+deputados com mudança são baixados por inteiro. A incremental sonda primeiro o
+ano de cada deputado (uma requisição cobre o mês atual e o anterior) e só
+sonda mês a mês os deputados cujo ano mudou, que pode ter sido num mês antigo.
+
+A sondagem não vê uma despesa editada que não seja a mais recente e mantenha o
+total; por isso um período sem carga completa há mais de MAX_DIAS_SEM_CARGA
+dias é baixado de qualquer forma. Como o manifesto, o estado só é gravado
+(`salvar`) depois que os arquivos foram publicados.
+"""
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from include.camara.client import link, numero_pagina
+from include.camara.dataset import DATASET_PADRAO, resolver
+from include.camara.manifesto import hash_unidade
+
+logger = logging.getLogger(__name__)
+
+ITENS_SONDA = 1
+MAX_DIAS_SEM_CARGA = int(os.getenv('CAMARA_SONDAGEM_MAX_DIAS', 30))
+
+
+def sondar(client, deputado_id, ano, mes=None):
+    """{'total', 'assinatura', 'dados'} da página 1 com ITENS_SONDA itens, ou None se
+    a requisição falhou. `dados` já é o período inteiro quando total <= ITENS_SONDA."""
+    # Dentro de um ano, ordenar por 'ano' devolve um item arbitrário; por dataDocumento, a despesa mais recente
+    params = {'ano': ano, 'itens': ITENS_SONDA, 'pagina': 1, 'ordem': 'DESC', 'ordenarPor': 'dataDocumento'}
+    if mes is not None:
+        params['mes'] = mes
+    data = client.get_json(f"deputados/{deputado_id}/despesas", params=params)
+    if data is None:
+        return None
+    dados = data.get('dados') or []
+    total = max(numero_pagina(link(data, 'last')) * ITENS_SONDA, len(dados)) if dados else 0
+    return {'total': total, 'assinatura': hash_unidade(dados), 'dados': dados}
+
+
+class EstadoSondagem:
+    """(total, assinatura) da última carga completa de cada deputado por ano (mes=None) ou mês."""
+
+    def __init__(self, base=DATASET_PADRAO, filesystem=None, max_dias=MAX_DIAS_SEM_CARGA):
+        self.filesystem, self.base = resolver(base, filesystem)
+        self.max_dias = max_dias
+        self._lock = threading.Lock()
+        self._particoes = {}
+        self._pendentes = defaultdict(dict)
+        self.contadores = {'iguais': 0, 'alteradas': 0, 'vencidas': 0, 'sem_estado': 0}
+
+    def _caminho(self, ano, mes):
+        if mes is None:
+            return f"{self.base}/_sondagem/ano={int(ano)}.json"
+        return f"{self.base}/_sondagem/ano={int(ano)}/mes={int(mes):02d}.json"
+
+    def _estado(self, ano, mes):
+        if (ano, mes) not in self._particoes:
+            try:
+                with self.filesystem.open_input_stream(self._caminho(ano, mes)) as f:
+                    self._particoes[(ano, mes)] = json.loads(f.read())
+            except FileNotFoundError:
+                self._particoes[(ano, mes)] = {}
+        return self._particoes[(ano, mes)]
+
+    def mudou(self, deputado_id, ano, mes, sonda, agora=None):
+        """True se o período precisa de carga completa: sem estado, sonda diferente
+        do estado gravado ou última carga completa há mais de max_dias dias."""
+        agora = agora or datetime.now()
+        with self._lock:
+            anterior = self._estado(ano, mes).get(str(deputado_id))
+            if anterior is None:
+                motivo = 'sem_estado'
+            elif (anterior['total'], anterior['assinatura']) != (sonda['total'], sonda['assinatura']):
+                motivo = 'alteradas'
+            elif datetime.fromisoformat(anterior['carregado_em']) < agora - timedelta(days=self.max_dias):
+                motivo = 'vencidas'
+            else:
+                motivo = 'iguais'
+            self.contadores[motivo] += 1
+        return motivo != 'iguais'
+
+    def registrar(self, deputado_id, ano, mes, sonda):
+        """Anota a sonda de um período baixado por inteiro (gravada em salvar())."""
+        with self._lock:
+            self._pendentes[(ano, mes)][str(deputado_id)] = {
+                'total': sonda['total'],
+                'assinatura': sonda['assinatura'],
+                'carregado_em': datetime.now().isoformat(timespec='seconds'),
+            }
+
+    def salvar(self):
+        """Grava o estado dos períodos registrados (chamar depois de publicar os arquivos)."""
+        with self._lock:
+            for (ano, mes), deputados in self._pendentes.items():
+                estado = self._estado(ano, mes)
+                estado.update(deputados)
+                caminho = self._caminho(ano, mes)
+                self.filesystem.create_dir(caminho.rsplit('/', 1)[0], recursive=True)
+                with self.filesystem.open_output_stream(caminho) as f:
+                    f.write(json.dumps(estado, sort_keys=True).encode('utf-8'))
+            self._pendentes.clear()
+
+    def log_estatisticas(self):
+        c = self.contadores
+        logger.info(
+            f"Sondagem: {c['iguais']} deputados sem mudança pulados; carga completa de "
+            f"{c['alteradas']} alterados, {c['sem_estado']} sem estado e {c['vencidas']} sem carga completa "
+            f"há mais de {self.max_dias} dias"
+        )
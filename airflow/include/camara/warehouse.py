@@ -0,0 +1,149 @@
+"""Carga incremental no warehouse das partições alteradas do dataset de despesas.
+
+O Snowpipe carregava cada Parquet que chegava ao stage e uma task do
+Snowflake fazia o MERGE a cada 5 minutos; a carga da pipeline_camara fazia o
+MERGE sobre o stage inteiro. Nos dois casos o custo crescia com o histórico,
+não com o que chegou. A DAG carga_despesas é disparada pelos assets das
+partições gravadas (include/camara/assets.py) e executa `sql_carga` com as
+fatias da execução: para cada partição (ano, mes), os arquivos que o produtor
+publicou (listados no evento) ou, sem a lista (a incremental compacta as
+partições depois de gravar), todos os Parquet da partição.
+
+O MERGE lê só essas fatias, direto do stage (sem COPY para uma tabela raw),
+deduplica dentro delas (a versão do arquivo mais recente de cada despesa,
+como na compactação) e restringe o alvo às mesmas partições. O alvo é
+clusterizado por (ano, mes), também quando já existia (ALTER TABLE), o que
+permite ao Snowflake podar as micropartições que não são tocadas. A chave no
+alvo inclui ano e mes, como as partições do dataset.
+
+O mesmo SQL roda no DuckDB (dialeto 'duckdb'), com o stage num diretório
+local, para testar a carga sem o Snowflake.
+"""
+
+STAGE_DESPESAS = "CAMARA.RAW.STAGE_DESPESAS_S3"
+FORMATO_PARQUET = "CAMARA.RAW.PARQUET_FORMAT"
+TABELA_DESPESAS = "CAMARA.RAW.DESPESAS"
+
+# (coluna no Parquet do dataset, coluna no alvo, tipo); os valores são decimal128(12, 2) no Parquet (schema.py)
+COLUNAS = [
+    ('deputado_id', 'deputado_id', 'INT'),
+    ('ano', 'ano', 'INT'),
+    ('mes', 'mes', 'INT'),
+    ('tipoDespesa', 'tipo_despesa', 'VARCHAR'),
+    ('codDocumento', 'cod_documento', 'BIGINT'),
+    ('tipoDocumento', 'tipo_documento', 'VARCHAR'),
+    ('codTipoDocumento', 'cod_tipo_documento', 'INT'),
+    ('dataDocumento', 'data_documento', 'TIMESTAMP'),
+    ('numDocumento', 'num_documento', 'VARCHAR'),
+    ('valorDocumento', 'valor_documento', 'NUMBER(12,2)'),
+    ('urlDocumento', 'url_documento', 'VARCHAR'),
+    ('nomeFornecedor', 'nome_fornecedor', 'VARCHAR'),
+    ('cnpjCpfFornecedor', 'cnpj_cpf_fornecedor', 'VARCHAR'),
+    ('valorLiquido', 'valor_liquido', 'NUMBER(12,2)'),
+    ('valorGlosa', 'valor_glosa', 'NUMBER(12,2)'),
+    ('numRessarcimento', 'num_ressarcimento', 'VARCHAR'),
+    ('codLote', 'cod_lote', 'BIGINT'),
+    ('parcela', 'parcela', 'INT'),
+]
+CHAVE = ('ano', 'mes', 'deputado_id', 'cod_documento')
+
+
+def _tipo_duckdb(tipo):
+    # NUMBER é o nome do DECIMAL no Snowflake
+    return tipo.replace('NUMBER', 'DECIMAL')
+
+
+def _diretorio(fatia):
+    return f"ano={int(fatia['ano'])}/mes={int(fatia['mes']):02d}"
+
+
+def _fonte_snowflake(stage, fatia):
+    """SELECT dos Parquet de uma fatia direto do stage: o caminho limita a listagem
+    à partição e o PATTERN, aos arquivos da fatia."""
+    colunas = ',\n    '.join(f"$1:{origem}::{tipo} AS {destino}" for origem, destino, tipo in COLUNAS)
+    if fatia.get('arquivos'):
+        nomes = '|'.join(arquivo.rsplit('/', 1)[-1].replace('.', '[.]') for arquivo in sorted(fatia['arquivos']))
+        padrao = f"(.*/)?({nomes})"
+    else:
+        padrao = ".*[.]parquet"
+    return (
+        f"SELECT\n    {colunas},\n    METADATA$FILENAME AS arquivo\n"
+        f"FROM @{stage}/{_diretorio(fatia)}/ (FILE_FORMAT => '{FORMATO_PARQUET}', PATTERN => '{padrao}')"
+    )
+
+
+def _fonte_duckdb(stage, fatia):
+    """SELECT dos Parquet de uma fatia num diretório local (stand-in do stage)."""
+    colunas = ',\n    '.join(f"CAST({origem} AS {_tipo_duckdb(tipo)}) AS {destino}" for origem, destino, tipo in COLUNAS)
+    arquivos = [f"{stage}/{arquivo}" for arquivo in sorted(fatia.get('arquivos') or [])]
+    arquivos = arquivos or [f"{stage}/{_diretorio(fatia)}/*.parquet"]
+    lista = ', '.join(f"'{arquivo}'" for arquivo in arquivos)
+    return (
+        f"SELECT\n    {colunas},\n    filename AS arquivo\n"
+        f"FROM read_parquet([{lista}], filename = true, hive_partitioning = false)"
+    )
+
+
+DIALETOS = {
+    'snowflake': _fonte_snowflake,
+    'duckdb': _fonte_duckdb,
+}
+
+
+def sql_tabela(tabela=TABELA_DESPESAS, dialeto='snowflake'):
+    """CREATE TABLE IF NOT EXISTS do alvo (clusterizado por (ano, mes) no Snowflake)."""
+    snowflake = dialeto == 'snowflake'
+    colunas = ',\n    '.join(f"{destino} {tipo if snowflake else _tipo_duckdb(tipo)}" for _, destino, tipo in COLUNAS)
+    cluster = "\nCLUSTER BY (ano, mes)" if snowflake else ''
+    return f"CREATE TABLE IF NOT EXISTS {tabela} (\n    {colunas}\n){cluster}"
+
+
+def sql_cluster(tabela=TABELA_DESPESAS, dialeto='snowflake'):
+    """ALTER TABLE ... CLUSTER BY (ano, mes): o CREATE TABLE IF NOT EXISTS não muda
+    uma tabela que já existia sem a chave (p.ex. criada por snowflake_scripts_ingestao).
+    Com a chave já definida, não muda nada. None fora do Snowflake."""
+    if dialeto != 'snowflake':
+        return None
+    return f"ALTER TABLE {tabela} CLUSTER BY (ano, mes)"
+
+
+def sql_merge(fatias, stage=STAGE_DESPESAS, tabela=TABELA_DESPESAS, dialeto='snowflake'):
+    """MERGE no alvo só das fatias [{'ano', 'mes', 'arquivos'}] (arquivos relativos ao
+    stage, ou None para a partição inteira), deduplicadas dentro delas."""
+    if dialeto not in DIALETOS:
+        raise ValueError(f"Dialeto desconhecido: {dialeto} (use {', '.join(DIALETOS)})")
+    fonte = DIALETOS[dialeto]
+    fontes = '\n    UNION ALL\n    '.join(fonte(stage, fatia).replace('\n', '\n    ') for fatia in fatias)
+    particoes = ' OR '.join(
+        f"(target.ano = {int(ano)} AND target.mes = {int(mes)})"
+        for ano, mes in sorted({(int(fatia['ano']), int(fatia['mes'])) for fatia in fatias})
+    )
+    chave = ' AND '.join(f"target.{coluna} = source.{coluna}" for coluna in CHAVE)
+    destinos = [destino for _, destino, _ in COLUNAS]
+    atualizacao = ',\n    '.join(f"{coluna} = source.{coluna}" for coluna in destinos if coluna not in CHAVE)
+    return f"""MERGE INTO {tabela} AS target
+USING (
+  SELECT * FROM (
+    {fontes}
+  ) AS fatia
+  -- Uma linha por despesa, só dentro da fatia: a do arquivo mais recente
+  QUALIFY ROW_NUMBER() OVER (PARTITION BY {', '.join(CHAVE)} ORDER BY arquivo DESC, cod_lote DESC) = 1
+) AS source
+  -- O alvo fica restrito às partições da fatia (poda pelo cluster (ano, mes))
+  ON {chave}
+  AND ({particoes})
+WHEN MATCHED THEN
+  UPDATE SET
+    {atualizacao}
+WHEN NOT MATCHED THEN
+  INSERT ({', '.join(destinos)})
+  VALUES ({', '.join(f'source.{coluna}' for coluna in destinos)})"""
+
+
+def sql_carga(fatias, stage=STAGE_DESPESAS, tabela=TABELA_DESPESAS, dialeto='snowflake'):
+    """Comandos da carga das fatias alteradas: o alvo (se não existir) com a chave de
+    cluster e o MERGE."""
+    if not fatias:
+        return []
+    comandos = [sql_tabela(tabela, dialeto), sql_cluster(tabela, dialeto), sql_merge(fatias, stage, tabela, dialeto)]
+    return [comando for comando in comandos if comando]
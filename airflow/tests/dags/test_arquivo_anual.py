@@ -0,0 +1,98 @@
+"""Annual-file ingestion (include/camara/arquivo_anual.py) against the mock API (ingestao/mock_camara.py): both file
+formats stream into the API's despesa format, and the reconciliation finds units that differ from the API."""
+
+import io
+import os
+import sys
+import zipfile
+
+import pytest
+
+from include.camara.arquivo_anual import (ResumoUnidades, _objetos_json, ingerir_arquivo_anual, ler_arquivo_anual,
+                                          para_despesa, reconciliar)
+from include.camara.client import CamaraClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'ingestao'))
+from mock_camara import Fixtures, MockCamara  # noqa: E402
+
+ANO = 2023
+
+
+@pytest.fixture
+def fixtures():
+    return Fixtures(legislaturas=(57,), deputados=3, despesas_por_mes=4)
+
+
+def _da_api(fixtures):
+    return {(dep['id'], d['codDocumento']): d
+            for dep in fixtures.deputados(57) for d in fixtures.despesas(dep['id'], ANO)}
+
+
+@pytest.mark.parametrize('formato', ['csv', 'json'])
+def test_arquivo_no_formato_da_api(tmp_path, fixtures, formato):
+    caminho = fixtures.gravar_arquivo_anual(ANO, str(tmp_path), formato=formato)
+    despesas = list(ler_arquivo_anual(caminho))
+    api = _da_api(fixtures)
+    assert len(despesas) == len(api)
+    for despesa in despesas:
+        esperada = api[(despesa['deputado_id'], despesa['codDocumento'])]
+        assert despesa['legislatura_id'] == 57
+        for campo in ('ano', 'mes', 'tipoDespesa', 'tipoDocumento', 'codTipoDocumento', 'dataDocumento',
+                      'numDocumento', 'cnpjCpfFornecedor', 'valorLiquido', 'codLote', 'parcela'):
+            assert despesa[campo] == esperada[campo], campo
+
+
+def test_linhas_sem_deputado_e_valores_com_virgula():
+    # Party leadership rows have no ideCadastro
+    assert para_despesa({'ideCadastro': '', 'vlrLiquido': '10'}) is None
+    despesa = para_despesa({'ideCadastro': '204554', 'numAno': '2023', 'numMes': '12', 'vlrLiquido': '1234,56',
+                            'indTipoDocumento': '4', 'datEmissao': '2023-12-31 00:00:00', 'ideDocumento': ''})
+    assert (despesa['ano'], despesa['mes'], despesa['valorLiquido']) == (2023, 12, 1234.56)
+    assert despesa['tipoDocumento'] == 'Nota Fiscal Eletrônica'
+    assert despesa['dataDocumento'] == '2023-12-31T00:00:00'
+    assert despesa['codDocumento'] == 0
+
+
+def test_json_lido_em_blocos_pequenos():
+    texto = io.StringIO('{"dados": [ {"a": "x]"}, {"a": [1, 2]} ,{"a": 3}]}')
+    assert list(_objetos_json(texto, tamanho_bloco=4)) == [{'a': 'x]'}, {'a': [1, 2]}, {'a': 3}]
+
+
+def test_zip_sem_csv_nem_json(tmp_path):
+    caminho = str(tmp_path / 'Ano-2023.csv.zip')
+    with zipfile.ZipFile(caminho, 'w') as arquivo:
+        arquivo.writestr('leiame.txt', 'nada')
+    with pytest.raises(ValueError):
+        list(ler_arquivo_anual(caminho))
+
+
+class _Sink:
+    def __init__(self):
+        self.lotes = []
+
+    def escrever(self, despesas):
+        self.lotes.append(len(despesas))
+
+
+def test_ingestao_e_reconciliacao(tmp_path, fixtures):
+    caminho = fixtures.gravar_arquivo_anual(ANO, str(tmp_path))
+    sink = _Sink()
+    resumo = ingerir_arquivo_anual(caminho, sink, lote=10)
+    assert sum(sink.lotes) == len(_da_api(fixtures)) and max(sink.lotes) == 10
+    # 3 deputados x February-December 2023 (legislatura 57 starts in February)
+    assert len(resumo) == 33
+
+    with MockCamara(fixtures) as mock:
+        client = CamaraClient(base_url=mock.url)
+        assert reconciliar(resumo, client, amostra=len(resumo), seed=1) == []
+
+        # A despesa the file has but the API no longer lists
+        deputado_id, ano, mes = unidade = sorted(resumo.unidades)[0]
+        extra = ResumoUnidades()
+        extra.adicionar([{'deputado_id': deputado_id, 'ano': ano, 'mes': mes, 'valorLiquido': 5.0, 'codDocumento': 1}])
+        linhas, soma, assinatura = resumo.unidades[unidade]
+        resumo.unidades[unidade] = (linhas + 1, soma + extra.unidades[unidade][1],
+                                    (assinatura + extra.unidades[unidade][2]) % (1 << 64))
+        [divergencia] = reconciliar(resumo, client, amostra=len(resumo), seed=1)
+    assert divergencia['unidade'] == unidade
+    assert divergencia['arquivo']['despesas'] == divergencia['api']['despesas'] + 1
@@ -0,0 +1,209 @@
+"""End-to-end asset scheduling of the despesas pipeline with local stand-ins: the mock API (ingestao/mock_camara.py)
+instead of the Câmara API, a local directory instead of S3, DuckDB instead of Snowflake and `echo` instead of dbt.
+The producers emit one asset event per changed partition through the DESPESAS_PARTICOES alias; carga_despesas
+(scheduled on the alias) merges only those partitions (or only the listed files) and emits DESPESAS_WAREHOUSE, which
+triggers dbt_despesas."""
+
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+from functools import partial
+from types import SimpleNamespace
+
+import pyarrow.fs as pafs
+import pytest
+from airflow.exceptions import AirflowFailException
+from airflow.models import DagBag
+
+from include.camara.assets import DESPESAS_PARTICOES, DESPESAS_WAREHOUSE, uri_particao
+from include.camara.client import CamaraClient
+from include.camara.dataset import abrir
+from include.camara.metadados import MetadadosCache
+from include.camara.warehouse import sql_carga
+
+DAGS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'dags')
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'ingestao'))
+from mock_camara import Fixtures, MockCamara  # noqa: E402
+
+
+class EventosDeAsset:
+    """Stand-in for the `outlet_events` accessor: records the events a task emits."""
+
+    def __init__(self):
+        self.eventos = []
+        self.extras = defaultdict(dict)
+
+    def __getitem__(self, chave):
+        eventos = self
+
+        class Acessor:
+            def add(self, asset, extra=None):
+                eventos.eventos.append((asset, extra or {}))
+
+            @property
+            def extra(self):
+                return eventos.extras[chave]
+
+            @extra.setter
+            def extra(self, valor):
+                eventos.extras[chave] = valor
+
+        return Acessor()
+
+    def disparo(self):
+        """The `triggering_asset_events` a downstream DAG run would receive for these events."""
+        disparo = defaultdict(list)
+        for asset, extra in self.eventos:
+            disparo[asset.uri].append(SimpleNamespace(extra=extra))
+        for chave, extra in self.extras.items():
+            disparo[chave.uri].append(SimpleNamespace(extra=extra))
+        return dict(disparo)
+
+
+@pytest.fixture(scope="module")
+def dag_bag():
+    return DagBag(dag_folder=DAGS_DIR, include_examples=False)
+
+
+@pytest.fixture
+def mock_api():
+    with MockCamara(Fixtures(legislaturas=(57,), deputados=6, despesas_por_mes=5)) as mock:
+        yield mock
+
+
+def _tarefas(dag, monkeypatch, **globais):
+    """python_callable of each task, with the module globals replaced by the stand-ins."""
+    tarefas = {}
+    for tarefa in dag.tasks:
+        funcao = getattr(tarefa, 'python_callable', None) or tarefa.partial_kwargs['python_callable']
+        for nome, valor in globais.items():
+            monkeypatch.setitem(funcao.__globals__, nome, valor)
+        tarefas[tarefa.task_id] = funcao
+    return tarefas
+
+
+def test_asset_wiring(dag_bag):
+    assert not dag_bag.import_errors
+    assert DESPESAS_PARTICOES in dag_bag.get_dag('full_despesas').get_task('process_unit_despesas').outlets
+    assert DESPESAS_PARTICOES in dag_bag.get_dag('incremental_despesas').get_task('compacta_particoes').outlets
+    assert DESPESAS_WAREHOUSE in dag_bag.get_dag('carga_despesas').get_task('load_fatias').outlets
+    assert DESPESAS_WAREHOUSE in dag_bag.get_dag('pipeline_camara').get_task('load_stage').outlets
+    assert dag_bag.get_dag('carga_despesas').schedule == [DESPESAS_PARTICOES]
+    assert dag_bag.get_dag('dbt_despesas').schedule == [DESPESAS_WAREHOUSE]
+
+
+@pytest.fixture
+def stand_ins(mock_api, tmp_path, monkeypatch):
+    """Mock API client and metadata cache, and the globals that point the DAG modules at local stand-ins."""
+    client = CamaraClient(base_url=mock_api.url)
+    monkeypatch.setattr('include.camara.client._client', client)
+    monkeypatch.setattr('include.camara.metadados._metadados',
+                        MetadadosCache(str(tmp_path / 'metadados.sqlite'), client=client))
+    # DuckDB stands in for Snowflake; it is a dev requirement (requirements.txt), not an Astro one
+    duckdb = pytest.importorskip("duckdb")
+    dataset = str(tmp_path / 'dataset')
+    warehouse = duckdb.connect()
+    return SimpleNamespace(
+        dataset=dataset,
+        warehouse=warehouse,
+        produtor=dict(
+            DATASET_DESPESAS=dataset,
+            LANDING_EXECUCOES=str(tmp_path / 'landing'),
+            filesystem_airflow=lambda aws_conn_id: pafs.LocalFileSystem(),
+            indice_do_dataset=lambda base: str(tmp_path / 'indice.sqlite'),
+        ),
+        carga=dict(
+            sql_carga=partial(sql_carga, stage=dataset, tabela='despesas', dialeto='duckdb'),
+            executar_sql=lambda comandos: [warehouse.execute(comando) for comando in comandos],
+        ),
+    )
+
+
+def _linhas_warehouse(stand_ins):
+    return stand_ins.warehouse.execute("SELECT COUNT(*) FROM despesas").fetchone()[0]
+
+
+def test_particoes_alteradas_disparam_carga_e_dbt(dag_bag, stand_ins, monkeypatch):
+    incremental = _tarefas(dag_bag.get_dag('incremental_despesas'), monkeypatch, **stand_ins.produtor)
+    carga = _tarefas(dag_bag.get_dag('carga_despesas'), monkeypatch, **stand_ins.carga)
+    dbt = _tarefas(dag_bag.get_dag('dbt_despesas'), monkeypatch, DBT_BIN='echo')
+
+    def executa_incremental():
+        eventos = EventosDeAsset()
+        data_referencia = incremental['get_data_referencia']()
+        dep_ids = incremental['get_deputados_ids'](data_referencia)
+        particoes = incremental['processa_despesas'](dep_ids, data_referencia, params={'sondagem': True})
+        incremental['compacta_particoes'](particoes, outlet_events=eventos)
+        return data_referencia, particoes, eventos
+
+    # First run: both months of every deputado are new, one event per partition
+    data_referencia, particoes, eventos = executa_incremental()
+    esperadas = sorted({(data_referencia['ano_atual'], data_referencia['mes_atual']),
+                        (data_referencia['ano_anterior'], data_referencia['mes_anterior'])})
+    assert sorted(map(tuple, particoes)) == esperadas
+    assert sorted(asset.uri for asset, _ in eventos.eventos) == [
+        uri_particao(stand_ins.dataset, a, m) for a, m in esperadas]
+    assert all(extra['origem'] == 'incremental' for _, extra in eventos.eventos)
+
+    # carga_despesas merges the whole partitions of the events that triggered it (compacted, no file list)
+    fatias = carga['get_fatias'](triggering_asset_events=eventos.disparo())
+    assert fatias == [{'ano': ano, 'mes': mes, 'arquivos': None} for ano, mes in esperadas]
+    eventos_carga = EventosDeAsset()
+    carga['load_fatias'](fatias, outlet_events=eventos_carga)
+    assert _linhas_warehouse(stand_ins) == abrir(stand_ins.dataset).count_rows()
+    particoes_carga = [list(p) for p in esperadas]
+    assert eventos_carga.extras[DESPESAS_WAREHOUSE] == {'particoes': particoes_carga}
+
+    # dbt_despesas receives the same partitions as a var
+    resultado = dbt['dbt_build'](triggering_asset_events=eventos_carga.disparo())
+    assert resultado['particoes'] == particoes_carga
+    assert json.dumps({'particoes': particoes_carga}) in resultado['saida']
+
+    # Second run without changes in the API: no partition events, so nothing downstream runs
+    _, particoes, eventos = executa_incremental()
+    assert particoes == []
+    assert eventos.eventos == []
+
+
+def test_full_despesas_carga_so_os_arquivos_publicados(dag_bag, stand_ins, monkeypatch):
+    full = _tarefas(dag_bag.get_dag('full_despesas'), monkeypatch, **stand_ins.produtor)
+    carga = _tarefas(dag_bag.get_dag('carga_despesas'), monkeypatch, **stand_ins.carga)
+    ano = datetime.now().year
+    contexto = {'params': {'cargaFull': True, 'idLegislatura': 57}, 'run_id': 'manual__teste'}
+
+    deputados_data = full['get_deputados_ids'](**contexto)
+    eventos = EventosDeAsset()
+    resumo = full['process_unit_despesas'](
+        {'year': ano, 'month': None, 'shard': 0, 'shards': 1}, deputados_data, outlet_events=eventos, **contexto)
+    assert resumo['errors'] == 0 and resumo['particoes']
+
+    # Each event lists the one file the unit published in that partition
+    for asset, extra in eventos.eventos:
+        assert extra['origem'] == f"full{ano}s00de01"
+        [arquivo] = extra['arquivos']
+        assert asset.uri == uri_particao(stand_ins.dataset, extra['ano'], extra['mes'])
+        assert os.path.exists(os.path.join(stand_ins.dataset, arquivo))
+
+    # Files that were not listed (another producer's, not yet announced) are not read by this load
+    for particao in resumo['particoes']:
+        diretorio = os.path.join(stand_ins.dataset, f"ano={particao[0]}", f"mes={particao[1]:02d}")
+        with open(os.path.join(diretorio, 'zzzz-nao-anunciado.parquet'), 'wb') as f:
+            f.write(b'nao e parquet')
+
+    fatias = carga['get_fatias'](triggering_asset_events=eventos.disparo())
+    assert [[fatia['ano'], fatia['mes']] for fatia in fatias] == resumo['particoes']
+    carga['load_fatias'](fatias, outlet_events=EventosDeAsset())
+    assert _linhas_warehouse(stand_ins) == resumo['linhas']
+
+
+def test_dbt_ausente_falha_com_mensagem(dag_bag, tmp_path, monkeypatch):
+    sem_binario = _tarefas(dag_bag.get_dag('dbt_despesas'), monkeypatch, DBT_BIN='dbt-inexistente')
+    with pytest.raises(AirflowFailException, match="CAMARA_DBT_BIN"):
+        sem_binario['dbt_build'](triggering_asset_events={})
+
+    sem_projeto = _tarefas(dag_bag.get_dag('dbt_despesas'), monkeypatch, DBT_BIN='echo',
+                           DBT_PROJECT_DIR=str(tmp_path))
+    with pytest.raises(AirflowFailException, match="CAMARA_DBT_PROJECT_DIR"):
+        sem_projeto['dbt_build'](triggering_asset_events={})
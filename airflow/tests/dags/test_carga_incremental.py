@@ -0,0 +1,103 @@
+"""Partition-pruned warehouse load (include/camara/warehouse.py) against DuckDB: a local copy of the dataset stands in
+for the Snowflake stage and a DuckDB table for CAMARA.RAW.DESPESAS. Each load must read only the files of its slice,
+keep the most recent version of each despesa within the slice and leave the other partitions of the target alone."""
+
+import pytest
+
+from include.camara.dataset import escrever_particoes
+from include.camara.warehouse import sql_carga, sql_cluster, sql_merge, sql_tabela
+
+duckdb = pytest.importorskip("duckdb")
+
+TABELA = "despesas"
+
+
+def _despesa(deputado_id, cod_documento, ano, mes, valor, lote=1):
+    return {
+        'deputado_id': deputado_id, 'codDocumento': cod_documento, 'ano': ano, 'mes': mes,
+        'tipoDespesa': 'COMBUSTÍVEIS E LUBRIFICANTES.', 'tipoDocumento': 'Nota Fiscal', 'codTipoDocumento': 0,
+        'dataDocumento': f"{ano}-{mes:02d}-10", 'numDocumento': str(cod_documento), 'valorDocumento': valor,
+        'valorLiquido': valor, 'valorGlosa': 0, 'nomeFornecedor': 'POSTO', 'cnpjCpfFornecedor': '00000000000191',
+        'codLote': lote, 'parcela': 0,
+    }
+
+
+def _relativos(base, arquivos):
+    return {particao: caminho[len(base) + 1:] for particao, caminho in arquivos.items()}
+
+
+def _carregar(con, base, fatias):
+    for comando in sql_carga(fatias, stage=base, tabela=TABELA, dialeto='duckdb'):
+        con.execute(comando)
+
+
+def _linhas(con, ano, mes):
+    return dict(con.execute(
+        f"SELECT cod_documento, valor_documento FROM {TABELA} WHERE ano = ? AND mes = ? ORDER BY cod_documento",
+        [ano, mes],
+    ).fetchall())
+
+
+def test_carga_le_so_a_fatia(tmp_path):
+    base = str(tmp_path / 'dataset')
+    con = duckdb.connect()
+
+    # Initial load: three whole partitions
+    escrever_particoes(
+        [_despesa(1, 100 + mes * 10 + i, 2024, mes, 10.0 * i) for mes in (1, 2, 3) for i in range(3)],
+        base, origem='full2024',
+    )
+    _carregar(con, base, [{'ano': 2024, 'mes': mes, 'arquivos': None} for mes in (1, 2, 3)])
+    assert con.execute(f"SELECT COUNT(*) FROM {TABELA}").fetchone()[0] == 9
+    # Exact decimals, like the decimal128(12, 2) of the dataset
+    assert dict(con.execute(f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = "
+                            f"'{TABELA}' AND column_name LIKE 'valor%'").fetchall()) == {
+        'valor_documento': 'DECIMAL(12,2)', 'valor_liquido': 'DECIMAL(12,2)', 'valor_glosa': 'DECIMAL(12,2)'}
+
+    # A file the load must never read: only the listed files of each slice are scanned
+    for mes in (1, 2):
+        (tmp_path / 'dataset' / 'ano=2024' / f"mes={mes:02d}" / 'zzzz-corrompido.parquet').write_bytes(b'nao e parquet')
+
+    # Two new files in 2024-02: the same despesa in both (the later file wins), one updated and one new despesa
+    lote1 = _relativos(base, escrever_particoes(
+        [_despesa(1, 120, 2024, 2, 50.0), _despesa(1, 121, 2024, 2, 11.0, lote=2)], base, origem='lote1'))
+    lote2 = _relativos(base, escrever_particoes(
+        [_despesa(1, 120, 2024, 2, 55.0), _despesa(2, 200, 2024, 2, 7.5)], base, origem='lote2'))
+    antes_jan, antes_mar = _linhas(con, 2024, 1), _linhas(con, 2024, 3)
+
+    _carregar(con, base, [{'ano': 2024, 'mes': 2, 'arquivos': [lote1[(2024, 2)], lote2[(2024, 2)]]}])
+
+    assert _linhas(con, 2024, 2) == {120: 55.0, 121: 11.0, 122: 20.0, 200: 7.5}
+    assert _linhas(con, 2024, 1) == antes_jan
+    assert _linhas(con, 2024, 3) == antes_mar
+    # No duplicates after merging an overlapping slice
+    assert con.execute(
+        f"SELECT COUNT(*) FROM (SELECT ano, mes, deputado_id, cod_documento FROM {TABELA} GROUP BY ALL HAVING COUNT(*) > 1)"
+    ).fetchone()[0] == 0
+
+    # Loading the same slice again changes nothing
+    _carregar(con, base, [{'ano': 2024, 'mes': 2, 'arquivos': [lote2[(2024, 2)]]}])
+    assert _linhas(con, 2024, 2) == {120: 55.0, 121: 11.0, 122: 20.0, 200: 7.5}
+
+
+def test_sql_snowflake_le_so_as_particoes_da_fatia():
+    fatias = [
+        {'ano': 2024, 'mes': 2, 'arquivos': ['ano=2024/mes=02/20240301T000000-full2024s01de08-abcd1234.parquet']},
+        {'ano': 2024, 'mes': 3, 'arquivos': None},
+    ]
+    merge = sql_merge(fatias)
+    assert "@CAMARA.RAW.STAGE_DESPESAS_S3/ano=2024/mes=02/ (" in merge
+    assert "PATTERN => '(.*/)?(20240301T000000-full2024s01de08-abcd1234[.]parquet)'" in merge
+    assert "@CAMARA.RAW.STAGE_DESPESAS_S3/ano=2024/mes=03/ (" in merge
+    # Never the whole stage
+    assert "@CAMARA.RAW.STAGE_DESPESAS_S3/ (" not in merge
+    assert "(target.ano = 2024 AND target.mes = 2) OR (target.ano = 2024 AND target.mes = 3)" in merge
+    assert "$1:valorLiquido::NUMBER(12,2) AS valor_liquido" in merge
+    assert "valor_liquido NUMBER(12,2)" in sql_tabela()
+    assert sql_tabela().endswith("CLUSTER BY (ano, mes)")
+    # A table that already existed gets the clustering key too
+    assert sql_carga(fatias) == [sql_tabela(), "ALTER TABLE CAMARA.RAW.DESPESAS CLUSTER BY (ano, mes)", merge]
+    assert sql_cluster(dialeto='duckdb') is None
+    assert sql_carga([]) == []
+    with pytest.raises(ValueError):
+        sql_merge(fatias, dialeto='postgres')
@@ -0,0 +1,58 @@
+"""Extraction checkpoint (include/camara/checkpoint.py): an interrupted run resumes from the units already on disk,
+and replaying a unit replaces it instead of duplicating its despesas."""
+
+from include.camara.checkpoint import CheckpointStore, hash_payload
+
+
+def _despesa(cod_documento, mes, valor=10.0):
+    return {'codDocumento': cod_documento, 'ano': 2024, 'mes': mes, 'valorLiquido': valor}
+
+
+def test_retomada_depois_de_interrupcao(tmp_path):
+    caminho = str(tmp_path / 'checkpoint.sqlite')
+    checkpoint = CheckpointStore(caminho)
+    checkpoint.registrar_plano(57, unidades_previstas=4)
+    # One query covers months 1-2 of deputado 1; month 2 had no despesas but is still done
+    checkpoint.registrar(57, 1, 2024, [1, 2], [_despesa(10, 1), _despesa(11, 1)])
+    checkpoint.close()
+
+    # The next run (--resume) reopens the same file: only the missing units are left to download
+    retomado = CheckpointStore(caminho)
+    assert retomado.concluidas(57) == {(1, 2024, 1), (1, 2024, 2)}
+    assert retomado.progresso(57) == (2, 4)
+    retomado.registrar(57, 2, 2024, [1, 2], [_despesa(20, 2)])
+
+    assert [d['codDocumento'] for d in retomado.carregar(57)] == [10, 11, 20]
+    assert [d['codDocumento'] for d in retomado.carregar(57, unidades={(2, 2024, 2)})] == [20]
+    assert not retomado.finalizada(57)
+    retomado.finalizar(57, 'despesas_57.parquet')
+    assert retomado.finalizada(57)
+    [status] = retomado.status()
+    assert status['unidades_concluidas'] == 4 and status['linhas'] == 3 and status['percentual'] == 1.0
+
+
+def test_repetir_uma_unidade_substitui(tmp_path):
+    checkpoint = CheckpointStore(str(tmp_path / 'checkpoint.sqlite'))
+    checkpoint.registrar(57, 1, 2024, [3], [_despesa(30, 3)])
+    checkpoint.registrar(57, 1, 2024, [3], [_despesa(30, 3, valor=12.5), _despesa(31, 3)])
+
+    assert checkpoint.progresso(57) == (1, 0)
+    assert list(checkpoint.carregar(57)) == [_despesa(30, 3, valor=12.5), _despesa(31, 3)]
+
+
+def test_limpar_descarta_a_legislatura(tmp_path):
+    checkpoint = CheckpointStore(str(tmp_path / 'checkpoint.sqlite'))
+    checkpoint.registrar_plano(57, 1)
+    checkpoint.registrar(57, 1, 2024, [1], [_despesa(10, 1)])
+    checkpoint.registrar(56, 1, 2022, [1], [_despesa(10, 1)])
+    checkpoint.finalizar(57, 'despesas_57.parquet')
+
+    checkpoint.limpar(57)
+    assert checkpoint.concluidas(57) == set()
+    assert not checkpoint.finalizada(57)
+    assert checkpoint.concluidas(56) == {(1, 2022, 1)}
+
+
+def test_hash_payload_independe_da_ordem_das_chaves():
+    assert hash_payload([{'a': 1, 'b': 2}]) == hash_payload([{'b': 2, 'a': 1}])
+    assert hash_payload([{'a': 1}]) != hash_payload([{'a': 2}])
@@ -0,0 +1,79 @@
+"""Shared API client (include/camara/client.py): get_client must not silently ignore a pool size that differs from
+the one the process-wide client was created with, and retries back off on 5xx even with a rate limiter."""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from include.camara import client as modulo_cliente
+from include.camara.client import CamaraClient, get_client
+from include.camara.ratelimit import RateLimiter
+
+
+@pytest.fixture
+def sem_cliente(monkeypatch):
+    monkeypatch.setattr(modulo_cliente, '_client', None)
+
+
+def _pool_maxsize(client):
+    return client.session.get_adapter('https://dadosabertos.camara.leg.br')._pool_maxsize
+
+
+def test_get_client_remonta_o_pool(sem_cliente):
+    client = get_client(pool_maxsize=10, rate_limiter=None, cache=None)
+    assert _pool_maxsize(client) == 10
+
+    # A later task that needs more concurrent connections gets them on the same client
+    assert get_client(pool_maxsize=40) is client
+    assert _pool_maxsize(client) == 40
+    assert client.session.get_adapter('http://localhost') is client.session.get_adapter('https://localhost')
+
+    # Same configuration (or none): the adapter is kept
+    adapter = client.session.get_adapter('https://localhost')
+    get_client(pool_maxsize=40)
+    get_client()
+    assert client.session.get_adapter('https://localhost') is adapter
+
+
+def test_get_client_recusa_outra_configuracao(sem_cliente):
+    client = get_client(base_url='http://localhost:1/api/v2/', rate_limiter=None, cache=None)
+    assert get_client(base_url='http://localhost:1/api/v2') is client
+    with pytest.raises(ValueError, match="base_url"):
+        get_client(base_url='http://localhost:2/api/v2')
+    with pytest.raises(ValueError, match="timeout"):
+        get_client(timeout=1)
+
+
+def _resposta(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = b'{"dados": []}' if status == 200 else b''
+    response.url = 'https://dadosabertos.camara.leg.br/api/v2/deputados'
+    return response
+
+
+@pytest.mark.parametrize('rate_limiter', [None, RateLimiter(taxa_inicial=1000, taxa_maxima=1000)])
+def test_get_json_espera_depois_de_5xx(monkeypatch, rate_limiter):
+    client = CamaraClient(rate_limiter=rate_limiter)
+    respostas = iter([_resposta(503), _resposta(502), _resposta(200)])
+    monkeypatch.setattr(client.session, 'get', lambda *args, **kwargs: next(respostas))
+    esperas = []
+    monkeypatch.setattr(modulo_cliente, 'time', SimpleNamespace(sleep=esperas.append, perf_counter=time.perf_counter))
+
+    assert client.get_json('deputados', delay=1) == {'dados': []}
+    # Exponential backoff between the attempts, whether or not a limiter paces the requests
+    assert esperas == [1, 2]
+
+
+def test_get_json_429_fica_com_o_limitador(monkeypatch):
+    client = CamaraClient(rate_limiter=RateLimiter(taxa_inicial=1000, taxa_maxima=1000))
+    respostas = iter([_resposta(429, {'Retry-After': '0'}), _resposta(200)])
+    monkeypatch.setattr(client.session, 'get', lambda *args, **kwargs: next(respostas))
+    esperas = []
+    monkeypatch.setattr(modulo_cliente, 'time', SimpleNamespace(sleep=esperas.append, perf_counter=time.perf_counter))
+
+    assert client.get_json('deputados') == {'dados': []}
+    assert esperas == []
@@ -0,0 +1,76 @@
+"""Partitioned despesas dataset (include/camara/dataset.py): the DatasetSink flushes row groups within its memory
+limit, publishes one file per partition only on fechar() and leaves nothing behind on descartar(); compaction keeps
+only the latest version of each despesa."""
+
+import os
+
+import pyarrow.parquet as pq
+import pytest
+
+from include.camara.dataset import DatasetSink, abrir, compactar, escrever_particoes, particoes
+
+
+def _despesa(deputado_id, cod_documento, mes, valor=10.0, ano=2024):
+    return {
+        'deputado_id': deputado_id, 'codDocumento': cod_documento, 'ano': ano, 'mes': mes,
+        'tipoDespesa': 'PASSAGEM AÉREA', 'dataDocumento': f"{ano}-{mes:02d}-05", 'valorDocumento': valor,
+        'valorLiquido': valor, 'valorGlosa': 0, 'codLote': 1,
+    }
+
+
+def _arquivos(base):
+    return sorted(os.path.relpath(os.path.join(raiz, nome), base)
+                  for raiz, _, nomes in os.walk(base) for nome in nomes)
+
+
+def test_sink_grava_row_groups_e_publica_no_fechar(tmp_path):
+    base = str(tmp_path / 'dataset')
+    sink = DatasetSink(base, origem='teste', max_linhas=4)
+    sink.escrever([_despesa(1, cod, 1) for cod in range(3)] + [_despesa(1, 10, 2)])
+
+    # The limit is global: reaching 4 pending rows flushes every partition, but nothing is published yet
+    assert particoes(base) == {}
+    assert all(arquivo.endswith('.parquet.tmp') for arquivo in _arquivos(base))
+
+    sink.escrever([_despesa(1, cod, 1) for cod in range(3, 5)])
+    arquivos = sink.fechar()
+    assert sorted(arquivos) == [(2024, 1), (2024, 2)]
+    assert all(not arquivo.endswith('.tmp') for arquivo in _arquivos(base))
+    assert pq.ParquetFile(arquivos[(2024, 1)]).metadata.num_row_groups == 2
+    assert abrir(base).count_rows() == 6
+    assert abrir(base, particoes_filtro={(2024, 2)}).count_rows() == 1
+
+
+def test_sink_descarta_em_caso_de_erro(tmp_path):
+    base = str(tmp_path / 'dataset')
+    with pytest.raises(RuntimeError):
+        with DatasetSink(base, origem='teste', max_linhas=1) as sink:
+            sink.escrever([_despesa(1, 1, 1), _despesa(1, 2, 3)])
+            raise RuntimeError("falha no meio")
+    assert _arquivos(base) == []
+    assert sink.arquivos == {}
+
+
+def test_compactacao_mantem_a_ultima_versao(tmp_path):
+    base = str(tmp_path / 'dataset')
+    escrever_particoes([_despesa(1, 100, 3, valor=10.0), _despesa(1, 101, 3), _despesa(1, 200, 4)], base,
+                       origem='lote1')
+    escrever_particoes([_despesa(1, 100, 3, valor=99.0)], base, origem='lote2')
+    assert [len(lista) for lista in particoes(base).values()] == [2, 1]
+
+    [resumo] = compactar(base)
+    assert (resumo['ano'], resumo['mes']) == (2024, 3)
+    assert (resumo['arquivos_antes'], resumo['arquivos_depois']) == (2, 1)
+    assert (resumo['linhas_antes'], resumo['linhas_depois']) == (3, 2)
+
+    tabela = abrir(base, particoes_filtro={(2024, 3)}).to_table().sort_by('codDocumento')
+    assert tabela['codDocumento'].to_pylist() == [100, 101]
+    assert float(tabela['valorLiquido'][0].as_py()) == 99.0
+    # The compacted file keeps the instant of the newest input: later writes still sort after it
+    [compactado] = particoes(base)[(2024, 3)]
+    assert '-compactado-' in compactado
+    escrever_particoes([_despesa(1, 100, 3, valor=1.0)], base, origem='lote3')
+    assert particoes(base)[(2024, 3)][-1].split('-')[-2] == 'lote3'
+
+    # Partitions with a single file are left alone
+    assert compactar(base, particoes_filtro={(2024, 4)}) == []
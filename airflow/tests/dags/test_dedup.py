@@ -0,0 +1,157 @@
+"""Dedup index (include/camara/dedup.py). Each worker keeps its own SQLite; with `base`, the keys it publishes go to
+segments next to the dataset, so a task on another worker skips what was really published and nothing else."""
+
+import sqlite3
+
+import pyarrow.fs as pafs
+import pytest
+
+from include.camara.dataset import DatasetSink, abrir, escrever_particoes
+from include.camara import dedup
+from include.camara.dedup import BloomFilter, IndiceDespesas, indice_do_dataset
+
+
+def _despesa(deputado_id, cod_documento, valor=10.0, ano=2024, mes=3):
+    return {
+        'deputado_id': deputado_id, 'codDocumento': cod_documento, 'ano': ano, 'mes': mes,
+        'tipoDespesa': 'PASSAGEM AÉREA', 'dataDocumento': f"{ano}-{mes:02d}-05", 'valorDocumento': valor,
+        'valorLiquido': valor, 'valorGlosa': 0, 'codLote': 1,
+    }
+
+
+def _worker(tmp_path, nome, base):
+    """The index a task opens on worker `nome`: its own local SQLite, shared segments next to the dataset."""
+    return IndiceDespesas(str(tmp_path / nome / 'indice.sqlite'), base=base, filesystem=pafs.LocalFileSystem())
+
+
+def _chaves(base):
+    tabela = abrir(base).to_table(columns=['deputado_id', 'codDocumento'])
+    return sorted(zip(*(tabela.column(coluna).to_pylist() for coluna in tabela.column_names)))
+
+
+def test_dois_workers_no_mesmo_dataset(tmp_path):
+    base = str(tmp_path / 'dataset')
+
+    # Task on worker 1 publishes two despesas
+    indice_1 = _worker(tmp_path, 'worker1', base)
+    escrever_particoes([_despesa(1, 10), _despesa(1, 11)], base, origem='w1', indice=indice_1)
+
+    # Task on worker 1 whose write fails: nothing reaches the dataset, so nothing may reach the index either
+    with pytest.raises(RuntimeError):
+        with DatasetSink(base, origem='w1', indice=indice_1) as sink:
+            sink.escrever([_despesa(2, 20)])
+            raise RuntimeError("upload falhou")
+
+    # Task on worker 2 (fresh SQLite) sees what worker 1 published, and only that
+    indice_2 = _worker(tmp_path, 'worker2', base)
+    assert indice_2.contadores['segmentos_importados'] == 1
+    escrever_particoes([_despesa(1, 10), _despesa(1, 11, valor=12.5), _despesa(2, 20)], base, origem='w2',
+                       indice=indice_2)
+    assert indice_2.contadores == {'novas': 1, 'alteradas': 1, 'duplicadas': 1, 'consultas_sqlite': 2,
+                                   'segmentos_importados': 1}
+
+    # Back on worker 1: its SQLite catches up with worker 2's segment, so a rerun writes nothing
+    indice_1b = _worker(tmp_path, 'worker1', base)
+    assert indice_1b.contadores['segmentos_importados'] == 1
+    assert escrever_particoes([_despesa(1, 11, valor=12.5), _despesa(2, 20)], base, origem='w1',
+                              indice=indice_1b) == {}
+
+    # One row per published version: (1, 10) once, (1, 11) original and edited, (2, 20) once
+    assert _chaves(base) == [(1, 10), (1, 11), (1, 11), (2, 20)]
+
+
+def test_segmentos_compactados(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup, 'LIMITE_SEGMENTOS', 2)
+    base = str(tmp_path / 'dataset')
+    segmentos = tmp_path / 'dataset' / '_indice'
+
+    # Three task runs on worker 1: the third salvar() leaves three segments and compacts them into one
+    indice_1 = _worker(tmp_path, 'worker1', base)
+    for lote in ([_despesa(1, 10), _despesa(1, 11)], [_despesa(1, 11, valor=12.5)], [_despesa(2, 20)]):
+        indice_1.filtrar(lote)
+        indice_1.salvar()
+    [compactado] = [p.name for p in segmentos.iterdir()]
+    assert '-compactado-' in compactado
+
+    # A fresh worker reads the single compacted segment, with the latest version of each key
+    indice_2 = _worker(tmp_path, 'worker2', base)
+    assert indice_2.contadores['segmentos_importados'] == 1
+    assert indice_2.filtrar([_despesa(1, 10), _despesa(1, 11, valor=12.5), _despesa(2, 20)]) == []
+
+    # Worker 1 had imported (published) every input: it marks the compacted one as seen without reading it
+    indice_1b = _worker(tmp_path, 'worker1', base)
+    assert indice_1b.contadores['segmentos_importados'] == 0
+    assert indice_1b.filtrar([_despesa(1, 11, valor=12.5)]) == []
+
+
+def test_bloom_gravado_no_sqlite(tmp_path, monkeypatch):
+    caminho = str(tmp_path / 'indice.sqlite')
+    indice = IndiceDespesas(caminho)
+    indice.filtrar([_despesa(1, cod) for cod in range(100)])
+    indice.salvar()
+    indice.close()
+
+    # Reopening restores the saved filter instead of re-adding every key
+    with monkeypatch.context() as m:
+        m.setattr(BloomFilter, 'add', lambda *args: pytest.fail("filtro reconstruído"))
+        reaberto = IndiceDespesas(caminho)
+    assert reaberto.filtrar([_despesa(1, cod) for cod in range(100)]) == []
+    reaberto.close()
+
+    # A filter that no longer covers the SQLite (keys written by something else) is rebuilt
+    with sqlite3.connect(caminho) as conn:
+        conn.execute("INSERT INTO despesas VALUES (9, 9, ?)", (b'\0' * 8,))
+    reconstruido = IndiceDespesas(caminho)
+    assert reconstruido.classificar({**_despesa(9, 9), 'valorLiquido': 1.0}) == 'alterada'
+
+
+def test_indice_local_sem_base(tmp_path):
+    indice = IndiceDespesas(str(tmp_path / 'indice.sqlite'))
+    assert [indice.classificar(d) for d in (_despesa(1, 1), _despesa(1, 1), _despesa(1, 1, valor=2.0))] == \
+        ['nova', 'duplicada', 'alterada']
+    indice.salvar()
+    indice.close()
+
+    reaberto = IndiceDespesas(str(tmp_path / 'indice.sqlite'))
+    assert reaberto.classificar(_despesa(1, 1, valor=2.0)) == 'duplicada'
+    assert [(d, c) for d, c, _ in reaberto.alteracoes()] == [(1, 1)]
+    assert not (tmp_path / '_indice').exists()
+
+
+def test_indice_do_dataset_separa_destinos(tmp_path):
+    assert indice_do_dataset(str(tmp_path / 'a')) != indice_do_dataset(str(tmp_path / 'b'))
+
+
+def test_bloom_sem_falsos_negativos():
+    bloom = BloomFilter(10_000, taxa_falsos=0.01)
+    for i in range(10_000):
+        bloom.add(f"1:{i}".encode())
+    assert all(f"1:{i}".encode() in bloom for i in range(10_000))
+    falsos = sum(f"2:{i}".encode() in bloom for i in range(10_000))
+    assert falsos < 300
+
+
+def test_bloom_evita_consultas_ao_sqlite(tmp_path):
+    caminho = str(tmp_path / 'indice.sqlite')
+    indice = IndiceDespesas(caminho)
+    indice.filtrar([_despesa(1, cod) for cod in range(100)])
+    indice.salvar()
+    indice.close()
+
+    reaberto = IndiceDespesas(caminho)
+    # Keys never seen are answered by the Bloom filter; known keys go to SQLite
+    assert len(reaberto.filtrar([_despesa(2, cod) for cod in range(100)])) == 100
+    assert reaberto.contadores['consultas_sqlite'] <= 2
+    assert reaberto.filtrar([_despesa(1, cod) for cod in range(100)]) == []
+    assert reaberto.contadores['duplicadas'] == 100
+    assert reaberto.contadores['consultas_sqlite'] >= 100
+
+
+def test_descartar_nao_grava_no_sqlite(tmp_path):
+    caminho = str(tmp_path / 'indice.sqlite')
+    indice = IndiceDespesas(caminho)
+    assert indice.filtrar([_despesa(1, 1), _despesa(1, 1)]) == [_despesa(1, 1)]
+    indice.descartar()
+    indice.salvar()
+    indice.close()
+    assert IndiceDespesas(caminho).filtrar([_despesa(1, 1)]) == [_despesa(1, 1)]
@@ -0,0 +1,74 @@
+"""Work-stealing scheduler of ingestao/despesas.py: when the results stop coming (a worker died), the legislaturas still
+open leave no temporary files in the dataset and nothing reaches the manifest or the dedup index."""
+
+import os
+import queue
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'ingestao'))
+import despesas  # noqa: E402
+
+
+def _despesa(deputado_id, cod_documento, mes):
+    return {'deputado_id': deputado_id, 'codDocumento': cod_documento, 'ano': 2022, 'mes': mes,
+            'tipoDespesa': 'PASSAGEM AÉREA', 'dataDocumento': f"2022-{mes:02d}-05", 'valorDocumento': 10.0,
+            'valorLiquido': 10.0, 'valorGlosa': 0, 'codLote': 1}
+
+
+class _Processo:
+    """Stands in for a spawned worker: the results are injected through _proximo_resultado instead."""
+
+    def __init__(self, target, args):
+        self.terminado = False
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return not self.terminado
+
+    def terminate(self):
+        self.terminado = True
+
+    def join(self):
+        pass
+
+
+def test_falha_no_meio_descarta_as_legislaturas_abertas(tmp_path, monkeypatch):
+    dataset = str(tmp_path / 'dataset')
+    monkeypatch.setattr('include.camara.dedup.INDICE_PADRAO', str(tmp_path / 'indice.sqlite'))
+    processos = []
+    monkeypatch.setattr(despesas.multiprocessing, 'get_context', lambda metodo: SimpleNamespace(
+        Queue=queue.Queue, Process=lambda target, args: processos.append(_Processo(target, args)) or processos[-1]))
+
+    # Legislatura 56 has one deputado and is published; 57 gets one of its two deputados, then a worker dies
+    resultados = iter([
+        (56, 1, [_despesa(1, 10, 1)], 0, 0),
+        (57, 2, [_despesa(2, 20, 2), _despesa(2, 21, 3)], 0, 0),
+    ])
+
+    def proximo_resultado(fila, trabalhadores):
+        try:
+            return next(resultados)
+        except StopIteration:
+            raise RuntimeError("Os processos trabalhadores terminaram antes de entregar todas as unidades")
+
+    monkeypatch.setattr(despesas, '_proximo_resultado', proximo_resultado)
+    unidades = [despesas.Unidade(56, 1, (2022,)), despesas.Unidade(57, 2, (2022,)), despesas.Unidade(57, 3, (2022,))]
+
+    with pytest.raises(RuntimeError):
+        despesas.processar_unidades(unidades, processos=1, threads=1, max_linhas_buffer=1, dataset=dataset)
+
+    arquivos = [nome for _, _, nomes in os.walk(dataset) for nome in nomes]
+    assert not [nome for nome in arquivos if nome.endswith('.tmp')]
+    # Only the finished legislatura 56 was published
+    publicados = [nome for nome in arquivos if nome.endswith('.parquet')]
+    assert len(publicados) == 1 and 'legislatura56' in publicados[0]
+    assert all(processo.terminado for processo in processos)
+    assert not os.path.exists(os.path.join(dataset, '_manifesto'))
+    # The index was not saved: a rerun writes legislatura 56 again
+    indice = despesas.IndiceDespesas(despesas.indice_do_dataset(dataset))
+    assert indice.filtrar([_despesa(1, 10, 1)]) == [_despesa(1, 10, 1)]
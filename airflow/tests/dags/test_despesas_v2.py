@@ -0,0 +1,150 @@
+"""Async mode of ingestao/despesas_v2.py against the mock API (ingestao/mock_camara.py): it brings the same despesas as
+the threads mode, also when a year has more than MAX_PAGINAS pages and turns into monthly queries, and its requests
+back off on 5xx even with a rate limiter."""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from include.camara import client as modulo_cliente
+from include.camara import metadados as modulo_metadados
+from include.camara.client import CamaraClient
+from include.camara.metadados import MetadadosCache
+from include.camara.metricas import MetricasRequisicoes
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'ingestao'))
+import despesas_v2  # noqa: E402
+from mock_camara import Fixtures, MockCamara  # noqa: E402
+
+
+@pytest.fixture
+def fixtures():
+    return Fixtures(legislaturas=(57,), deputados=3, despesas_por_mes=4)
+
+
+def _api(fixtures, itens_maximo, tmp_path, monkeypatch):
+    """Mock API started with `itens_maximo` rows per page; the shared client and metadata cache point at it."""
+    mock = MockCamara(fixtures, itens_maximo=itens_maximo).iniciar()
+    client = CamaraClient(base_url=mock.url)
+    monkeypatch.setattr(modulo_cliente, '_client', client)
+    monkeypatch.setattr(modulo_metadados, '_metadados',
+                        MetadadosCache(path=str(tmp_path / 'metadados.sqlite'), client=client))
+    return mock
+
+
+def _chaves(despesas):
+    return sorted((d['deputado_id'], d['codDocumento']) for d in despesas)
+
+
+def _esperadas(fixtures, legislatura):
+    return sorted((dep['id'], d['codDocumento'])
+                  for dep in fixtures.deputados(57) for ano in despesas_v2.anos_legislatura(legislatura)
+                  for d in fixtures.despesas(dep['id'], ano))
+
+
+class _Sink:
+    def __init__(self):
+        self.despesas = []
+
+    def escrever(self, despesas):
+        self.despesas.extend(despesas)
+
+
+# 100 rows per page: one page per year; 2 rows per page: ~24 pages a year, above MAX_PAGINAS (20)
+@pytest.mark.parametrize('itens_maximo', [100, 2])
+def test_async_igual_ao_threads(tmp_path, monkeypatch, fixtures, itens_maximo):
+    mock = _api(fixtures, itens_maximo, tmp_path, monkeypatch)
+    try:
+        [legislatura] = despesas_v2.obter_todas_legislaturas()
+        threads = despesas_v2.extrair_despesas_legislatura_multithread(legislatura, max_workers=2)
+        assincronas = despesas_v2.extrair_despesas_legislatura_async(legislatura, max_concurrency=4)
+    finally:
+        mock.parar()
+
+    assert _chaves(assincronas) == _chaves(threads) == _esperadas(fixtures, legislatura)
+    assert len(set(_chaves(assincronas))) == len(assincronas)
+    assert {(d['legislatura_id'], d['ano_legislatura']) for d in assincronas} == {(57, '2023-2027')}
+
+
+def test_async_com_sink_nao_acumula(tmp_path, monkeypatch, fixtures):
+    mock = _api(fixtures, 10, tmp_path, monkeypatch)
+    try:
+        [legislatura] = despesas_v2.obter_todas_legislaturas()
+        sink = _Sink()
+        assert despesas_v2.extrair_despesas_legislatura_async(legislatura, max_concurrency=4, sink=sink) == []
+    finally:
+        mock.parar()
+    assert _chaves(sink.despesas) == _esperadas(fixtures, legislatura)
+
+
+class _Resposta:
+    def __init__(self, status, corpo=b'{}'):
+        self.status = status
+        self.corpo = corpo
+        self.headers = {}
+        self.url = 'https://api/deputados/1/despesas'
+
+    async def read(self):
+        return self.corpo
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Sessao:
+    def __init__(self, respostas):
+        self.respostas = iter(respostas)
+
+    def get(self, url, params=None, headers=None):
+        return next(self.respostas)
+
+
+class _Limitador:
+    def __init__(self):
+        self.registrados = []
+
+    async def acquire_async(self):
+        return 0.0
+
+    async def registrar_async(self, status, retry_after):
+        self.registrados.append(status)
+
+
+@pytest.mark.parametrize('com_limitador', [False, True])
+def test_requisicao_async_espera_depois_de_5xx(monkeypatch, com_limitador):
+    monkeypatch.setattr(modulo_cliente, '_client', CamaraClient(base_url='https://api'))
+    esperas = []
+
+    async def dormir(segundos):
+        esperas.append(segundos)
+
+    monkeypatch.setattr(despesas_v2.asyncio, 'sleep', dormir)
+    sessao = _Sessao([_Resposta(503), _Resposta(502), _Resposta(200, b'{"dados": []}')])
+    limitador = _Limitador() if com_limitador else None
+
+    data = asyncio.run(despesas_v2.fazer_requisicao_async(sessao, 'https://api/deputados/1/despesas',
+                                                          rate_limiter=limitador, metricas=MetricasRequisicoes()))
+    assert data == {'dados': []}
+    assert esperas == [1, 2]
+    if limitador:
+        assert limitador.registrados == [503, 502, 200]
+
+
+def test_requisicao_async_429_fica_com_o_limitador(monkeypatch):
+    monkeypatch.setattr(modulo_cliente, '_client', CamaraClient(base_url='https://api'))
+    esperas = []
+
+    async def dormir(segundos):
+        esperas.append(segundos)
+
+    monkeypatch.setattr(despesas_v2.asyncio, 'sleep', dormir)
+    sessao = _Sessao([_Resposta(429), _Resposta(200, b'{"dados": []}')])
+    data = asyncio.run(despesas_v2.fazer_requisicao_async(sessao, 'https://api/deputados/1/despesas',
+                                                          rate_limiter=_Limitador(), metricas=MetricasRequisicoes()))
+    assert data == {'dados': []} and esperas == []
@@ -0,0 +1,41 @@
+"""Conditional-request cache (include/camara/httpcache.py): stored responses survive a restart, revalidate with their
+validators and report whether the content changed."""
+
+from include.camara.httpcache import RespostaCache, normalizar
+
+URL = "https://dadosabertos.camara.leg.br/api/v2/deputados/1/despesas"
+
+
+def test_chave_normalizada():
+    assert normalizar(URL + "?ano=2024&pagina=1") == normalizar(URL.replace('dadosabertos', 'DadosAbertos') + '/',
+                                                                 {'pagina': 1, 'ano': 2024, 'mes': None})
+
+
+def test_revalidacao_e_conteudo_alterado(tmp_path):
+    caminho = str(tmp_path / 'cache.sqlite')
+    chave = normalizar(URL, {'ano': 2024})
+    cache = RespostaCache(caminho)
+    assert cache.condicionais(chave) == {}
+    assert cache.gravar(chave, {'ETag': '"v1"'}, b'{"dados": [1]}')
+    cache.close()
+
+    # After a restart the entry is still there and the next request is conditional
+    reaberto = RespostaCache(caminho)
+    assert reaberto.condicionais(chave) == {'If-None-Match': '"v1"'}
+    assert reaberto.nao_modificado(chave) == b'{"dados": [1]}'
+    # A 200 with the same body (API without validators) is flagged as unchanged
+    assert not reaberto.gravar(chave, {}, b'{"dados": [1]}')
+    assert reaberto.gravar(chave, {}, b'{"dados": [1, 2]}')
+    estatisticas = reaberto.estatisticas()
+    assert (estatisticas['nao_modificadas'], estatisticas['iguais'], estatisticas['alteradas']) == (1, 1, 1)
+
+
+def test_ttl_serve_sem_requisicao(tmp_path):
+    chave = normalizar(URL)
+    sem_ttl = RespostaCache(str(tmp_path / 'cache.sqlite'))
+    sem_ttl.gravar(chave, {}, b'corpo')
+    assert sem_ttl.fresca(chave) is None
+
+    com_ttl = RespostaCache(str(tmp_path / 'cache.sqlite'), ttl=60)
+    assert com_ttl.fresca(chave) == b'corpo'
+    assert com_ttl.fresca(normalizar(URL, {'ano': 2023})) is None
@@ -0,0 +1,58 @@
+"""Compressed NDJSON landing (include/camara/landing.py): one record per line with the fixed extras, gzip or zstd,
+readable back with the same codec; an empty response still replaces the previous file."""
+
+import gzip
+import json
+
+import pyarrow as pa
+import pytest
+
+from include.camara.landing import COMPRESSOES, aterrissar, chave_landing
+
+
+def _ler(caminho, compressao):
+    with pa.input_stream(caminho, compression=compressao) as f:
+        return [json.loads(linha) for linha in f.read().decode('utf-8').splitlines()]
+
+
+def _despesa(cod_documento, valor):
+    return {'codDocumento': cod_documento, 'ano': 2024, 'mes': 12, 'valorLiquido': valor,
+            'nomeFornecedor': 'PADARIA SÃO JOÃO'}
+
+
+@pytest.mark.parametrize('compressao', sorted(COMPRESSOES))
+def test_ida_e_volta(tmp_path, compressao):
+    caminho = str(tmp_path / chave_landing('despesas/deputado_1/despesas_2024_12', compressao))
+    assert caminho.endswith(COMPRESSOES[compressao])
+    despesas = [_despesa(1, 10.5), _despesa(2, 0.1)]
+
+    resultado = aterrissar(despesas, caminho, extras={'deputado_id': 1}, compressao=compressao)
+    assert resultado['caminho'] == caminho and resultado['linhas'] == 2 and resultado['bytes'] > 0
+    assert _ler(caminho, compressao) == [{**despesa, 'deputado_id': 1} for despesa in despesas]
+    assert not (tmp_path / 'despesas' / 'deputado_1' / f"despesas_2024_12{COMPRESSOES[compressao]}.tmp").exists()
+
+
+def test_zstd_nao_e_gzip(tmp_path):
+    caminho = str(tmp_path / chave_landing('deputados', 'zstd'))
+    aterrissar([{'id': 1}], caminho, compressao='zstd')
+    with open(caminho, 'rb') as f:
+        assert f.read(4) == b'\x28\xb5\x2f\xfd'  # zstd frame magic number
+    with pytest.raises(OSError):
+        gzip.open(caminho).read()
+
+
+@pytest.mark.parametrize('compressao', sorted(COMPRESSOES))
+def test_resposta_vazia_substitui_o_arquivo(tmp_path, compressao):
+    caminho = str(tmp_path / chave_landing('despesas_2024_12', compressao))
+    aterrissar([_despesa(1, 10.5)], caminho, compressao=compressao)
+    resultado = aterrissar([], caminho, compressao=compressao)
+    assert resultado['linhas'] == 0
+    assert _ler(caminho, compressao) == []
+
+
+def test_compressao_desconhecida(tmp_path):
+    with pytest.raises(ValueError, match='brotli'):
+        chave_landing('deputados', 'brotli')
+    with pytest.raises(ValueError):
+        aterrissar([], str(tmp_path / 'deputados.ndjson.br'), compressao='brotli')
+    assert not list(tmp_path.iterdir())
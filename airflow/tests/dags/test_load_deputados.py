@@ -0,0 +1,64 @@
+"""load_stage of pipeline_camara (dags/sql/load_deputados.sql): both landing formats MERGE into CAMARA.RAW.DESPESAS,
+the table carga_despesas also loads, so they must write the same columns (include/camara/warehouse.py)."""
+
+import os
+import re
+from datetime import datetime
+
+import pytest
+
+from include.camara.dataset import PREFIXO_S3
+from include.camara.landing import chave_json_despesas, chave_landing
+from include.camara.warehouse import CHAVE, COLUNAS
+
+jinja2 = pytest.importorskip("jinja2")
+
+SQL = os.path.join(os.path.dirname(__file__), '..', '..', 'dags', 'sql', 'load_deputados.sql')
+
+
+def _renderizar(formato_landing):
+    with open(SQL, encoding='utf-8') as arquivo:
+        template = jinja2.Template(arquivo.read())
+    params = {'formato_landing': formato_landing, 'chave': list(CHAVE),
+              'colunas': [list(coluna) for coluna in COLUNAS]}
+    return template.render(params=params, logical_date=datetime(2024, 3, 1))
+
+
+def _lista(sql, inicio):
+    trecho = sql[sql.index(inicio) + len(inicio):]
+    return [coluna.strip() for coluna in trecho[:trecho.index(')')].split(',')]
+
+
+@pytest.mark.parametrize('formato_landing', ['json', 'ndjson'])
+def test_merge_usa_as_colunas_da_carga(formato_landing):
+    sql = _renderizar(formato_landing)
+    merge = sql[sql.index('MERGE INTO CAMARA.RAW.DESPESAS'):]
+    destinos = [destino for _, destino, _ in COLUNAS]
+
+    assert _lista(merge, 'THEN INSERT (') == destinos
+    assert _lista(merge, ') VALUES (') == [f"src.{destino}" for destino in destinos]
+    selecionadas = merge.split(') AS rn')[1].split(') linhas')[0]
+    assert re.findall(r'\) AS (\w+),?\n', selecionadas) == destinos
+    atualizadas = re.findall(r'^\s+(\w+) = src\.\1,?$', merge, re.MULTILINE)
+    assert atualizadas == [destino for destino in destinos if destino not in CHAVE]
+    assert 'cnpj_fornecedor ' not in merge
+
+
+def test_json_tira_o_deputado_do_caminho_real():
+    # In json mode the deputado is only in the key the HttpToS3Operator writes; a NULL deputado_id never matches
+    # the ON clause, so every run would insert the whole month again
+    sql = _renderizar('json')
+    [padrao] = re.findall(r"REGEXP_SUBSTR\(METADATA\$FILENAME, '([^']+)'", sql)
+    chave = chave_json_despesas(1234, 2024, 3)
+    assert re.search(padrao, chave).group(1) == '1234'
+    assert re.search(padrao, f"s3://bucket/{chave_json_despesas(56, 2023, 12)}").group(1) == '56'
+
+
+def test_json_le_so_os_arquivos_do_http_to_s3():
+    # camara/despesas also holds the Parquet dataset and the NDJSON landing files
+    padroes = re.findall(r"PATTERN =>? '([^']+)'", _renderizar('json'))
+    assert len(padroes) == 2
+    for padrao in padroes:
+        assert re.fullmatch(padrao, chave_json_despesas(1234, 2024, 3))
+        assert not re.fullmatch(padrao, f"{PREFIXO_S3}/ano=2024/mes=03/20240301T000000-lote-0001.parquet")
+        assert not re.fullmatch(padrao, chave_landing('camara/despesas/ndjson/deputado_1234/despesas_2024_03'))
@@ -0,0 +1,87 @@
+"""Mandate pruning (include/camara/mandatos.py): a deputado is queried in every year whose roster (widened by
+MARGEM_MESES months on each side) lists them, including mandates that start in December or end in January; a
+missing roster prunes nothing."""
+
+from datetime import datetime
+
+from include.camara.mandatos import meses_ativos, meses_periodo, podar_consultas
+from include.camara.planner import Consulta
+
+MESES_2022_2024 = [(ano, mes) for ano in (2022, 2023, 2024) for mes in range(1, 13)]
+
+MANDATOS = {
+    1: ('2022-12-15', '2024-12-31'),  # takes office in December 2022
+    2: ('2022-01-01', '2023-01-10'),  # leaves in January 2023
+    3: ('2022-01-01', '2022-12-20'),  # leaves in December 2022
+    4: ('2024-01-02', '2024-12-31'),  # takes office in January 2024
+}
+
+
+class _Metadados:
+    """Roster of deputados in office between two dates, from MANDATOS; `vazios` are the years the API failed."""
+
+    def __init__(self, vazios=()):
+        self.vazios = set(vazios)
+        self.pedidos = []
+
+    def deputados_ids(self, legislatura_id, data_inicio, data_fim):
+        self.pedidos.append((data_inicio, data_fim))
+        # The roster of year Y starts in January of Y, or in December of Y - 1 with a one-month margin
+        if int(data_inicio[:4]) + (data_inicio[5:7] == '12') in self.vazios:
+            return []
+        return [dep_id for dep_id, (inicio, fim) in MANDATOS.items() if inicio <= data_fim and data_inicio <= fim]
+
+
+def _anos(ativos, dep_id):
+    return sorted({ano for ano, _ in ativos[dep_id]})
+
+
+def test_meses_periodo_na_virada_do_ano():
+    assert meses_periodo('2022-12-15', '2023-01-10') == [(2022, 12), (2023, 1)]
+    assert meses_periodo('2023-11-01', '2024-12-31', agora=datetime(2024, 1, 20)) == [(2023, 11), (2023, 12), (2024, 1)]
+
+
+def test_margem_cobre_dezembro_e_janeiro():
+    metadados = _Metadados()
+    ativos = meses_ativos(MANDATOS, MESES_2022_2024, legislatura_id=57, margem=1, metadados=metadados)
+    # One roster per year, widened by a month: 2022 asks from December 2021 to January 2023
+    assert metadados.pedidos[0] == ('2021-12-01', '2023-01-31')
+    assert len(metadados.pedidos) == 3
+
+    assert _anos(ativos, 1) == [2022, 2023, 2024]
+    assert _anos(ativos, 2) == [2022, 2023]
+    # Left in December 2022: the margin still reaches into January 2023, so 2023 is kept
+    assert _anos(ativos, 3) == [2022, 2023]
+    # Took office in January 2024: December 2023 is within the margin of the 2024 roster, and the 2023 roster
+    # (up to January 2024) lists them too
+    assert _anos(ativos, 4) == [2023, 2024]
+
+
+def test_sem_margem_poda_o_ano_seguinte():
+    ativos = meses_ativos(MANDATOS, MESES_2022_2024, margem=0, metadados=_Metadados())
+    assert _anos(ativos, 2) == [2022, 2023]
+    assert _anos(ativos, 3) == [2022]
+    assert _anos(ativos, 4) == [2024]
+
+    consultas = [Consulta(dep_id, ano) for dep_id in MANDATOS for ano in (2022, 2023, 2024)]
+    mantidas, podadas = podar_consultas(consultas, ativos)
+    assert podadas == [Consulta(2, 2024), Consulta(3, 2023), Consulta(3, 2024), Consulta(4, 2022), Consulta(4, 2023)]
+    assert len(mantidas) + len(podadas) == len(consultas)
+
+
+def test_lista_vazia_nao_poda():
+    # No roster at all: nothing is pruned
+    assert meses_ativos(MANDATOS, MESES_2022_2024, metadados=_Metadados(vazios={2022, 2023, 2024})) is None
+    assert podar_consultas([Consulta(3, 2024)], None) == ([Consulta(3, 2024)], [])
+    assert meses_ativos(MANDATOS, [], metadados=_Metadados()) is None
+
+    # Only the 2024 roster failed: 2024 counts as active for everyone, the other years are still pruned
+    ativos = meses_ativos(MANDATOS, MESES_2022_2024, margem=0, metadados=_Metadados(vazios={2024}))
+    assert _anos(ativos, 3) == [2022, 2024]
+
+
+def test_deputado_fora_da_lista_nao_e_podado():
+    ativos = {1: {(2022, 12)}}
+    mantidas, podadas = podar_consultas([Consulta(1, 2022), Consulta(1, 2023), Consulta(99, 2023)], ativos)
+    assert mantidas == [Consulta(1, 2022), Consulta(99, 2023)]
+    assert podadas == [Consulta(1, 2023)]
@@ -0,0 +1,59 @@
+"""Hash manifest (include/camara/manifesto.py): a (deputado, ano, mes) unit identical to the last saved one is skipped,
+a changed one goes through, and nothing is recorded until salvar() (after the files are published)."""
+
+from include.camara.manifesto import Manifesto, hash_unidade, particoes_alteradas_desde
+
+
+def _despesa(deputado_id, cod_documento, mes, valor=10.0):
+    return {'deputado_id': deputado_id, 'codDocumento': cod_documento, 'ano': 2024, 'mes': mes, 'valorLiquido': valor}
+
+
+def test_unidades_iguais_sao_puladas(tmp_path):
+    base = str(tmp_path / 'dataset')
+    lote = [_despesa(1, 10, 1), _despesa(1, 11, 1), _despesa(2, 20, 1), _despesa(1, 12, 2)]
+
+    primeiro = Manifesto(base)
+    assert primeiro.filtrar(lote) == lote
+    assert primeiro.particoes_alteradas == [(2024, 1), (2024, 2)]
+    primeiro.salvar()
+
+    # Next run: deputado 1 changed a despesa in January, the rest is identical
+    segundo = Manifesto(base)
+    alterado = [_despesa(1, 10, 1), _despesa(1, 11, 1, valor=12.5), _despesa(2, 20, 1), _despesa(1, 12, 2)]
+    assert segundo.filtrar(alterado) == alterado[:2]
+    assert segundo.unidades == {'alteradas': 1, 'iguais': 2}
+    assert segundo.particoes_alteradas == [(2024, 1)]
+    segundo.salvar()
+
+    assert particoes_alteradas_desde(base) == [(2024, 1), (2024, 2)]
+    assert Manifesto(base).filtrar(alterado) == []
+
+
+def test_descartar_nao_grava_nada(tmp_path):
+    base = str(tmp_path / 'dataset')
+    manifesto = Manifesto(base)
+    manifesto.filtrar([_despesa(1, 10, 1)])
+    manifesto.descartar()
+    manifesto.salvar()
+
+    assert not (tmp_path / 'dataset' / '_manifesto').exists()
+    assert Manifesto(base).filtrar([_despesa(1, 10, 1)]) == [_despesa(1, 10, 1)]
+
+
+def test_shards_gravam_arquivos_separados(tmp_path):
+    base = str(tmp_path / 'dataset')
+    for shard, deputado_id in (('s00', 1), ('s01', 2)):
+        manifesto = Manifesto(base, shard=shard)
+        manifesto.filtrar([_despesa(deputado_id, 10, 1)])
+        manifesto.salvar()
+
+    assert sorted(p.name for p in (tmp_path / 'dataset' / '_manifesto' / 'ano=2024').iterdir()) == [
+        'mes=01-s00.json', 'mes=01-s01.json']
+    assert Manifesto(base, shard='s01').filtrar([_despesa(2, 10, 1)]) == []
+
+
+def test_hash_ignora_ordem_e_colunas_da_ingestao():
+    a, b = _despesa(1, 10, 1), _despesa(1, 11, 1)
+    assert hash_unidade([a, b]) == hash_unidade([b, a])
+    assert hash_unidade([a]) == hash_unidade([{**a, 'deputado_id': 99, 'legislatura_id': 57}])
+    assert hash_unidade([a]) != hash_unidade([{**a, 'valorLiquido': 11.0}])
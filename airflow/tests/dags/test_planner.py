@@ -0,0 +1,89 @@
+"""Query planner (include/camara/planner.py): one yearly query per deputado, monthly ones only when the year would
+pass max_paginas pages, a year is partly done or partly in the period, and the current year stops at this month."""
+
+from datetime import datetime
+
+import pytest
+
+from include.camara.client import ConsultaIncompleta
+from include.camara.planner import (Consulta, anos_legislatura, estimar_requisicoes_mensais,
+                                    estimar_requisicoes_planejadas, executar_consulta, planejar_consultas)
+
+
+def test_uma_consulta_anual_por_deputado():
+    assert planejar_consultas([1, 2], [2022, 2023]) == [
+        Consulta(1, 2022), Consulta(1, 2023), Consulta(2, 2022), Consulta(2, 2023)]
+
+
+def test_ano_grande_vira_consultas_mensais():
+    # 2022 of deputado 1 had 2500 rows: 25 pages of 100 > MAX_PAGINAS (20)
+    linhas = {(1, 2022, mes): 2500 // 12 + 1 for mes in range(1, 13)}
+    assert planejar_consultas([1], [2022], linhas) == [Consulta(1, 2022, mes) for mes in range(1, 13)]
+    assert planejar_consultas([1], [2022], linhas, max_paginas=30) == [Consulta(1, 2022)]
+
+
+def test_checkpoint_e_periodo():
+    concluidas = {(1, 2022, mes) for mes in range(1, 12)} | {(1, 2023, mes) for mes in range(1, 13)}
+    # December is all that is left of 2022; 2023 is done
+    assert planejar_consultas([1], [2022, 2023], concluidas=concluidas) == [Consulta(1, 2022, 12)]
+    # A period crossing the turn of the year asks only for its months
+    periodo = {(2022, 12), (2023, 1)}
+    assert planejar_consultas([1], [2022, 2023], periodo=periodo) == [Consulta(1, 2022, 12), Consulta(1, 2023, 1)]
+
+
+def test_ano_corrente_para_no_mes_atual():
+    janeiro = datetime(2024, 1, 15)
+    assert Consulta(1, 2024).meses(janeiro) == [Consulta(1, 2024, 1)]
+    assert Consulta(1, 2024).meses_cobertos(janeiro) == [1]
+    assert len(Consulta(1, 2023).meses(janeiro)) == 12
+    assert Consulta(1, 2024, 3).meses_cobertos(janeiro) == [3]
+    # Legislatura 57 (2023-2027) seen from January 2024
+    assert list(anos_legislatura({'anoInicio': 2023, 'anoFim': 2027}, janeiro)) == [2023, 2024]
+
+
+def test_estimativas():
+    consultas = [Consulta(1, 2022)]
+    linhas = {(1, 2022, mes): 30 for mes in range(1, 13)}
+    # 360 rows: 4 pages of 100 without the final empty page, against 12 months x (1 page + 1 empty page)
+    assert estimar_requisicoes_planejadas(consultas, linhas) == 4
+    assert estimar_requisicoes_mensais([1], [2022], linhas) == 24
+    assert estimar_requisicoes_planejadas([Consulta(1, 2022, 5)], {}) == 1
+
+
+class _Cliente:
+    """Answers page 1 of each query from `paginas`; the remaining pages come back as one list."""
+
+    def __init__(self, paginas):
+        self.paginas = paginas
+        self.pedidos = []
+        self.metricas = self
+
+    def registrar_consulta(self, paginas):
+        pass
+
+    def get_json(self, endpoint, params):
+        self.pedidos.append(params.get('mes'))
+        return self.paginas.get(params.get('mes'))
+
+    def paginas_restantes(self, endpoint, params, primeira):
+        return list(primeira['dados'])
+
+
+def _pagina(dados, ultima=1):
+    return {'dados': dados, 'links': [{'rel': 'last', 'href': f"https://api/despesas?pagina={ultima}"}]}
+
+
+def test_executar_consulta_divide_o_ano_grande():
+    paginas = {None: _pagina([{'mes': 1}], ultima=25), 1: _pagina([{'mes': 1}]), 2: _pagina([]),
+               **{mes: _pagina([{'mes': mes}]) for mes in range(3, 13)}}
+    client = _Cliente(paginas)
+    despesas = executar_consulta(client, Consulta(1, 2022))
+    assert client.pedidos == [None] + list(range(1, 13))
+    assert [d['mes'] for d in despesas] == [1] + list(range(3, 13))
+
+
+def test_executar_consulta_incompleta_guarda_o_que_veio():
+    paginas = {None: _pagina([{'mes': 1}], ultima=25), 1: _pagina([{'mes': 1}]), 2: None}
+    with pytest.raises(ConsultaIncompleta) as erro:
+        executar_consulta(_Cliente(paginas), Consulta(1, 2022))
+    assert erro.value.dados == [{'mes': 1}]
@@ -0,0 +1,64 @@
+"""Adaptive rate limiter (include/camara/ratelimit.py): the learned rate persisted in the state file must not outlive
+a change of CAMARA_RATE_LIMIT or a long idle period, and the asyncio path must not run the file lock on the loop."""
+
+import asyncio
+import threading
+import time
+
+from include.camara.ratelimit import FileBackend, RateLimiter
+
+
+def _limitador(tmp_path, taxa_inicial=10.0, **kwargs):
+    return RateLimiter(FileBackend(str(tmp_path / 'ratelimit.json')), taxa_inicial=taxa_inicial, **kwargs)
+
+
+def _derrubar_taxa(limitador):
+    """A run that ends during an outage: 429s push the rate down to taxa_minima."""
+    for _ in range(10):
+        with limitador.backend.transacao() as estado:
+            estado['ultima_reducao'] = 0.0
+        limitador.registrar(429)
+    assert limitador.taxa_atual() == limitador.taxa_minima
+
+
+def test_taxa_aprendida_vale_na_execucao_seguinte(tmp_path):
+    _derrubar_taxa(_limitador(tmp_path))
+    assert _limitador(tmp_path).taxa_atual() == 0.5
+
+
+def test_nova_taxa_inicial_descarta_a_aprendida(tmp_path):
+    _derrubar_taxa(_limitador(tmp_path))
+    assert _limitador(tmp_path, taxa_inicial=20.0).taxa_atual() == 20.0
+
+
+def test_estado_parado_volta_a_taxa_inicial(tmp_path):
+    limitador = _limitador(tmp_path, validade=60)
+    _derrubar_taxa(limitador)
+    limitador.registrar(429, retry_after='600')
+    with limitador.backend.transacao() as estado:
+        estado['atualizado_em'] -= 120
+    seguinte = _limitador(tmp_path, validade=60)
+    assert seguinte.taxa_atual() == 10.0
+    # A Retry-After still in force is kept
+    with seguinte.backend.transacao() as estado:
+        assert estado['bloqueado_ate'] > time.time() + 500
+
+
+def test_acquire_async_fora_do_event_loop(tmp_path):
+    limitador = _limitador(tmp_path)
+    threads = []
+    consumir = limitador._tenta_consumir
+
+    def registra_thread():
+        threads.append(threading.current_thread())
+        return consumir()
+
+    limitador._tenta_consumir = registra_thread
+
+    async def executa():
+        await limitador.acquire_async()
+        await limitador.registrar_async(200)
+        return threading.current_thread()
+
+    loop = asyncio.run(executa())
+    assert threads and loop not in threads
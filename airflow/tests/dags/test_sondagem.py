@@ -0,0 +1,53 @@
+"""Change probe (include/camara/sondagem.py) against the mock API (ingestao/mock_camara.py) with fixture files:
+the probe must see an edit of the most recent despesa even when the total of the period stays the same."""
+
+import json
+import os
+import sys
+
+from include.camara.client import CamaraClient
+from include.camara.sondagem import EstadoSondagem, sondar
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'ingestao'))
+from mock_camara import Fixtures, MockCamara  # noqa: E402
+
+DEPUTADO = 570001
+
+
+def _despesa(cod_documento, data, valor):
+    return {'ano': 2024, 'mes': int(data[5:7]), 'codDocumento': cod_documento, 'dataDocumento': f"{data}T00:00:00",
+            'tipoDespesa': 'PASSAGEM AÉREA', 'valorDocumento': valor, 'valorLiquido': valor, 'valorGlosa': 0.0,
+            'codLote': cod_documento}
+
+
+def _gravar(diretorio, despesas):
+    os.makedirs(diretorio / 'despesas', exist_ok=True)
+    with open(diretorio / 'despesas' / f"{DEPUTADO}.json", 'w', encoding='utf-8') as f:
+        json.dump(despesas, f)
+
+
+def test_sonda_ve_a_despesa_mais_recente_editada(tmp_path):
+    # Fixture rows in API order (oldest first): the newest despesa is not the first row of the year
+    despesas = [_despesa(1, '2024-01-10', 100.0), _despesa(2, '2024-02-15', 200.0), _despesa(3, '2024-03-20', 300.0)]
+    _gravar(tmp_path, despesas)
+    estado = EstadoSondagem(str(tmp_path / 'dataset'))
+
+    with MockCamara(Fixtures(diretorio=str(tmp_path))) as mock:
+        client = CamaraClient(base_url=mock.url)
+        sonda = sondar(client, DEPUTADO, 2024)
+        assert sonda['total'] == 3
+        assert [d['codDocumento'] for d in sonda['dados']] == [3]
+        estado.registrar(DEPUTADO, 2024, None, sonda)
+        estado.salvar()
+
+        # Nothing changed: the probe matches the saved state
+        assert not estado.mudou(DEPUTADO, 2024, None, sondar(client, DEPUTADO, 2024))
+
+        # The newest despesa is edited and the total stays the same
+        despesas[2] = _despesa(3, '2024-03-20', 310.0)
+        _gravar(tmp_path, despesas)
+        mock.fixtures.despesas.cache_clear()
+        editada = sondar(client, DEPUTADO, 2024)
+        assert editada['total'] == 3
+        assert estado.mudou(DEPUTADO, 2024, None, editada)
+    assert estado.contadores['alteradas'] == 1
@@ -0,0 +1,69 @@
+"""XCom payload of full_despesas at backfill scale. The mapped tasks keep one entry per query in the landing store
+(include/camara/resultados.py) and return only a pointer plus counters; this test checks that what goes to XCom
+stays small and does not grow with the number of deputados or queries."""
+
+import json
+
+import pyarrow.fs as pafs
+
+from include.camara.resultados import (
+    caminho_execucao,
+    ler_ids,
+    ler_resultados,
+    publicar_ids,
+    publicar_resultados,
+)
+
+LEGISLATURAS = range(51, 58)  # 7-legislature backfill
+ANOS_POR_LEGISLATURA = 4
+DEPUTADOS_POR_LEGISLATURA = 620  # 513 seats plus substitutes
+SHARDS = 8
+RUN_ID = "backfill__2026-01-01T00:00:00+00:00"
+
+# Per-task XCom budget: a pointer, a few counters and at most 12 (ano, mes) partitions
+LIMITE_POR_TAREFA = 1024
+LIMITE_BACKFILL = 256 * 1024
+
+
+def _results(deputados, ano, legislatura):
+    return [
+        {'deputado_id': dep_id, 'ano': ano, 'mes': None, 'legislatura': legislatura, 'status': 'success', 'linhas': 250}
+        for dep_id in deputados
+    ]
+
+
+def test_xcom_payload_backfill_7_legislaturas(tmp_path):
+    filesystem = pafs.LocalFileSystem()
+    base = str(tmp_path)
+    payloads = []
+    linhas_antigas = 0
+
+    for legislatura in LEGISLATURAS:
+        ids = [legislatura * 100_000 + i for i in range(DEPUTADOS_POR_LEGISLATURA)]
+        ponteiro = publicar_ids(ids, caminho_execucao(base, RUN_ID, f"deputados_ids{legislatura}"),
+                                filesystem=filesystem, legislatura=legislatura)
+        payloads.append(len(json.dumps(ponteiro)))
+        assert ler_ids(ponteiro, filesystem) == ids
+
+        primeiro_ano = 1999 + (legislatura - 51) * 4
+        for ano in range(primeiro_ano, primeiro_ano + ANOS_POR_LEGISLATURA):
+            for shard in range(SHARDS):
+                results = _results([dep_id for dep_id in ids if dep_id % SHARDS == shard], ano, legislatura)
+                linhas_antigas += len(json.dumps(results))
+                origem = f"full{ano}s{shard:02d}de{SHARDS:02d}"
+                resumo = publicar_resultados(
+                    results, caminho_execucao(base, RUN_ID, f"{legislatura}/{origem}"), filesystem=filesystem,
+                    year=ano, month=None, shard=shard, legislatura=legislatura, podadas=0,
+                    particoes=[[ano, mes] for mes in range(1, 13)],
+                )
+                payloads.append(len(json.dumps(resumo)))
+
+                assert resumo['total_processed'] == resumo['successes'] == len(results)
+                assert resumo['linhas'] == 250 * len(results)
+                assert ler_resultados(resumo, filesystem) == results
+
+    assert len(payloads) == len(LEGISLATURAS) * (1 + ANOS_POR_LEGISLATURA * SHARDS)
+    assert max(payloads) <= LIMITE_POR_TAREFA, f"largest XCom payload is {max(payloads)} bytes"
+    assert sum(payloads) <= LIMITE_BACKFILL, f"backfill XCom total is {sum(payloads)} bytes"
+    # The per-query lists that used to go to XCom are what the landing store now holds
+    assert linhas_antigas > 10 * sum(payloads)
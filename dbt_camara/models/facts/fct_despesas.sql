@@ -1,10 +1,15 @@
 {{
   config(
-    materialized='table',
+    materialized='incremental',
+    incremental_strategy='merge',
     unique_key='sk_despesa'
   )
 }}
 
+-- Partições [[ano, mes]] carregadas pela carga_despesas (var passada pela DAG dbt_despesas).
+-- Com elas, a execução incremental reprocessa só essas partições; sem elas, a partir do último ano.
+{% set particoes = var('particoes', []) %}
+
 -- Fato Despesas: construído apenas a partir de stg_despesas
 -- Sem JOIN com dim_deputados para evitar problemas de compatibilidade temporal
 WITH despesas_base AS (
@@ -34,7 +39,15 @@ WITH despesas_base AS (
       AND sd.data_documento IS NOT NULL
 
     {% if is_incremental() %}
+      {% if particoes %}
+        AND (
+          {%- for ano, mes in particoes %}
+            (sd.ano = {{ ano | int }} AND sd.mes = {{ mes | int }}){% if not loop.last %} OR{% endif %}
+          {%- endfor %}
+        )
+      {% else %}
         AND sd.ano >= (SELECT MAX(ano) FROM {{ this }})
+      {% endif %}
     {% endif %}
 ),
 
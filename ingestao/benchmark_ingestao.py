@@ -0,0 +1,304 @@
+"""Benchmark da ingestão de despesas contra o mock local da API (mock_camara.py).
+
+Cada cenário roda num processo filho, com caches, checkpoint e dataset
+próprios num diretório temporário e a API apontada para o mock. São medidos
+o tempo total, as requisições recebidas pelo mock (e quantas foram 429), o
+pico de memória (RSS) do processo, as despesas gravadas por segundo e, dos
+relatórios de métricas do cliente, retentativas, espera no limitador de taxa
+e latência p90. Cada
+execução é acrescentada ao histórico (JSON Lines) e comparada com a última
+execução de mesma configuração, para acompanhar regressões.
+
+Uso:
+    python benchmark_ingestao.py
+    python benchmark_ingestao.py --cenarios despesas_v2_async --deputados 100 --latencia 0.05
+    python benchmark_ingestao.py --taxa-429 0.05 --falhar-em-regressao
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+
+from mock_camara import adicionar_argumentos, criar_mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'airflow'))
+from include.camara.dataset import abrir
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+DAGS_DIR = os.path.join(AQUI, '..', 'airflow', 'dags')
+HISTORICO_PADRAO = os.path.join(AQUI, '..', 'data', 'benchmarks', 'historico.jsonl')
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class CenarioIndisponivel(Exception):
+    """O cenário não pode rodar neste ambiente (p.ex. Airflow não instalado)."""
+
+
+def _despesas(legislatura, dataset, diretorio):
+    import despesas
+    despesas.process_legislatura(legislatura, dataset=dataset)
+
+
+def _despesas_v2(modo, max_workers):
+    def executar(legislatura, dataset, diretorio):
+        import despesas_v2
+        despesas_v2.pipeline_completo(max_workers=max_workers, modo=modo, dataset=dataset,
+                                      checkpoint_path=os.path.join(diretorio, 'checkpoint.sqlite'))
+    return executar
+
+
+def _tarefas_dag(arquivo, dag_id, dataset):
+    """python_callable de cada tarefa da DAG, gravando no dataset local em vez do S3."""
+    try:
+        from airflow.models import DagBag
+    except ImportError as e:
+        raise CenarioIndisponivel(f"Airflow não instalado ({e})")
+    import pyarrow.fs as pafs
+
+    dag = DagBag(dag_folder=os.path.join(DAGS_DIR, arquivo), include_examples=False).get_dag(dag_id)
+    tarefas = {}
+    for tarefa in dag.tasks:
+        # Tarefas mapeadas (.partial().expand()) guardam o callable em partial_kwargs
+        funcao = getattr(tarefa, 'python_callable', None) or tarefa.partial_kwargs['python_callable']
+        funcao.__globals__['DATASET_DESPESAS'] = dataset
+        funcao.__globals__['LANDING_EXECUCOES'] = os.path.join(os.path.dirname(dataset), 'landing')
+        funcao.__globals__['filesystem_airflow'] = lambda aws_conn_id: pafs.LocalFileSystem()
+        tarefas[tarefa.task_id] = funcao
+    return tarefas
+
+
+def _dag_full_despesas(legislatura, dataset, diretorio):
+    from include.camara.metadados import get_metadados
+
+    tarefas = _tarefas_dag('full_despesas.py', 'full_despesas', dataset)
+    params = {'cargaFull': True, 'idLegislatura': legislatura}
+    contexto = {'params': params, 'logical_date': datetime.now(), 'run_id': f"benchmark__{datetime.now().isoformat()}",
+                # Os eventos de asset das partições gravadas só servem ao scheduler do Airflow: descartados
+                'outlet_events': defaultdict(lambda: SimpleNamespace(add=lambda *args, **kwargs: None))}
+    deputados_data = tarefas['get_deputados_ids'](**contexto)
+    leg = get_metadados().legislatura(legislatura)
+    anos = list(range(int(leg['dataInicio'][:4]), int(leg['dataFim'][:4]) + 1))
+    # Em sequência: no Airflow as unidades (ano, mes, shard) são tarefas mapeadas paralelas
+    for unidade in tarefas['generate_units'](anos, **contexto):
+        tarefas['process_unit_despesas'](unidade, deputados_data, **contexto)
+
+
+def _dag_incremental_despesas(legislatura, dataset, diretorio):
+    tarefas = _tarefas_dag('incremental_despesas.py', 'incremental_despesas', dataset)
+    data_referencia = tarefas['get_data_referencia']()
+    dep_ids = tarefas['get_deputados_ids'](data_referencia)
+    tarefas['processa_despesas'](dep_ids=dep_ids, data_referencia=data_referencia)
+
+
+CENARIOS = {
+    'despesas': _despesas,
+    'despesas_v2_threads': _despesas_v2('threads', 5),
+    'despesas_v2_async': _despesas_v2('async', 20),
+    'dag_full_despesas': _dag_full_despesas,
+    'dag_incremental_despesas': _dag_incremental_despesas,
+}
+
+
+def executar_cenario(nome, legislatura, diretorio):
+    """Roda um cenário (no processo filho) e grava resultado.json no diretório."""
+    resultado = {'status': 'ok'}
+    inicio = time.perf_counter()
+    try:
+        CENARIOS[nome](legislatura, os.path.join(diretorio, 'dataset'), diretorio)
+    except CenarioIndisponivel as e:
+        resultado = {'status': 'pulado', 'motivo': str(e)}
+    resultado['tempo_execucao'] = time.perf_counter() - inicio
+    with open(os.path.join(diretorio, 'resultado.json'), 'w') as f:
+        json.dump(resultado, f)
+
+
+def _contar_linhas(dataset):
+    if not os.path.isdir(dataset):
+        return 0
+    return abrir(dataset).count_rows()
+
+
+def _metricas_cliente(diretorio):
+    """Soma dos relatórios de métricas gravados pelos clientes do cenário (um por processo/tarefa)."""
+    relatorios = []
+    for nome in sorted(os.listdir(diretorio)) if os.path.isdir(diretorio) else []:
+        if nome.endswith('.json'):
+            with open(os.path.join(diretorio, nome)) as f:
+                relatorios.append(json.load(f))
+    return {
+        'retentativas': sum(r['retentativas'] for r in relatorios),
+        'espera_limitador_s': round(sum(r['espera_limitador_s'] for r in relatorios), 3),
+        'latencia_p90_s': max((r['latencia_s']['p90'] for r in relatorios), default=0.0),
+        'consultas_podadas': sum(r.get('consultas_podadas', 0) for r in relatorios),
+    }
+
+
+def medir(nome, mock, args):
+    """Roda o cenário num processo filho e devolve as métricas."""
+    diretorio = tempfile.mkdtemp(prefix=f"bench-{nome}-")
+    ambiente = dict(
+        os.environ,
+        CAMARA_API_BASE_URL=mock.url,
+        CAMARA_HTTP_CACHE='' if not args.com_cache_http else os.path.join(diretorio, 'http.sqlite'),
+        CAMARA_METADADOS_CACHE=os.path.join(diretorio, 'metadados.sqlite'),
+        CAMARA_RATE_LIMIT=str(args.taxa),
+        CAMARA_RATE_LIMIT_FILE=os.path.join(diretorio, 'ratelimit.json'),
+        CAMARA_INDICE_DESPESAS=os.path.join(diretorio, 'indice.sqlite'),
+        CAMARA_DESPESAS_DATASET=os.path.join(diretorio, 'dataset'),
+        CAMARA_METRICAS_DIR=os.path.join(diretorio, 'metricas'),
+    )
+    comando = [sys.executable, os.path.abspath(__file__), '--executar', nome,
+               '--legislatura', str(args.legislaturas[0]), '--diretorio', diretorio]
+
+    mock.zerar()
+    inicio = time.perf_counter()
+    saida = None if args.verboso else subprocess.DEVNULL
+    processo = subprocess.Popen(comando, env=ambiente, cwd=AQUI, stdout=saida, stderr=saida)
+    # wait4 devolve o uso de recursos só deste filho (ru_maxrss em KB no Linux)
+    _, status, uso = os.wait4(processo.pid, 0)
+    processo.returncode = os.waitstatus_to_exitcode(status)
+    tempo_total = time.perf_counter() - inicio
+
+    try:
+        with open(os.path.join(diretorio, 'resultado.json')) as f:
+            resultado = json.load(f)
+    except FileNotFoundError:
+        resultado = {'status': 'erro', 'motivo': f"processo terminou com código {processo.returncode}"}
+
+    linhas = _contar_linhas(os.path.join(diretorio, 'dataset'))
+    metricas = _metricas_cliente(os.path.join(diretorio, 'metricas'))
+    stats = mock.estatisticas()
+    tempo = resultado.get('tempo_execucao') or tempo_total
+    shutil.rmtree(diretorio, ignore_errors=True)
+    return {
+        'cenario': nome,
+        **resultado,
+        'tempo_total': round(tempo_total, 3),
+        'tempo_execucao': round(tempo, 3),
+        'requisicoes': stats['requisicoes'],
+        'respostas_429': int(stats['por_status'].get('429', 0)),
+        'bytes_recebidos': stats['bytes_enviados'],
+        'pico_rss_mb': round(uso.ru_maxrss / 1024, 1),
+        'linhas': linhas,
+        'linhas_por_segundo': round(linhas / tempo, 1) if tempo else 0.0,
+        **metricas,
+    }
+
+
+def _configuracao(args):
+    return {
+        'legislaturas': args.legislaturas, 'deputados': args.deputados, 'despesas_por_mes': args.despesas_por_mes,
+        'preenchimento': args.preenchimento, 'suplentes': args.suplentes, 'novas': args.novas, 'latencia': args.latencia, 'jitter': args.jitter,
+        'itens_maximo': args.itens_maximo, 'taxa_429': args.taxa_429, 'taxa': args.taxa,
+        'com_cache_http': args.com_cache_http, 'fixtures': args.fixtures,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=AQUI, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ultima_execucao(historico, configuracao):
+    """Última execução do histórico com a mesma configuração (ou None)."""
+    if not os.path.exists(historico):
+        return None
+    anterior = None
+    with open(historico) as f:
+        for linha in f:
+            execucao = json.loads(linha)
+            if execucao['configuracao'] == configuracao:
+                anterior = execucao
+    return anterior
+
+
+def comparar(resultados, anterior, tolerancia):
+    """Loga a variação de cada cenário em relação à execução anterior; devolve os que regrediram."""
+    if anterior is None:
+        logger.info("Sem execução anterior com a mesma configuração para comparar")
+        return []
+    antes = {r['cenario']: r for r in anterior['cenarios'] if r['status'] == 'ok'}
+    regressoes = []
+    for r in resultados:
+        base = antes.get(r['cenario'])
+        if r['status'] != 'ok' or base is None or not base['tempo_execucao']:
+            continue
+        variacao = r['tempo_execucao'] / base['tempo_execucao'] - 1
+        logger.info(
+            f"{r['cenario']}: tempo {variacao:+.0%} ({base['tempo_execucao']:.2f}s -> {r['tempo_execucao']:.2f}s), "
+            f"requisições {base['requisicoes']} -> {r['requisicoes']}, "
+            f"RSS {base['pico_rss_mb']} -> {r['pico_rss_mb']} MB (anterior: {anterior['quando']}, {anterior['commit']})"
+        )
+        if variacao > tolerancia:
+            regressoes.append(r['cenario'])
+    return regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da ingestão de despesas contra o mock da API")
+    parser.add_argument('--cenarios', nargs='+', choices=sorted(CENARIOS), default=list(CENARIOS))
+    parser.add_argument('--taxa', type=float, default=50,
+                        help="taxa inicial do limitador de requisições (req/s) nos processos medidos")
+    parser.add_argument('--com-cache-http', action='store_true',
+                        help="mantém o cache HTTP ligado (por padrão cada cenário baixa tudo)")
+    parser.add_argument('--historico', default=HISTORICO_PADRAO, help="arquivo JSON Lines com as execuções")
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help="aumento relativo do tempo considerado regressão")
+    parser.add_argument('--falhar-em-regressao', action='store_true')
+    parser.add_argument('--verboso', action='store_true', help="mostra a saída dos processos medidos")
+    parser.add_argument('--executar', choices=sorted(CENARIOS), help=argparse.SUPPRESS)
+    parser.add_argument('--legislatura', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--diretorio', help=argparse.SUPPRESS)
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+
+    if args.executar:
+        executar_cenario(args.executar, args.legislatura, args.diretorio)
+        sys.exit(0)
+
+    resultados = []
+    with criar_mock(args) as mock:
+        logger.info(f"Mock da API em {mock.url}")
+        for nome in args.cenarios:
+            resultado = medir(nome, mock, args)
+            resultados.append(resultado)
+            if resultado['status'] == 'ok':
+                logger.info(
+                    f"{nome}: {resultado['tempo_execucao']:.2f}s, {resultado['requisicoes']} requisições "
+                    f"({resultado['respostas_429']} 429), {resultado['linhas']} despesas "
+                    f"({resultado['linhas_por_segundo']:.0f}/s), pico de {resultado['pico_rss_mb']} MB, "
+                    f"{resultado['espera_limitador_s']:.1f}s no limitador"
+                )
+            else:
+                logger.warning(f"{nome}: {resultado['status']} ({resultado.get('motivo')})")
+
+    configuracao = _configuracao(args)
+    regressoes = comparar(resultados, ultima_execucao(args.historico, configuracao), args.tolerancia)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.historico)), exist_ok=True)
+    with open(args.historico, 'a') as f:
+        f.write(json.dumps({
+            'quando': datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit(),
+            'configuracao': configuracao,
+            'cenarios': resultados,
+        }) + '\n')
+    logger.info(f"Resultados acrescentados a {args.historico}")
+
+    if regressoes:
+        logger.warning(f"Regressões acima de {args.tolerancia:.0%}: {', '.join(regressoes)}")
+        if args.falhar_em_regressao:
+            sys.exit(1)
@@ -0,0 +1,38 @@
+"""Compacta o dataset de despesas particionado (ano=/mes=): junta os arquivos
+pequenos de cada partição em arquivos de até --tamanho-alvo MB e mantém só a
+versão mais recente de cada despesa (deputado_id, codDocumento).
+
+Uso:
+    python compactar_despesas.py
+    python compactar_despesas.py --dataset s3://bucket/camara/despesas/dataset --ano 2024 --mes 3
+"""
+import os
+import sys
+import logging
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'airflow'))
+from include.camara.dataset import DATASET_PADRAO, TAMANHO_ALVO, compactar, particoes
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=DATASET_PADRAO, help="diretório ou URI (s3://...) do dataset")
+    parser.add_argument('--tamanho-alvo', type=int, default=TAMANHO_ALVO // 1024 // 1024, help="MB por arquivo")
+    parser.add_argument('--ano', type=int, help="só as partições deste ano")
+    parser.add_argument('--mes', type=int, help="só as partições deste mês (com --ano)")
+    args = parser.parse_args()
+
+    filtro = None
+    if args.ano:
+        filtro = {(ano, mes) for ano, mes in particoes(args.dataset)
+                  if ano == args.ano and (args.mes is None or mes == args.mes)}
+
+    resumos = compactar(args.dataset, tamanho_alvo=args.tamanho_alvo * 1024 * 1024, particoes_filtro=filtro)
+    arquivos_antes = sum(r['arquivos_antes'] for r in resumos)
+    arquivos_depois = sum(r['arquivos_depois'] for r in resumos)
+    removidas = sum(r['linhas_antes'] - r['linhas_depois'] for r in resumos)
+    logger.info(f"{len(resumos)} partições compactadas: {arquivos_antes} -> {arquivos_depois} arquivos, "
+                f"{removidas} versões antigas removidas")
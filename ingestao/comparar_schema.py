@@ -0,0 +1,104 @@
+"""Compara o Parquet de despesas com dtypes inferidos pelo pandas (formato antigo)
+com o Parquet escrito pelo schema tipado (include/camara/schema.py).
+
+Uso:
+    python comparar_schema.py --entrada ../data/despesas/parquet/despesas-57.parquet
+    python comparar_schema.py --sintetico 200000
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'airflow'))
+from include.camara.schema import escrever_parquet
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TIPOS_DESPESA = [
+    "MANUTENÇÃO DE ESCRITÓRIO DE APOIO À ATIVIDADE PARLAMENTAR", "COMBUSTÍVEIS E LUBRIFICANTES.",
+    "PASSAGEM AÉREA - SIGEPA", "TELEFONIA", "DIVULGAÇÃO DA ATIVIDADE PARLAMENTAR.",
+    "LOCAÇÃO OU FRETAMENTO DE VEÍCULOS AUTOMOTORES", "SERVIÇOS POSTAIS", "HOSPEDAGEM ,EXCETO DO PARLAMENTAR NO DISTRITO FEDERAL.",
+    "FORNECIMENTO DE ALIMENTAÇÃO DO PARLAMENTAR", "CONSULTORIAS, PESQUISAS E TRABALHOS TÉCNICOS.",
+]
+TIPOS_DOCUMENTO = ["Nota Fiscal", "Recibos/Outros", "Nota Fiscal Eletrônica", "Documento de Despesa no Exterior"]
+
+
+def gerar_despesas(n, seed=42):
+    """Despesas sintéticas com a cardinalidade aproximada da API."""
+    rnd = random.Random(seed)
+    fornecedores = [(f"FORNECEDOR {i} LTDA", f"{rnd.randrange(10**13, 10**14)}") for i in range(5000)]
+    despesas = []
+    for i in range(n):
+        ano, mes = rnd.choice(range(2019, 2024)), rnd.randrange(1, 13)
+        nome, cnpj = rnd.choice(fornecedores)
+        valor = round(rnd.uniform(10, 20000), 2)
+        tipo_documento = rnd.randrange(len(TIPOS_DOCUMENTO))
+        despesas.append({
+            'ano': ano, 'mes': mes,
+            'tipoDespesa': rnd.choice(TIPOS_DESPESA),
+            'codDocumento': 7_000_000 + i,
+            'tipoDocumento': TIPOS_DOCUMENTO[tipo_documento],
+            'codTipoDocumento': tipo_documento,
+            'dataDocumento': f"{ano}-{mes:02d}-{rnd.randrange(1, 29):02d}T00:00:00",
+            'numDocumento': str(rnd.randrange(10**6)),
+            'valorDocumento': valor,
+            'urlDocumento': f"https://www.camara.leg.br/cota-parlamentar/documentos/publ/{i}/{ano}/{7_000_000 + i}.pdf",
+            'nomeFornecedor': nome,
+            'cnpjCpfFornecedor': cnpj,
+            'valorLiquido': valor,
+            'valorGlosa': 0.0,
+            'numRessarcimento': "",
+            'codLote': 1_800_000 + i // 3,
+            'parcela': 0,
+            'deputado_id': rnd.randrange(204_000, 204_600),
+            'legislatura_id': 56,
+            'ano_legislatura': "2019-2023",
+        })
+    return despesas
+
+
+def tempo_leitura(ler, path, repeticoes=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        ler(path)
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def comparar(despesas, diretorio):
+    antigo = os.path.join(diretorio, 'inferido.parquet')
+    novo = os.path.join(diretorio, 'tipado.parquet')
+
+    pd.DataFrame(despesas).to_parquet(antigo, index=False)
+    escrever_parquet(despesas, novo)
+
+    for nome, path in [('inferido (atual)', antigo), ('schema tipado', novo)]:
+        tamanho = os.path.getsize(path) / 1024 / 1024
+        arrow = tempo_leitura(pq.read_table, path) * 1000
+        pandas = tempo_leitura(pd.read_parquet, path) * 1000
+        logger.info(f"{nome:>18}: {tamanho:8.2f} MB, leitura Arrow {arrow:7.1f} ms, pandas {pandas:7.1f} ms")
+
+    logger.info(f"Redução de tamanho: {1 - os.path.getsize(novo) / os.path.getsize(antigo):.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--entrada', help="Parquet de despesas no formato antigo (dtypes inferidos)")
+    grupo.add_argument('--sintetico', type=int, help="gera N despesas sintéticas")
+    args = parser.parse_args()
+
+    if args.entrada:
+        despesas = pd.read_parquet(args.entrada).to_dict('records')
+    else:
+        despesas = gerar_despesas(args.sintetico)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        comparar(despesas, diretorio)
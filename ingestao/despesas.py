@@ -1,78 +1,232 @@
 import os
+import sys
 import logging
-import requests
-import pandas as pd
+import multiprocessing
+import queue
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
 from tqdm import tqdm
-from concurrent.futures import ProcessPoolExecutor
+
+# Código compartilhado com as DAGs (airflow/include)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'airflow'))
+from include.camara.client import PAGINAS_SIMULTANEAS, ConsultaIncompleta, get_client
+from include.camara.metadados import get_metadados
+from include.camara.planner import executar_consulta, planejar_consultas
+from include.camara.dataset import DATASET_PADRAO, DatasetSink
+from include.camara.dedup import IndiceDespesas, indice_do_dataset
+from include.camara.mandatos import meses_ativos, meses_periodo, podar_consultas
+from include.camara.manifesto import Manifesto
+from include.camara.sink import MAX_LINHAS_BUFFER
 
 LEGISLATURAS = range(57, 50, -1)
+THREADS_POR_PROCESSO = 4
+
+class Unidade(NamedTuple):
+    """Um deputado numa legislatura: os anos a planejar, os meses em exercício
+    (None: sem poda) e os meses pedidos (None: todos os dos anos)."""
+    legislatura: int
+    deputado_id: int
+    anos: tuple
+    meses: Optional[frozenset] = None
+    periodo: Optional[frozenset] = None
+
+    def consultas(self):
+        """(consultas a fazer, consultas podadas por estarem fora do mandato)."""
+        planejadas = planejar_consultas([self.deputado_id], self.anos, periodo=self.periodo)
+        return podar_consultas(planejadas, None if self.meses is None else {self.deputado_id: self.meses})
+
+    @property
+    def peso(self):
+        """Meses a baixar, para pôr as unidades maiores primeiro na fila."""
+        meses = self.periodo if self.periodo is not None else {(ano, mes) for ano in self.anos for mes in range(1, 13)}
+        return len(meses if self.meses is None else meses & self.meses)
+
+def _baixar_unidade(unidade):
+    """Todas as despesas de uma unidade; devolve (despesas, consultas incompletas, consultas podadas)."""
+    despesas, falhas = [], 0
+    consultas, podadas = unidade.consultas()
+    get_client().metricas.registrar_poda(len(podadas))
+    for consulta in consultas:
+        try:
+            dados = executar_consulta(get_client(), consulta, extra_params={'idLegislatura': unidade.legislatura})
+        except ConsultaIncompleta as e:
+            logging.error(str(e))
+            dados = e.dados
+            falhas += 1
+        for despesa in dados:
+            despesa['deputado_id'] = unidade.deputado_id
+            despesa['legislatura_id'] = unidade.legislatura
+        despesas.extend(dados)
+    return despesas, falhas, len(podadas)
 
-def fetch_all_pages(url):
-    all_data = []
-    page = 1
+def _trabalhador(fila, resultados, threads):
+    """Processo trabalhador: `threads` threads tiram unidades da fila compartilhada
+    até receber None e devolvem as despesas pela fila de resultados."""
+    logging.basicConfig(level=logging.INFO)
+    get_client(pool_maxsize=max(threads * PAGINAS_SIMULTANEAS, 10))
+
+    def consome():
+        while True:
+            unidade = fila.get()
+            if unidade is None:
+                return
+            try:
+                resultados.put((unidade.legislatura, unidade.deputado_id, *_baixar_unidade(unidade)))
+            except Exception as e:
+                logging.error(f"Erro no deputado {unidade.deputado_id} da legislatura {unidade.legislatura}: {e}")
+                resultados.put((unidade.legislatura, unidade.deputado_id, [], 1, 0))
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in range(threads):
+            executor.submit(consome)
+    get_client().log_estatisticas()
+    get_client().metricas.exportar("despesas")
+
+def _proximo_resultado(resultados, trabalhadores):
+    """Próximo resultado da fila; falha em vez de esperar para sempre se os trabalhadores morreram."""
     while True:
-        paginated_url = f"{url}&pagina={page}"
-        response = requests.get(paginated_url)
-        if response.status_code == 200:
-            data = response.json()
-            if 'dados' in data and data['dados']:
-                all_data.extend(data['dados'])
-                page += 1
-            else:
-                break
-        else:
-            logging.error(f"Erro na requisição: {response.status_code}")
-            break
-    return all_data
-
-def process_legislatura(legislatura):
-    logging.info(f"Iniciando processamento para a legislatura {legislatura}...")
-    despesas_legislatura = []
-    despesas_count_por_ano = {}
-
-    url_deputados = f"https://dadosabertos.camara.leg.br/api/v2/deputados?idLegislatura={legislatura}&itens=10000&ordem=ASC&ordenarPor=nome"
-    deputados_data = fetch_all_pages(url_deputados)
-    deputados = pd.json_normalize(deputados_data)
-    dep_ids = deputados['id'].tolist()
-
-    logging.info(f"Encontrados {len(dep_ids)} deputados na legislatura {legislatura}")
-
-    for dep_id in tqdm(dep_ids, desc=f"Baixando despesas para a legislatura {legislatura}", unit="deputado"):
-        legislatura_url = f"https://dadosabertos.camara.leg.br/api/v2/legislaturas/{legislatura}"
-        legislatura_response = requests.get(legislatura_url)
-        if legislatura_response.status_code == 200:
-            legislatura_data = legislatura_response.json()
-            data_inicio = legislatura_data['dados']['dataInicio']
-            data_fim = legislatura_data['dados']['dataFim']
-            ano_inicio = int(data_inicio.split('-')[0])
-            ano_fim = int(data_fim.split('-')[0])
-            anos_legislatura = range(ano_inicio, ano_fim + 1)
-            for ano in anos_legislatura:
-                for mes in range(1, 13):
-                    url_despesa = f"https://dadosabertos.camara.leg.br/api/v2/deputados/{dep_id}/despesas?ano={ano}&mes={mes}&idLegislatura={legislatura}&itens=1000"
-                    despesas = fetch_all_pages(url_despesa)
-                    if despesas:
-                        for despesa in despesas:
-                            despesa['deputado_id'] = dep_id
-                            despesa['legislatura_id'] = legislatura
-                        despesas_legislatura.extend(despesas)
-                        if ano not in despesas_count_por_ano:
-                            despesas_count_por_ano[ano] = 0
-                        despesas_count_por_ano[ano] += len(despesas)
-
-    if despesas_legislatura:
-        df_despesas = pd.DataFrame(despesas_legislatura)
-        logging.info(f"Total de despesas baixadas para a legislatura {legislatura}: {len(df_despesas)}")
-        parquet_path = f"../data/despesas/parquet/despesas-{legislatura}.parquet"
-        os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
-        df_despesas.to_parquet(parquet_path, index=False)
-        for ano, count in despesas_count_por_ano.items():
-            if count > 0:
-                logging.info(f"Legislatura {legislatura} - Ano {ano}: {count} despesas")
+        try:
+            return resultados.get(timeout=10)
+        except queue.Empty:
+            if not any(trabalhador.is_alive() for trabalhador in trabalhadores):
+                raise RuntimeError("Os processos trabalhadores terminaram antes de entregar todas as unidades")
+
+def _finalizar_legislatura(legislatura, sink, contagem_por_ano, falhas, podadas):
+    sink.fechar()
+    if sink.linhas:
+        logging.info(f"Total de despesas gravadas para a legislatura {legislatura}: {sink.linhas}")
+        for ano, count in sorted(contagem_por_ano.items()):
+            logging.info(f"Legislatura {legislatura} - Ano {ano}: {count} despesas")
     else:
-        logging.warning(f"Nenhuma despesa encontrada para a legislatura {legislatura}")
+        logging.warning(f"Nenhuma despesa nova para a legislatura {legislatura}")
+    if falhas:
+        logging.error(f"Legislatura {legislatura}: {falhas} consultas incompletas")
+    if podadas:
+        logging.info(f"Legislatura {legislatura}: {podadas} consultas fora do mandato podadas (requisições evitadas)")
+
+def montar_unidades(legislaturas=LEGISLATURAS, deputados=None, periodo=None, podar=True, metadados=None):
+    """Unidades (legislatura, deputado) a baixar, a partir do cache de metadados.
+
+    deputados: ids a considerar (padrão: todos os da legislatura); periodo:
+    {(ano, mes)} a baixar (padrão: a legislatura inteira). Com podar, cada
+    unidade leva os meses em exercício do deputado (ver include.camara.mandatos)
+    e os anos fora do mandato não são consultados. Legislaturas sem dados ou
+    fora do período ficam de fora.
+    """
+    metadados = metadados or get_metadados()
+    deputados = set(deputados) if deputados is not None else None
+    unidades = []
+    for legislatura in legislaturas:
+        legislatura_data = metadados.legislatura(legislatura)
+        dep_ids = metadados.deputados_ids(legislatura) if legislatura_data else []
+        if not dep_ids:
+            logging.error(f"Legislatura {legislatura} não encontrada ou sem deputados")
+            continue
+        if deputados is not None:
+            dep_ids = [dep_id for dep_id in dep_ids if dep_id in deputados]
+        meses = meses_periodo(legislatura_data['dataInicio'], legislatura_data['dataFim'])
+        if periodo is not None:
+            meses = [mes for mes in meses if mes in periodo]
+        if not dep_ids or not meses:
+            continue
+        logging.info(f"Legislatura {legislatura}: {len(dep_ids)} deputados, {len(meses)} meses")
+        anos = tuple(sorted({ano for ano, _ in meses}))
+        ativos = meses_ativos(dep_ids, meses, legislatura, metadados=metadados) if podar else None
+        unidades += [Unidade(legislatura, dep_id, anos, frozenset(ativos[dep_id]) if ativos else None,
+                             frozenset(meses) if periodo is not None else None)
+                     for dep_id in dep_ids]
+    return unidades
+
+def processar_unidades(unidades, processos=None, threads=THREADS_POR_PROCESSO, max_linhas_buffer=MAX_LINHAS_BUFFER,
+                       dataset=DATASET_PADRAO, formato='parquet'):
+    """Baixa as despesas das unidades com um escalonador por roubo de trabalho.
+
+    Cada unidade (legislatura, deputado) entra numa fila única, consumida por
+    `processos` processos com `threads` threads cada: quem termina pega a
+    próxima, então uma legislatura grande (ou a atual, incompleta) não deixa
+    os outros núcleos parados. As unidades com mais meses entram primeiro.
+    Este processo recebe os resultados e grava cada legislatura no seu
+    DatasetSink (origem legislaturaN, no `formato` pedido), publicado quando o
+    último deputado dela chega; no máximo max_linhas_buffer despesas por
+    legislatura ficam em memória. O manifesto e o índice de deduplicação são
+    únicos e só são salvos no fim: uma execução interrompida não registra
+    nada, e a próxima regrava as legislaturas que já tinham sido publicadas.
+    """
+    processos = processos or os.cpu_count()
+    unidades = sorted(unidades, key=lambda unidade: -unidade.peso)
+    pendentes = defaultdict(int)
+    for unidade in unidades:
+        pendentes[unidade.legislatura] += 1
+
+    # Meses de um deputado iguais aos da última carga (mesmo hash no manifesto) não são gravados de novo;
+    # dentro dos meses alterados, despesas idênticas às já gravadas (mesmo hash no índice) também são descartadas.
+    # Um manifesto e um índice para todas as legislaturas (gravam os mesmos arquivos e o mesmo SQLite), filtrados
+    # aqui e salvos uma vez, depois que os arquivos de todas foram publicados.
+    manifesto = Manifesto(dataset)
+    indice = IndiceDespesas(indice_do_dataset(dataset))
+    sinks = {legislatura: DatasetSink(dataset, origem=f"legislatura{legislatura}", max_linhas=max_linhas_buffer,
+                                      formato=formato)
+             for legislatura in pendentes}
+    contagem_por_ano = defaultdict(lambda: defaultdict(int))
+    falhas = defaultdict(int)
+    podadas = defaultdict(int)
+
+    # spawn: os filhos abrem seus próprios clientes HTTP em vez de herdar as conexões deste processo
+    contexto = multiprocessing.get_context('spawn')
+    fila, resultados = contexto.Queue(), contexto.Queue()
+    for unidade in unidades:
+        fila.put(unidade)
+    for _ in range(processos * threads):
+        fila.put(None)
+    trabalhadores = [contexto.Process(target=_trabalhador, args=(fila, resultados, threads)) for _ in range(processos)]
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+
+    try:
+        for _ in tqdm(range(len(unidades)), desc="Baixando despesas", unit="deputado"):
+            legislatura, dep_id, despesas, falhas_unidade, podadas_unidade = _proximo_resultado(resultados,
+                                                                                                trabalhadores)
+            falhas[legislatura] += falhas_unidade
+            podadas[legislatura] += podadas_unidade
+            despesas = indice.filtrar(manifesto.filtrar(despesas))
+            if despesas:
+                sinks[legislatura].escrever(despesas)
+                for despesa in despesas:
+                    contagem_por_ano[legislatura][despesa['ano']] += 1
+            pendentes[legislatura] -= 1
+            if not pendentes[legislatura]:
+                _finalizar_legislatura(legislatura, sinks.pop(legislatura), contagem_por_ano[legislatura],
+                                       falhas[legislatura], podadas[legislatura])
+    except BaseException:
+        # Um trabalhador morreu ou a gravação falhou: as legislaturas ainda abertas não deixam .tmp no dataset,
+        # e nada é registrado no manifesto nem no índice (as já publicadas serão regravadas na próxima execução)
+        for sink in sinks.values():
+            sink.descartar()
+        manifesto.descartar()
+        indice.descartar()
+        indice.close()
+        for trabalhador in trabalhadores:
+            trabalhador.terminate()
+        raise
+
+    for trabalhador in trabalhadores:
+        trabalhador.join()
+    manifesto.salvar()
+    indice.salvar()
+    manifesto.log_estatisticas()
+    indice.log_estatisticas()
+    indice.close()
+    get_metadados().log_estatisticas()
+
+def processar_legislaturas(legislaturas=LEGISLATURAS, processos=None, threads=THREADS_POR_PROCESSO,
+                           max_linhas_buffer=MAX_LINHAS_BUFFER, dataset=DATASET_PADRAO, podar=True):
+    """Baixa as despesas de legislaturas inteiras (ver montar_unidades e processar_unidades)."""
+    processar_unidades(montar_unidades(legislaturas, podar=podar), processos, threads, max_linhas_buffer, dataset)
+
+def process_legislatura(legislatura, max_linhas_buffer=MAX_LINHAS_BUFFER, dataset=DATASET_PADRAO, **kwargs):
+    processar_legislaturas([legislatura], max_linhas_buffer=max_linhas_buffer, dataset=dataset, **kwargs)
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    with ProcessPoolExecutor() as executor:
-        executor.map(process_legislatura, LEGISLATURAS)
+    processar_legislaturas(LEGISLATURAS)
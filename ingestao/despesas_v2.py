@@ -1,69 +1,54 @@
-
 import os
-import logging
-import requests
-import pandas as pd
 import json
+import sys
+import logging
+import argparse
+import asyncio
+import aiohttp
 from tqdm import tqdm
+from collections import defaultdict
+from itertools import groupby
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
+# Código compartilhado com as DAGs (airflow/include)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'airflow'))
+from include.camara.checkpoint import CHECKPOINT_PADRAO, CheckpointStore
+from include.camara.client import PAGINAS_SIMULTANEAS, ConsultaIncompleta, get_client, link, numero_pagina
+from include.camara.planner import (
+    ITENS_MAXIMO, MAX_PAGINAS, Consulta, anos_legislatura, executar_consulta, linhas_do_dataset,
+    planejar_consultas, resumo_plano,
+)
+from include.camara.dataset import DATASET_PADRAO, DatasetSink
+from include.camara.mandatos import log_poda, meses_ativos, meses_periodo, podar_consultas
+from include.camara.manifesto import Manifesto
+from include.camara.dedup import IndiceDespesas, indice_do_dataset
+from include.camara.metadados import get_metadados
+from include.camara.sink import MAX_LINHAS_BUFFER
+
 # Configuração
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def fazer_requisicao(url, max_retries=3, delay=1):
-    """Faz requisição com retry automático"""
-    for tentativa in range(max_retries):
-        try:
-            response = requests.get(url, timeout=30)
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 429:
-                time.sleep(delay * (2 ** tentativa))
-                continue
-            else:
-                logger.warning(f"Status {response.status_code} para URL: {url}")
-                return None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erro na requisição (tentativa {tentativa + 1}): {e}")
-            if tentativa < max_retries - 1:
-                time.sleep(delay)
-    return None
+    """Faz requisição com retry automático, pelo cliente HTTP compartilhado"""
+    return get_client().get_json(url, max_retries=max_retries, delay=delay)
 
 def fetch_all_pages(base_url, max_pages=None):
-    """Busca todas as páginas de uma API paginada"""
-    all_data = []
-    page = 1
-
-    while True:
-        if max_pages and page > max_pages:
-            break
-
-        url = f"{base_url}&pagina={page}&itens=100"
-        data = fazer_requisicao(url)
-
-        if not data or 'dados' not in data or not data['dados']:
-            break
-
-        all_data.extend(data['dados'])
-        page += 1
-        time.sleep(0.1)
-
-    return all_data
+    """Busca todas as páginas de uma API paginada (páginas 2..N em paralelo, na ordem)"""
+    return get_client().fetch_all_pages(base_url, itens=100, max_pages=max_pages)
 
 def obter_todas_legislaturas():
-    """Obtém todas as legislaturas disponíveis na API"""
-    url = "https://dadosabertos.camara.leg.br/api/v2/legislaturas?itens=100&ordem=DESC&ordenarPor=id"
-    data = fazer_requisicao(url)
+    """Obtém todas as legislaturas disponíveis na API (pelo cache de metadados)"""
+    dados = get_metadados().legislaturas()
 
-    if not data or 'dados' not in data:
+    if not dados:
         logger.error("Não foi possível obter as legislaturas")
         return []
 
     legislaturas = []
-    for leg in data['dados']:
+    for leg in dados:
         ano_inicio = int(leg['dataInicio'].split('-')[0])
         if ano_inicio >= 2000:
             legislaturas.append({
@@ -78,48 +63,78 @@ def obter_todas_legislaturas():
     return legislaturas
 
 def obter_deputados_legislatura(legislatura_id):
-    """Obtém todos os deputados de uma legislatura"""
-    url = f"https://dadosabertos.camara.leg.br/api/v2/deputados?idLegislatura={legislatura_id}&ordem=ASC&ordenarPor=nome"
-    deputados_data = fetch_all_pages(url)
+    """Obtém todos os deputados de uma legislatura (pelo cache de metadados)"""
+    dep_ids = get_metadados().deputados_ids(legislatura_id)
 
-    if not deputados_data:
+    if not dep_ids:
         logger.warning(f"Nenhum deputado encontrado para legislatura {legislatura_id}")
-        return []
-
-    return [dep['id'] for dep in deputados_data]
 
-def extrair_despesas_deputado(dep_id, legislatura_info):
-    """Extrai todas as despesas de um deputado para uma legislatura"""
+    return dep_ids
+
+def anotar_despesas(despesas, dep_id, legislatura_info):
+    for despesa in despesas:
+        despesa['deputado_id'] = dep_id
+        despesa['legislatura_id'] = legislatura_info['id']
+        despesa['ano_legislatura'] = f"{legislatura_info['anoInicio']}-{legislatura_info['anoFim']}"
+
+def unidades_previstas(deputados, legislatura_info):
+    return len(deputados) * sum(len(Consulta(0, ano).meses()) for ano in anos_legislatura(legislatura_info))
+
+def ativos_legislatura(deputados, legislatura_info):
+    """Meses em exercício de cada deputado da legislatura (ver include.camara.mandatos)"""
+    meses = meses_periodo(legislatura_info['dataInicio'], legislatura_info['dataFim'])
+    return meses_ativos(deputados, meses, legislatura_info['id'])
+
+def podar_por_mandato(consultas, deputados, legislatura_info, checkpoint=None):
+    """Descarta as consultas fora do mandato de cada deputado; com checkpoint, as
+    podadas entram como unidades concluídas sem despesas"""
+    mantidas, podadas = podar_consultas(consultas, ativos_legislatura(deputados, legislatura_info))
+    if checkpoint:
+        for consulta in podadas:
+            checkpoint.registrar(legislatura_info['id'], consulta.deputado_id, consulta.ano, consulta.meses_cobertos(), [])
+    get_client().metricas.registrar_poda(len(podadas))
+    log_poda(f"Legislatura {legislatura_info['id']}", mantidas, podadas)
+    return mantidas
+
+def extrair_despesas_deputado(dep_id, legislatura_info, checkpoint=None, concluidas=None, consultas=None):
+    """Extrai todas as despesas de um deputado para uma legislatura (uma consulta por ano, ver planner)
+
+    Com checkpoint, cada consulta completa é gravada e as unidades em `concluidas` são puladas.
+    consultas: plano já montado (e podado) para o deputado; por padrão, planeja todos os anos.
+    """
     todas_despesas = []
-    anos = range(legislatura_info['anoInicio'], min(legislatura_info['anoFim'], datetime.now().year) + 1)
+    client = get_client()
+    if consultas is None:
+        consultas = planejar_consultas([dep_id], anos_legislatura(legislatura_info), concluidas=concluidas)
 
-    for ano in anos:
-        for mes in range(1, 13):
-            if ano == datetime.now().year and mes > datetime.now().month:
-                break
-
-            url = f"https://dadosabertos.camara.leg.br/api/v2/deputados/{dep_id}/despesas?ano={ano}&mes={mes}&itens=100"
-            despesas = fetch_all_pages(url)
-
-            if despesas:
-                for despesa in despesas:
-                    despesa['deputado_id'] = dep_id
-                    despesa['legislatura_id'] = legislatura_info['id']
-                    despesa['ano_legislatura'] = f"{legislatura_info['anoInicio']}-{legislatura_info['anoFim']}"
+    for consulta in consultas:
+        try:
+            despesas = executar_consulta(client, consulta)
+            completa = True
+        except ConsultaIncompleta as e:
+            logger.warning(f"{e}; a unidade fica pendente para o --resume")
+            despesas, completa = e.dados, False
 
-                todas_despesas.extend(despesas)
+        anotar_despesas(despesas, dep_id, legislatura_info)
+        if checkpoint and completa:
+            checkpoint.registrar(legislatura_info['id'], dep_id, consulta.ano, consulta.meses_cobertos(), despesas)
 
-            time.sleep(0.05)
+        todas_despesas.extend(despesas)
 
     return todas_despesas
 
 def extrair_despesas_deputado_thread(args):
     """Versão da função para usar com ThreadPoolExecutor"""
-    dep_id, legislatura_info = args
-    return extrair_despesas_deputado(dep_id, legislatura_info)
+    dep_id, legislatura_info, checkpoint, concluidas, consultas = args
+    return extrair_despesas_deputado(dep_id, legislatura_info, checkpoint, concluidas, consultas)
 
-def extrair_despesas_legislatura_multithread(legislatura_info, max_workers=5):
-    """Extrai despesas usando multithreading"""
+def extrair_despesas_legislatura_multithread(legislatura_info, max_workers=5, checkpoint=None, concluidas=None, sink=None,
+                                             podar=True):
+    """Extrai despesas usando multithreading
+
+    Com sink, cada deputado é gravado assim que termina e nada é acumulado (retorna []).
+    Com podar, os anos/meses fora do mandato de cada deputado não são consultados.
+    """
     deputados = obter_deputados_legislatura(legislatura_info['id'])
 
     if not deputados:
@@ -127,9 +142,18 @@ def extrair_despesas_legislatura_multithread(legislatura_info, max_workers=5):
         return []
 
     logger.info(f"Extraindo despesas de {len(deputados)} deputados da legislatura {legislatura_info['id']} usando {max_workers} threads")
+    if checkpoint:
+        checkpoint.registrar_plano(legislatura_info['id'], unidades_previstas(deputados, legislatura_info))
+
+    consultas = planejar_consultas(deputados, anos_legislatura(legislatura_info), concluidas=concluidas)
+    if podar:
+        consultas = podar_por_mandato(consultas, deputados, legislatura_info, checkpoint)
+    por_deputado = defaultdict(list)
+    for consulta in consultas:
+        por_deputado[consulta.deputado_id].append(consulta)
 
     todas_despesas = []
-    args_list = [(dep_id, legislatura_info) for dep_id in deputados]
+    args_list = [(dep_id, legislatura_info, checkpoint, concluidas, por_deputado[dep_id]) for dep_id in deputados]
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         future_to_deputado = {executor.submit(extrair_despesas_deputado_thread, args): args[0] for args in args_list}
@@ -138,14 +162,226 @@ def extrair_despesas_legislatura_multithread(legislatura_info, max_workers=5):
             deputado_id = future_to_deputado[future]
             try:
                 despesas = future.result()
-                todas_despesas.extend(despesas)
+                if sink:
+                    sink.escrever(despesas)
+                else:
+                    todas_despesas.extend(despesas)
             except Exception as exc:
                 logger.error(f"Erro ao processar deputado {deputado_id}: {exc}")
 
     return todas_despesas
 
-def pipeline_completo(max_workers=5):
-    """Pipeline completo para extrair todas as despesas desde 2000"""
+async def fazer_requisicao_async(session, url, params=None, max_retries=3, delay=1, rate_limiter=None, cache=None,
+                                 metricas=None):
+    """Versão assíncrona de fazer_requisicao, com a mesma política de retry, o mesmo limitador de taxa,
+    o mesmo cache de respostas (requisições condicionais) e as mesmas métricas do cliente"""
+    metricas = metricas or get_client().metricas
+    rota = get_client().rota(url)
+    chave, cabecalhos = None, {}
+    if cache:
+        chave = cache.chave(url, params)
+        corpo = cache.fresca(chave)
+        if corpo is not None:
+            metricas.registrar_cache()
+            return json.loads(corpo)
+        cabecalhos = cache.condicionais(chave)
+
+    for tentativa in range(max_retries):
+        if tentativa:
+            metricas.registrar_retentativa()
+        inicio = time.perf_counter()
+        try:
+            if rate_limiter:
+                metricas.registrar_espera(await rate_limiter.acquire_async())
+                inicio = time.perf_counter()
+            async with session.get(url, params=params, headers=cabecalhos) as response:
+                corpo = await response.read()
+                metricas.registrar_requisicao(rota, response.status, time.perf_counter() - inicio, len(corpo))
+                if rate_limiter:
+                    await rate_limiter.registrar_async(response.status, response.headers.get('Retry-After'))
+                if response.status == 304 and chave:
+                    return json.loads(cache.nao_modificado(chave))
+                if response.status == 200:
+                    if chave:
+                        cache.gravar(chave, response.headers, corpo)
+                    return json.loads(corpo)
+                elif response.status == 429 or response.status >= 500:
+                    # O 429 fica com o limitador (Retry-After e redução da taxa); um 5xx também espera com ele
+                    if response.status >= 500 or rate_limiter is None:
+                        await asyncio.sleep(delay * (2 ** tentativa))
+                    continue
+                else:
+                    logger.warning(f"Status {response.status} para URL: {response.url}")
+                    return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metricas.registrar_requisicao(rota, 'erro', time.perf_counter() - inicio)
+            logger.error(f"Erro na requisição (tentativa {tentativa + 1}): {e}")
+            if tentativa < max_retries - 1:
+                await asyncio.sleep(delay)
+    return None
+
+async def _extrair_despesas_legislatura_async(dep_ids, legislatura_info, max_concurrency, checkpoint=None, concluidas=None, sink=None,
+                                              podar=True):
+    """Agenda cada página (consulta, pagina) numa fila única consumida por max_concurrency workers
+
+    Com sink, cada consulta é gravada (e liberada da memória) assim que sua última página chega.
+    Com podar, as consultas fora do mandato de cada deputado não entram na fila.
+    """
+    consultas = planejar_consultas(dep_ids, anos_legislatura(legislatura_info), concluidas=concluidas)
+    if podar:
+        consultas = podar_por_mandato(consultas, dep_ids, legislatura_info, checkpoint)
+    fila = asyncio.Queue()
+    for consulta in consultas:
+        fila.put_nowait((consulta, 1, None))
+
+    paginas = defaultdict(dict)
+    # Páginas ainda em aberto por consulta; a consulta vai para o checkpoint quando chega a zero sem falhas
+    pendentes = {}
+    com_falha = set()
+    stats = {'requisicoes': 0, 'falhas': 0}
+    # Mesmo limitador do cliente síncrono, compartilhado com outros processos
+    client = get_client()
+    rate_limiter = client.rate_limiter
+    cache = client.cache
+    progresso = tqdm(total=fila.qsize(), desc=f"Legislatura {legislatura_info['id']} (async)", unit="pág")
+
+    def fecha_pagina(consulta, abertas=0):
+        pendentes[consulta] = pendentes.get(consulta, 1) - 1 + abertas
+        if pendentes[consulta] > 0:
+            return
+        client.metricas.registrar_consulta(max(len(paginas[consulta]), 1))
+        despesas = [d for _, dados in sorted(paginas[consulta].items()) for d in dados]
+        anotar_despesas(despesas, consulta.deputado_id, legislatura_info)
+        if checkpoint and consulta not in com_falha:
+            checkpoint.registrar(legislatura_info['id'], consulta.deputado_id, consulta.ano, consulta.meses_cobertos(), despesas)
+        if sink:
+            sink.escrever(despesas)
+            del paginas[consulta]
+
+    async def worker(session):
+        while True:
+            consulta, pagina, href = await fila.get()
+            abertas = 0
+            try:
+                if href:
+                    data = await fazer_requisicao_async(session, href, rate_limiter=rate_limiter, cache=cache)
+                else:
+                    params = {**consulta.params(ITENS_MAXIMO), 'pagina': pagina}
+                    data = await fazer_requisicao_async(session, client.url(consulta.endpoint), params=params, rate_limiter=rate_limiter, cache=cache)
+                stats['requisicoes'] += 1
+
+                if data is None:
+                    stats['falhas'] += 1
+                    com_falha.add(consulta)
+                elif data.get('dados'):
+                    ultima = numero_pagina(link(data, 'last'))
+                    if consulta.mes is None and pagina == 1 and ultima > MAX_PAGINAS:
+                        # Ano grande demais: troca a consulta anual pelas mensais
+                        for mensal in consulta.meses():
+                            fila.put_nowait((mensal, 1, None))
+                        progresso.total += len(consulta.meses())
+                        com_falha.add(consulta)  # a anual não vai para o checkpoint, as mensais sim
+                    else:
+                        paginas[consulta][pagina] = data['dados']
+                        if pagina == 1 and ultima > 1:
+                            # A página 1 informa o total: agenda 2..N de uma vez
+                            for proxima in range(2, ultima + 1):
+                                fila.put_nowait((consulta, proxima, None))
+                            abertas = ultima - 1
+                        elif not ultima and link(data, 'next'):
+                            fila.put_nowait((consulta, pagina + 1, link(data, 'next')))
+                            abertas = 1
+                        progresso.total += abertas
+            except Exception as exc:
+                stats['falhas'] += 1
+                com_falha.add(consulta)
+                logger.error(f"Erro ao processar {consulta} (página {pagina}): {exc}")
+            finally:
+                fecha_pagina(consulta, abertas)
+                progresso.update(1)
+                fila.task_done()
+
+    timeout = aiohttp.ClientTimeout(total=30)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        workers = [asyncio.create_task(worker(session)) for _ in range(max_concurrency)]
+        await fila.join()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    progresso.close()
+
+    # Reordena por deputado/ano/mes/página para que a saída não dependa da ordem de conclusão
+    ordem_deputados = {dep_id: i for i, dep_id in enumerate(dep_ids)}
+    todas_despesas = []
+    for consulta in sorted(paginas, key=lambda c: (ordem_deputados[c.deputado_id], c.ano, c.mes or 0)):
+        for _, despesas in sorted(paginas[consulta].items()):
+            anotar_despesas(despesas, consulta.deputado_id, legislatura_info)
+            todas_despesas.extend(despesas)
+
+    return todas_despesas, stats
+
+def extrair_despesas_legislatura_async(legislatura_info, max_concurrency=20, checkpoint=None, concluidas=None, sink=None,
+                                       podar=True):
+    """Extrai despesas de uma legislatura com asyncio, sob um limite único de concorrência"""
+    deputados = obter_deputados_legislatura(legislatura_info['id'])
+
+    if not deputados:
+        logger.warning(f"Nenhum deputado encontrado para legislatura {legislatura_info['id']}")
+        return []
+
+    logger.info(f"Extraindo despesas de {len(deputados)} deputados da legislatura {legislatura_info['id']} com asyncio (concorrência {max_concurrency})")
+    if checkpoint:
+        checkpoint.registrar_plano(legislatura_info['id'], unidades_previstas(deputados, legislatura_info))
+
+    start_time = time.time()
+    todas_despesas, stats = asyncio.run(
+        _extrair_despesas_legislatura_async(deputados, legislatura_info, max_concurrency, checkpoint, concluidas, sink, podar)
+    )
+    elapsed = time.time() - start_time
+
+    rps = stats['requisicoes'] / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        f"Legislatura {legislatura_info['id']}: {stats['requisicoes']} requisições em {elapsed:.1f}s "
+        f"({rps:.1f} req/s, {stats['falhas']} falhas)"
+    )
+
+    return todas_despesas
+
+MODOS_EXTRACAO = {
+    'threads': lambda leg, max_workers, **kw: extrair_despesas_legislatura_multithread(leg, max_workers=max_workers, **kw),
+    'async': lambda leg, max_workers, **kw: extrair_despesas_legislatura_async(leg, max_concurrency=max_workers, **kw),
+}
+
+def unidades_concluidas(checkpoint, legislatura_id):
+    """Unidades do checkpoint que o --resume pode pular; o mês corrente é sempre baixado de novo"""
+    agora = datetime.now()
+    return {u for u in checkpoint.concluidas(legislatura_id) if (u[1], u[2]) < (agora.year, agora.month)}
+
+def pipeline_completo(max_workers=5, modo='threads', resume=False, checkpoint_path=CHECKPOINT_PADRAO,
+                      max_linhas_buffer=MAX_LINHAS_BUFFER, dataset=DATASET_PADRAO, metricas_dir=None, openmetrics=None,
+                      podar=True):
+    """Pipeline completo para extrair todas as despesas desde 2000
+
+    modo: 'threads' (ThreadPoolExecutor por deputado) ou 'async' (asyncio por página).
+    Em modo 'async', max_workers é o limite de requisições simultâneas.
+    Cada unidade (legislatura, deputado, ano, mes) concluída vai para o checkpoint;
+    com resume=True só as que faltam são baixadas. As despesas vão para o dataset
+    particionado (ano=/mes=) em row groups de até max_linhas_buffer linhas, o que
+    limita a memória usada por legislatura. Ao final, as métricas das requisições
+    vão para um relatório JSON em metricas_dir (e em texto OpenMetrics, se pedido).
+    Com podar, os anos/meses fora do mandato de cada deputado não são consultados.
+    """
+    extrair = MODOS_EXTRACAO[modo]
+    # Uma conexão por thread (cada deputado busca até PAGINAS_SIMULTANEAS páginas em paralelo)
+    client = get_client(pool_maxsize=max(max_workers * PAGINAS_SIMULTANEAS, 10))
+    checkpoint = CheckpointStore(checkpoint_path)
+    # Unidades (deputado, ano, mes) iguais às já gravadas no dataset são puladas
+    manifesto = Manifesto(dataset)
+    # e, nas alteradas, as despesas idênticas às já gravadas
+    indice = IndiceDespesas(indice_do_dataset(dataset))
+
     legislaturas = obter_todas_legislaturas()
 
     if not legislaturas:
@@ -154,29 +390,110 @@ def pipeline_completo(max_workers=5):
 
     logger.info(f"Iniciando extração para {len(legislaturas)} legislaturas")
 
-    os.makedirs("../data/despesas/parquet", exist_ok=True)
-
     for leg in legislaturas:
         logger.info(f"Processando legislatura {leg['id']} ({leg['anoInicio']}-{leg['anoFim']})")
 
-        arquivo_parquet = f"../data/despesas/parquet/despesas-{leg['id']}.parquet"
-        if os.path.exists(arquivo_parquet):
+        if checkpoint.finalizada(leg['id']):
             logger.info(f"Legislatura {leg['id']} já processada, pulando...")
             continue
 
+        if resume:
+            concluidas = unidades_concluidas(checkpoint, leg['id'])
+            logger.info(f"Legislatura {leg['id']}: retomando, {len(concluidas)} unidades já concluídas")
+        else:
+            checkpoint.limpar(leg['id'])
+            concluidas = set()
+
         start_time = time.time()
-        despesas = extrair_despesas_legislatura_multithread(leg, max_workers=max_workers)
+        with DatasetSink(dataset, origem=f"legislatura{leg['id']}", max_linhas=max_linhas_buffer,
+                         manifesto=manifesto, indice=indice) as sink:
+            # Primeiro o que já estava no checkpoint (unidade a unidade), depois cada deputado à medida que termina
+            gravadas = checkpoint.carregar(leg['id'], unidades=concluidas)
+            for _, unidade in groupby(gravadas, key=lambda d: (d['deputado_id'], d['ano'], d['mes'])):
+                sink.escrever(list(unidade))
+            extrair(leg, max_workers, checkpoint=checkpoint, concluidas=concluidas, sink=sink, podar=podar)
+
+            feitas, previstas = checkpoint.progresso(leg['id'])
+            if feitas < previstas:
+                sink.descartar()
+                logger.warning(
+                    f"Legislatura {leg['id']}: {previstas - feitas} de {previstas} unidades pendentes; "
+                    f"rode novamente com --resume para completar"
+                )
+                continue
         end_time = time.time()
 
-        if despesas:
-            df_despesas = pd.DataFrame(despesas)
-            logger.info(f"Legislatura {leg['id']}: {len(df_despesas)} despesas coletadas em {end_time - start_time:.1f}s")
-            df_despesas.to_parquet(arquivo_parquet, index=False)
-            logger.info(f"Dados salvos em {arquivo_parquet}")
+        if sink.linhas:
+            logger.info(f"Legislatura {leg['id']}: {sink.linhas} despesas coletadas em {end_time - start_time:.1f}s")
+            checkpoint.finalizar(leg['id'], dataset)
+            logger.info(f"Dados salvos em {dataset}")
         else:
             logger.warning(f"Nenhuma despesa encontrada para legislatura {leg['id']}")
 
+    client.log_estatisticas()
+    get_metadados().log_estatisticas()
+    manifesto.log_estatisticas()
+    indice.log_estatisticas()
+    client.metricas.exportar(f"despesas_v2-{modo}", metricas_dir, openmetrics)
     logger.info("Pipeline completo finalizado!")
 
+def status_checkpoint(checkpoint_path=CHECKPOINT_PADRAO):
+    """Relatório de conclusão por legislatura a partir do checkpoint"""
+    for item in CheckpointStore(checkpoint_path).status():
+        situacao = f"finalizada em {item['finalizada_em']}" if item['finalizada_em'] else "em aberto"
+        logger.info(
+            f"Legislatura {item['legislatura']}: {item['unidades_concluidas']}/{item['unidades_previstas']} "
+            f"unidades ({item['percentual']:.1%}), {item['linhas']} despesas, {situacao}"
+        )
+
+def planejar_pipeline(dataset=DATASET_PADRAO, podar=True):
+    """Dry-run: mostra quantas requisições de despesas o planner fará por legislatura,
+    comparado à abordagem mês a mês. Só consulta legislaturas e deputados (e, com
+    podar, os deputados em exercício em cada mês)."""
+    for leg in obter_todas_legislaturas():
+        deputados = obter_deputados_legislatura(leg['id'])
+        # Uma carga anterior da legislatura dá a contagem real de linhas por mês
+        linhas = linhas_do_dataset(dataset, leg['id'])
+        ativos = ativos_legislatura(deputados, leg) if podar else None
+
+        resumo = resumo_plano(deputados, anos_legislatura(leg), linhas, ativos=ativos)
+        logger.info(
+            f"Legislatura {leg['id']}: {resumo['deputados']} deputados, {resumo['consultas']} consultas "
+            f"({resumo['consultas_mensais']} mensais, {resumo['consultas_podadas']} podadas pelo mandato), "
+            f"{resumo['requisicoes_planejadas']} requisições planejadas "
+            f"vs. {resumo['requisicoes_atuais']} mês a mês ({resumo['reducao']:.0%} a menos, estimativa: {resumo['estimativa']})"
+        )
+    get_metadados().log_estatisticas()
+
 if __name__ == "__main__":
-    pipeline_completo(max_workers=5)
+    parser = argparse.ArgumentParser(description="Extrai as despesas de todas as legislaturas desde 2000")
+    parser.add_argument('--modo', choices=sorted(MODOS_EXTRACAO), default='threads')
+    parser.add_argument('--max-workers', type=int, default=5,
+                        help="threads por legislatura (modo threads) ou requisições simultâneas (modo async)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="só mostra o plano de requisições, sem baixar despesas")
+    parser.add_argument('--resume', action='store_true',
+                        help="retoma a extração a partir do checkpoint, baixando só as unidades que faltam")
+    parser.add_argument('--status', action='store_true',
+                        help="mostra a conclusão de cada legislatura no checkpoint e sai")
+    parser.add_argument('--sem-poda', action='store_true',
+                        help="consulta todos os anos da legislatura, mesmo fora do mandato de cada deputado")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PADRAO)
+    parser.add_argument('--dataset', default=DATASET_PADRAO,
+                        help="diretório ou URI (s3://...) do dataset de despesas particionado por ano/mês")
+    parser.add_argument('--max-linhas-buffer', type=int, default=MAX_LINHAS_BUFFER,
+                        help="despesas mantidas em memória antes de gravar um row group no Parquet")
+    parser.add_argument('--metricas', help="diretório do relatório de métricas das requisições (padrão: CAMARA_METRICAS_DIR)")
+    parser.add_argument('--openmetrics', action='store_true', default=None,
+                        help="grava também as métricas no formato texto do OpenMetrics (.prom)")
+    args = parser.parse_args()
+
+    if args.status:
+        status_checkpoint(args.checkpoint)
+    elif args.dry_run:
+        planejar_pipeline(args.dataset, podar=not args.sem_poda)
+    else:
+        pipeline_completo(max_workers=args.max_workers, modo=args.modo, resume=args.resume,
+                          checkpoint_path=args.checkpoint, max_linhas_buffer=args.max_linhas_buffer,
+                          dataset=args.dataset, metricas_dir=args.metricas, openmetrics=args.openmetrics,
+                          podar=not args.sem_poda)
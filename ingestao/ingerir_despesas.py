@@ -0,0 +1,298 @@
+"""Linha de comando da ingestão de despesas.
+
+Modos (o que baixar):
+    full          todas as legislaturas desde 2000 (LEGISLATURAS de despesas.py)
+    incremental   os últimos --meses meses da legislatura atual
+    legislatura   as legislaturas de --legislaturas
+    deputados     só os deputados de --ids (na legislatura atual ou em --legislaturas)
+    periodo       os meses de --inicio a --fim (AAAA-MM), em todas as legislaturas do período
+    arquivo       os arquivos anuais da Câmara em --arquivos (Ano-<ano>.csv.zip ou .json.zip),
+                  sem a API, conferindo --amostra unidades contra ela no fim
+
+Subcomandos:
+    executar (run)   baixa e grava no dataset, com o escalonador de despesas.py
+    planejar (plan)  mostra unidades, requisições estimadas e o tempo esperado
+                     na taxa configurada, sem nenhuma requisição à API (usa o
+                     cache de metadados, mesmo vencido, e estima o que faltar)
+
+Uso:
+    python ingerir_despesas.py plan full --taxa 20
+    python ingerir_despesas.py run incremental --meses 2 --saida s3://bucket/camara/despesas/dataset
+    python ingerir_despesas.py run periodo --inicio 2024-01 --fim 2024-06 --formato ndjson
+    python ingerir_despesas.py run arquivo --arquivos Ano-2023.csv.zip Ano-2024.csv.zip --amostra 50
+"""
+import os
+import sys
+import glob
+import json
+import math
+import logging
+import argparse
+import zipfile
+from datetime import datetime
+
+# Código compartilhado com as DAGs (airflow/include)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'airflow'))
+from include.camara.arquivo_anual import AMOSTRA_PADRAO, ingerir_arquivo_anual, reconciliar
+from include.camara.client import get_client
+from include.camara.dataset import DATASET_PADRAO, FORMATOS, DatasetSink
+from include.camara.dedup import IndiceDespesas, indice_do_dataset
+from include.camara.mandatos import meses_periodo
+from include.camara.metadados import CACHE_PADRAO, MetadadosCache, get_metadados
+from include.camara.metricas import DIRETORIO_PADRAO as METRICAS_PADRAO
+from include.camara.planner import ITENS_MAXIMO, LINHAS_MES_PADRAO, estimar_requisicoes_planejadas, linhas_do_dataset
+from include.camara.ratelimit import limitador_padrao
+from include.camara.sink import MAX_LINHAS_BUFFER
+
+from despesas import LEGISLATURAS, THREADS_POR_PROCESSO, Unidade, montar_unidades, processar_unidades
+
+logger = logging.getLogger(__name__)
+
+MODOS = ('full', 'incremental', 'legislatura', 'deputados', 'periodo', 'arquivo')
+VAGAS = 513
+LATENCIA_PADRAO = 0.3
+PAGINAS_LISTA = math.ceil(VAGAS / ITENS_MAXIMO)
+
+
+def datas_legislatura(legislatura):
+    """(dataInicio, dataFim) pelo calendário fixo das legislaturas (posse em 1º de fevereiro)."""
+    inicio = 1999 + 4 * (legislatura - 51)
+    return f"{inicio}-02-01", f"{inicio + 4}-01-31"
+
+
+def legislatura_em(ano, mes):
+    return 51 + ((ano if mes >= 2 else ano - 1) - 1999) // 4
+
+
+def _mes(valor):
+    try:
+        data = datetime.strptime(valor, '%Y-%m')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"mês inválido: {valor!r} (use AAAA-MM)")
+    return data.year, data.month
+
+
+def resolver_modo(args, metadados):
+    """(legislaturas, deputados, periodo) do modo pedido; deputados/periodo None = todos."""
+    agora = datetime.now()
+    legislaturas = metadados.legislaturas()
+    atual = legislaturas[0]['id'] if legislaturas else legislatura_em(agora.year, agora.month)
+
+    if args.modo == 'full':
+        return list(args.legislaturas or LEGISLATURAS), None, None
+    if args.modo == 'legislatura':
+        return list(args.legislaturas), None, None
+    if args.modo == 'deputados':
+        return list(args.legislaturas or [atual]), set(args.ids), None
+
+    if args.modo == 'incremental':
+        indice = agora.year * 12 + agora.month - args.meses
+        inicio, fim = (indice // 12, indice % 12 + 1), (agora.year, agora.month)
+    else:
+        inicio, fim = args.inicio, args.fim
+    periodo = set(meses_periodo(f"{inicio[0]}-{inicio[1]:02d}-01", f"{fim[0]}-{fim[1]:02d}-01", agora))
+    legislaturas = sorted({legislatura_em(ano, mes) for ano, mes in periodo}, reverse=True)
+    return legislaturas, args.ids and set(args.ids), periodo
+
+
+def _configurar_taxa(taxa):
+    """--taxa vira a taxa inicial e o teto do limitador compartilhado (herdados pelos processos filhos)."""
+    if taxa:
+        os.environ['CAMARA_RATE_LIMIT'] = str(taxa)
+        os.environ['CAMARA_RATE_LIMIT_MAX'] = str(taxa)
+
+
+def executar_arquivos(args):
+    """Grava cada arquivo anual no dataset (só as despesas que ainda não estão nele)
+    e confere uma amostra contra a API; devolve o total de divergências."""
+    indice = IndiceDespesas(indice_do_dataset(args.saida))
+    divergencias = 0
+    for caminho in args.arquivos:
+        origem = 'anual' + ''.join(c for c in os.path.basename(caminho) if c.isdigit())
+        with DatasetSink(args.saida, origem=origem, max_linhas=args.max_linhas_buffer, indice=indice,
+                         formato=args.formato) as sink:
+            resumo = ingerir_arquivo_anual(caminho, sink)
+        logger.info(f"{caminho}: {sink.linhas} despesas gravadas em {len(sink.arquivos)} partições")
+        if args.amostra:
+            divergencias += len(reconciliar(resumo, get_client(), amostra=args.amostra))
+    indice.log_estatisticas()
+    indice.close()
+    if args.amostra:
+        get_client().metricas.exportar('arquivo_anual')
+    return divergencias
+
+
+def executar(args):
+    _configurar_taxa(args.taxa)
+    if args.modo == 'arquivo':
+        divergencias = executar_arquivos(args)
+        if divergencias and args.falhar_na_divergencia:
+            raise SystemExit(1)
+        return
+    legislaturas, deputados, periodo = resolver_modo(args, get_metadados())
+    unidades = montar_unidades(legislaturas, deputados, periodo, podar=not args.sem_poda)
+    if not unidades:
+        logger.error("Nenhuma unidade a baixar")
+        return
+    logger.info(f"Modo {args.modo}: {len(unidades)} unidades em {len({u.legislatura for u in unidades})} legislaturas")
+    processar_unidades(unidades, processos=args.processos, threads=args.threads,
+                       max_linhas_buffer=args.max_linhas_buffer, dataset=args.saida, formato=args.formato)
+
+
+def _latencia_observada(diretorio=METRICAS_PADRAO):
+    """Latência média do relatório de métricas mais recente, se houver."""
+    relatorios = sorted(glob.glob(os.path.join(diretorio, '*.json')), key=os.path.getmtime)
+    for caminho in reversed(relatorios):
+        with open(caminho) as f:
+            latencia = json.load(f).get('latencia_s', {})
+        if latencia.get('observacoes'):
+            return latencia['media']
+    return None
+
+
+def _unidades_estimadas(legislatura, deputados, periodo):
+    """Unidades de uma legislatura fora do cache: VAGAS deputados (ou os de --ids), sem poda."""
+    meses = meses_periodo(*datas_legislatura(legislatura))
+    if periodo is not None:
+        meses = [mes for mes in meses if mes in periodo]
+    anos = tuple(sorted({ano for ano, _ in meses}))
+    dep_ids = sorted(deputados) if deputados is not None else range(-VAGAS, 0)
+    return [Unidade(legislatura, dep_id, anos, None, frozenset(meses) if periodo is not None else None)
+            for dep_id in dep_ids] if meses else []
+
+
+def _vazao(args):
+    """(req/s esperadas, taxa, concorrência, latência): limitado pela taxa ou, se
+    ela for alta, pela concorrência sobre a latência."""
+    concorrencia = (args.processos or os.cpu_count()) * args.threads
+    taxa = args.taxa or limitador_padrao().taxa_atual()
+    latencia = args.latencia or _latencia_observada() or LATENCIA_PADRAO
+    return min(taxa, concorrencia / latencia), taxa, concorrencia, latencia
+
+
+def planejar_arquivos(args):
+    """Tamanho dos arquivos anuais e as requisições da reconciliação (uma por unidade da amostra)."""
+    compactado = descompactado = 0
+    for caminho in args.arquivos:
+        with zipfile.ZipFile(caminho) as arquivo:
+            tamanho = sum(info.file_size for info in arquivo.infolist())
+        compactado += os.path.getsize(caminho)
+        descompactado += tamanho
+        logger.info(f"{caminho}: {os.path.getsize(caminho) / 1024 / 1024:.1f} MB compactado, "
+                    f"{tamanho / 1024 / 1024:.1f} MB de dados (lidos em streaming)")
+    requisicoes = args.amostra * len(args.arquivos)
+    vazao = _vazao(args)[0]
+    logger.info(f"Plano (arquivo): {len(args.arquivos)} arquivos, 0 requisições de carga e {requisicoes} "
+                f"de reconciliação (~{requisicoes / vazao:.0f}s)")
+    return {'arquivos': len(args.arquivos), 'bytes': compactado, 'bytes_descompactados': descompactado,
+            'requisicoes': requisicoes, 'segundos': requisicoes / vazao}
+
+
+def planejar(args):
+    """Estimativa da execução sem requisições: unidades, consultas e requisições
+    (despesas e metadados que faltam no cache) e o tempo na taxa configurada."""
+    if args.modo == 'arquivo':
+        return planejar_arquivos(args)
+    metadados = MetadadosCache(CACHE_PADRAO, offline=True)
+    legislaturas, deputados, periodo = resolver_modo(args, metadados)
+    vazao, taxa, concorrencia, latencia = _vazao(args)
+
+    total = {'unidades': 0, 'consultas': 0, 'podadas': 0, 'requisicoes': 0}
+    listas_estimadas = 0
+    for legislatura in legislaturas:
+        estimada = metadados.legislatura(legislatura) is None
+        if estimada:
+            unidades = _unidades_estimadas(legislatura, deputados, periodo)
+            # A execução pedirá a lista de deputados e, com poda, a dos em exercício em cada ano
+            listas_estimadas += 1 + (len(unidades[0].anos) if unidades and not args.sem_poda else 0)
+        else:
+            unidades = montar_unidades([legislatura], deputados, periodo, podar=not args.sem_poda, metadados=metadados)
+        if not unidades:
+            continue
+        # Uma carga anterior da legislatura no dataset dá a contagem real de linhas por mês
+        linhas = linhas_do_dataset(args.saida, legislatura) if args.formato == 'parquet' else None
+        consultas, podadas = [], 0
+        for unidade in unidades:
+            mantidas, podadas_unidade = unidade.consultas()
+            consultas += mantidas
+            podadas += len(podadas_unidade)
+        requisicoes = estimar_requisicoes_planejadas(consultas, linhas)
+        logger.info(
+            f"Legislatura {legislatura}: {len(unidades)} unidades{' (estimadas, sem cache de metadados)' if estimada else ''}, "
+            f"{len(consultas)} consultas ({podadas} podadas pelo mandato), ~{requisicoes} requisições "
+            f"(linhas: {'carga anterior' if linhas is not None else f'{LINHAS_MES_PADRAO}/mês'})"
+        )
+        total['unidades'] += len(unidades)
+        total['consultas'] += len(consultas)
+        total['podadas'] += podadas
+        total['requisicoes'] += requisicoes
+
+    # Cada lista que falta no cache de metadados será pedida (e paginada) pela execução
+    metadados_faltando = (len(metadados.faltando) + listas_estimadas) * PAGINAS_LISTA
+    requisicoes = total['requisicoes'] + metadados_faltando
+    segundos = requisicoes / vazao if vazao else 0.0
+    logger.info(
+        f"Plano ({args.modo}): {total['unidades']} unidades, {total['consultas']} consultas "
+        f"({total['podadas']} podadas), ~{requisicoes} requisições ({metadados_faltando} de metadados fora do cache); "
+        f"a {vazao:.1f} req/s (taxa {taxa:.1f} req/s, {concorrencia} threads, latência {latencia:.2f}s): "
+        f"~{segundos / 60:.1f} min"
+    )
+    return {**total, 'requisicoes': requisicoes, 'requisicoes_metadados': metadados_faltando,
+            'vazao': vazao, 'segundos': segundos}
+
+
+def _parser():
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument('modo', choices=MODOS)
+    comum.add_argument('--legislaturas', type=int, nargs='+',
+                       help="legislaturas (modo legislatura; em full e deputados, restringe o padrão)")
+    comum.add_argument('--ids', type=int, nargs='+', help="ids dos deputados (modo deputados; filtra os demais)")
+    comum.add_argument('--inicio', type=_mes, help="primeiro mês do modo periodo (AAAA-MM)")
+    comum.add_argument('--fim', type=_mes, help="último mês do modo periodo (AAAA-MM)")
+    comum.add_argument('--meses', type=int, default=2, help="meses para trás no modo incremental, com o atual")
+    comum.add_argument('--processos', type=int, help="processos trabalhadores (padrão: núcleos da máquina)")
+    comum.add_argument('--threads', type=int, default=THREADS_POR_PROCESSO, help="threads por processo")
+    comum.add_argument('--taxa', type=float, help="teto de requisições por segundo (padrão: taxa aprendida)")
+    comum.add_argument('--formato', choices=sorted(FORMATOS), default='parquet')
+    comum.add_argument('--saida', default=DATASET_PADRAO,
+                       help="diretório ou URI (s3://...) do dataset de despesas particionado por ano/mês")
+    comum.add_argument('--max-linhas-buffer', type=int, default=MAX_LINHAS_BUFFER,
+                       help="despesas mantidas em memória por legislatura antes de gravar")
+    comum.add_argument('--sem-poda', action='store_true',
+                       help="consulta todos os meses, mesmo fora do mandato de cada deputado")
+    comum.add_argument('--arquivos', nargs='+', help="arquivos anuais da Câmara (modo arquivo)")
+    comum.add_argument('--amostra', type=int, default=AMOSTRA_PADRAO,
+                       help="unidades (deputado, ano, mes) conferidas contra a API no modo arquivo (0 desliga)")
+    comum.add_argument('--falhar-na-divergencia', action='store_true',
+                       help="no modo arquivo, termina com erro se a amostra divergir da API")
+
+    parser = argparse.ArgumentParser(description="Ingestão de despesas da API da Câmara")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    subparsers.add_parser('executar', aliases=['run'], parents=[comum], help="baixa e grava as despesas")
+    plano = subparsers.add_parser('planejar', aliases=['plan'], parents=[comum],
+                                  help="estima unidades, requisições e tempo, sem requisições")
+    plano.add_argument('--latencia', type=float,
+                       help="latência média por requisição em segundos (padrão: último relatório de métricas)")
+    return parser
+
+
+def main(argv=None):
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if args.modo == 'legislatura' and not args.legislaturas:
+        parser.error("o modo legislatura precisa de --legislaturas")
+    if args.modo == 'deputados' and not args.ids:
+        parser.error("o modo deputados precisa de --ids")
+    if args.modo == 'periodo' and not (args.inicio and args.fim and args.inicio <= args.fim):
+        parser.error("o modo periodo precisa de --inicio e --fim (AAAA-MM), com inicio <= fim")
+    if args.modo == 'arquivo' and not args.arquivos:
+        parser.error("o modo arquivo precisa de --arquivos")
+
+    if args.comando in ('planejar', 'plan'):
+        return planejar(args)
+    return executar(args)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,469 @@
+"""Servidor local que imita a API de Dados Abertos da Câmara, para testes e benchmarks.
+
+Serve /legislaturas, /deputados, /deputados/{id}/historico e
+/deputados/{id}/despesas com a mesma paginação (itens, pagina e links
+self/next/first/last), a mesma ordenação das despesas (ordenarPor e ordem) e
+o mesmo teto de itens por página da API real. Os
+dados vêm de fixtures: arquivos JSON num diretório (legislaturas.json,
+deputados.json, despesas/<id>.json) ou, na falta deles, dados sintéticos
+determinísticos, com uma fração de suplentes que só estiveram em exercício
+em parte da legislatura (filtro dataInicio/dataFim de /deputados). Latência, tamanho de página, tamanho das despesas e a
+taxa de respostas 429 são configuráveis; GET /_stats devolve os contadores.
+`Fixtures.gravar_arquivo_anual` gera o arquivo anual de despesas
+(Ano-<ano>.csv.zip ou .json.zip, no formato da Câmara) com os mesmos dados.
+
+Uso:
+    python mock_camara.py --porta 8800 --latencia 0.05 --taxa-429 0.02
+    python mock_camara.py --arquivo-anual 2024 --destino /tmp/cotas
+    CAMARA_API_BASE_URL=http://localhost:8800 python despesas_v2.py
+"""
+import os
+import io
+import csv
+import json
+import random
+import hashlib
+import logging
+import argparse
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import date
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from comparar_schema import TIPOS_DESPESA, TIPOS_DOCUMENTO
+
+logger = logging.getLogger(__name__)
+
+LEGISLATURAS = {
+    57: ('2023-02-01', '2027-01-31'),
+    56: ('2019-02-01', '2023-01-31'),
+    55: ('2015-02-01', '2019-01-31'),
+    54: ('2011-02-01', '2015-01-31'),
+    53: ('2007-02-01', '2011-01-31'),
+    52: ('2003-02-01', '2007-01-31'),
+    51: ('1999-02-01', '2003-01-31'),
+}
+PARTIDOS = ['PL', 'PT', 'UNIÃO', 'PP', 'PSD', 'MDB', 'REPUBLICANOS', 'PDT', 'PSB', 'PSOL']
+UFS = ['SP', 'MG', 'RJ', 'BA', 'RS', 'PR', 'PE', 'CE', 'PA', 'MA']
+# Códigos de tipo de documento da Câmara (indTipoDocumento do arquivo anual)
+COD_TIPO_DOCUMENTO = {"Nota Fiscal": 0, "Recibos/Outros": 1, "Documento de Despesa no Exterior": 2,
+                      "Nota Fiscal Eletrônica": 4}
+COLUNAS_ARQUIVO_ANUAL = [
+    'txNomeParlamentar', 'cpf', 'ideCadastro', 'nuCarteiraParlamentar', 'nuLegislatura', 'sgUF', 'sgPartido',
+    'codLegislatura', 'numSubCota', 'txtDescricao', 'numEspecificacaoSubCota', 'txtDescricaoEspecificacao',
+    'txtFornecedor', 'txtCNPJCPF', 'txtNumero', 'indTipoDocumento', 'datEmissao', 'vlrDocumento', 'vlrGlosa',
+    'vlrLiquido', 'numMes', 'numAno', 'numParcela', 'txtPassageiro', 'txtTrecho', 'numLote', 'numRessarcimento',
+    'datPagamentoRestituicao', 'vlrRestituicao', 'nuDeputadoId', 'ideDocumento', 'urlDocumento',
+]
+
+
+class Fixtures:
+    """Dados servidos pelo mock: de um diretório de JSON ou sintéticos.
+
+    legislaturas: ids servidos (sintético); deputados: deputados por legislatura;
+    despesas_por_mes: média de despesas por deputado e mês; preenchimento: bytes
+    extras por despesa (no fim do urlDocumento), para simular payloads maiores;
+    suplentes: fração dos deputados em exercício só numa janela de 6 a 24 meses;
+    novas: fração dos meses (deputado, ano, mes) com uma despesa a mais, para
+    simular despesas que chegaram entre duas execuções (p.ex. da incremental).
+    """
+
+    def __init__(self, diretorio=None, legislaturas=(57,), deputados=20, despesas_por_mes=30,
+                 preenchimento=0, seed=42, suplentes=0.0, novas=0.0):
+        self.diretorio = diretorio
+        self.ids_legislaturas = sorted(legislaturas, reverse=True)
+        self.n_deputados = deputados
+        self.despesas_por_mes = despesas_por_mes
+        self.preenchimento = preenchimento
+        self.seed = seed
+        self.suplentes = suplentes
+        self.novas = novas
+
+    def _arquivo(self, *partes):
+        if not self.diretorio:
+            return None
+        caminho = os.path.join(self.diretorio, *partes)
+        if not os.path.exists(caminho):
+            return None
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+
+    @lru_cache(maxsize=None)
+    def legislaturas(self):
+        dados = self._arquivo('legislaturas.json')
+        if dados is not None:
+            return dados
+        return [
+            {'id': leg, 'uri': f"/legislaturas/{leg}", 'dataInicio': LEGISLATURAS[leg][0],
+             'dataFim': LEGISLATURAS[leg][1]}
+            for leg in self.ids_legislaturas
+        ]
+
+    def legislatura(self, legislatura_id):
+        return next((leg for leg in self.legislaturas() if leg['id'] == legislatura_id), None)
+
+    @lru_cache(maxsize=None)
+    def deputados(self, legislatura_id):
+        dados = self._arquivo('deputados.json')
+        if dados is not None:
+            return [dep for dep in dados if dep.get('idLegislatura') == legislatura_id]
+        if self.legislatura(legislatura_id) is None:
+            return []
+        return [
+            {'id': legislatura_id * 10_000 + i, 'nome': f"DEPUTADO {legislatura_id}-{i:03d}",
+             'siglaPartido': PARTIDOS[i % len(PARTIDOS)], 'siglaUf': UFS[i % len(UFS)],
+             'idLegislatura': legislatura_id, 'uri': f"/deputados/{legislatura_id * 10_000 + i}"}
+            for i in range(self.n_deputados)
+        ]
+
+    def legislatura_do_deputado(self, deputado_id):
+        for leg in self.legislaturas():
+            if any(dep['id'] == deputado_id for dep in self.deputados(leg['id'])):
+                return leg
+        return None
+
+    @lru_cache(maxsize=None)
+    def mandato(self, deputado_id):
+        """('AAAA-MM', 'AAAA-MM') do primeiro e do último mês em exercício na legislatura."""
+        leg = self.legislatura_do_deputado(deputado_id)
+        if leg is None:
+            return None
+        inicio, fim = leg['dataInicio'][:7], leg['dataFim'][:7]
+        titular = deputado_id % 10_000 < self.n_deputados * (1 - self.suplentes)
+        if titular or self._arquivo('deputados.json') is not None:
+            return inicio, fim
+        rnd = random.Random(f"{self.seed}-mandato-{deputado_id}")
+        meses = [f"{ano}-{mes:02d}" for ano in range(int(inicio[:4]), int(fim[:4]) + 1) for mes in range(1, 13)
+                 if inicio <= f"{ano}-{mes:02d}" <= fim]
+        duracao = rnd.randint(6, 24)
+        primeiro = rnd.randrange(len(meses) - duracao + 1)
+        return meses[primeiro], meses[primeiro + duracao - 1]
+
+    def em_exercicio(self, deputado_id, data_inicio=None, data_fim=None):
+        """Se o mandato do deputado cruza o período (datas 'AAAA-MM-DD', abertas se None)."""
+        mandato = self.mandato(deputado_id)
+        if mandato is None:
+            return False
+        return (data_fim is None or mandato[0] <= data_fim[:7]) and (data_inicio is None or data_inicio[:7] <= mandato[1])
+
+    def historico(self, deputado_id):
+        leg = self.legislatura_do_deputado(deputado_id)
+        if leg is None:
+            return []
+        inicio, fim = self.mandato(deputado_id)
+        titular = (inicio, fim) == (leg['dataInicio'][:7], leg['dataFim'][:7])
+        eventos = [{'id': deputado_id, 'idLegislatura': leg['id'], 'dataHora': f"{inicio}-01T00:00",
+                    'situacao': 'Exercício', 'condicaoEleitoral': 'Titular' if titular else 'Suplente',
+                    'descricaoStatus': 'Posse' if titular else 'Reassunção'}]
+        if not titular:
+            eventos.append({'id': deputado_id, 'idLegislatura': leg['id'], 'dataHora': f"{fim}-28T00:00",
+                            'situacao': 'Suplência', 'condicaoEleitoral': 'Suplente',
+                            'descricaoStatus': 'Afastamento - Retorno do titular'})
+        return eventos
+
+    @lru_cache(maxsize=4096)
+    def despesas(self, deputado_id, ano):
+        """Despesas do deputado no ano, ordenadas por mês (dentro do mandato e até o mês atual)."""
+        dados = self._arquivo('despesas', f"{deputado_id}.json")
+        if dados is not None:
+            return [d for d in dados if d['ano'] == ano]
+        leg = self.legislatura_do_deputado(deputado_id)
+        if leg is None:
+            return []
+        inicio, fim = self.mandato(deputado_id)
+        fim = min(fim, date.today().strftime('%Y-%m'))
+        rnd = random.Random(f"{self.seed}-{deputado_id}-{ano}")
+        despesas = []
+        for mes in range(1, 13):
+            if not inicio <= f"{ano}-{mes:02d}" <= fim:
+                continue
+            n = rnd.randint(self.despesas_por_mes // 2, self.despesas_por_mes * 3 // 2)
+            indices = [(i, rnd) for i in range(n)]
+            # Despesa a mais num sorteio próprio, para não mudar as demais nem os outros meses
+            extra = random.Random(f"{self.seed}-novas-{deputado_id}-{ano}-{mes}")
+            if self.novas and extra.random() < self.novas:
+                indices.append((n, extra))
+            for i, sorteio in indices:
+                cod = int(hashlib.blake2b(f"{deputado_id}-{ano}-{mes}-{i}".encode(), digest_size=4).hexdigest(), 16)
+                valor = round(sorteio.uniform(10, 20000), 2)
+                tipo_documento = sorteio.randrange(len(TIPOS_DOCUMENTO))
+                despesa = {
+                    'ano': ano, 'mes': mes,
+                    'tipoDespesa': sorteio.choice(TIPOS_DESPESA),
+                    'codDocumento': cod,
+                    'tipoDocumento': TIPOS_DOCUMENTO[tipo_documento],
+                    'codTipoDocumento': COD_TIPO_DOCUMENTO[TIPOS_DOCUMENTO[tipo_documento]],
+                    'dataDocumento': f"{ano}-{mes:02d}-{sorteio.randrange(1, 29):02d}T00:00:00",
+                    'numDocumento': str(sorteio.randrange(10**6)),
+                    'valorDocumento': valor,
+                    'urlDocumento': f"https://www.camara.leg.br/cota-parlamentar/documentos/publ/{deputado_id}/{ano}/{cod}.pdf",
+                    'nomeFornecedor': f"FORNECEDOR {sorteio.randrange(5000)} LTDA",
+                    'cnpjCpfFornecedor': str(sorteio.randrange(10**13, 10**14)),
+                    'valorLiquido': valor,
+                    'valorGlosa': 0.0,
+                    'numRessarcimento': "",
+                    'codLote': 1_800_000 + cod // 7,
+                    'parcela': 0,
+                }
+                if self.preenchimento:
+                    despesa['urlDocumento'] += '?v=' + 'x' * self.preenchimento
+                despesas.append(despesa)
+        return despesas
+
+    def linhas_arquivo_anual(self, ano):
+        """Despesas de todos os deputados no ano, com as colunas do arquivo anual da Câmara."""
+        for leg in self.legislaturas():
+            for dep in self.deputados(leg['id']):
+                for d in self.despesas(dep['id'], ano):
+                    yield {
+                        'txNomeParlamentar': dep['nome'], 'cpf': '', 'ideCadastro': dep['id'],
+                        'nuCarteiraParlamentar': dep['id'] % 10_000, 'nuLegislatura': leg['dataInicio'][:4],
+                        'sgUF': dep['siglaUf'], 'sgPartido': dep['siglaPartido'], 'codLegislatura': leg['id'],
+                        'numSubCota': '', 'txtDescricao': d['tipoDespesa'], 'numEspecificacaoSubCota': 0,
+                        'txtDescricaoEspecificacao': '', 'txtFornecedor': d['nomeFornecedor'],
+                        'txtCNPJCPF': d['cnpjCpfFornecedor'], 'txtNumero': d['numDocumento'],
+                        'indTipoDocumento': d['codTipoDocumento'], 'datEmissao': d['dataDocumento'],
+                        'vlrDocumento': d['valorDocumento'], 'vlrGlosa': d['valorGlosa'],
+                        'vlrLiquido': d['valorLiquido'], 'numMes': d['mes'], 'numAno': d['ano'],
+                        'numParcela': d['parcela'], 'txtPassageiro': '', 'txtTrecho': '', 'numLote': d['codLote'],
+                        'numRessarcimento': d['numRessarcimento'], 'datPagamentoRestituicao': '',
+                        'vlrRestituicao': '', 'nuDeputadoId': dep['id'] % 10_000, 'ideDocumento': d['codDocumento'],
+                        'urlDocumento': d['urlDocumento'],
+                    }
+
+    def gravar_arquivo_anual(self, ano, destino, formato='csv'):
+        """Grava <destino>/Ano-<ano>.<formato>.zip; devolve o caminho."""
+        os.makedirs(destino, exist_ok=True)
+        caminho = os.path.join(destino, f"Ano-{ano}.{formato}.zip")
+        with zipfile.ZipFile(caminho, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo:
+            with arquivo.open(f"Ano-{ano}.{formato}", 'w') as bruto, \
+                    io.TextIOWrapper(bruto, encoding='utf-8-sig', newline='') as texto:
+                if formato == 'csv':
+                    escritor = csv.DictWriter(texto, COLUNAS_ARQUIVO_ANUAL, delimiter=';', quoting=csv.QUOTE_ALL)
+                    escritor.writeheader()
+                    escritor.writerows(self.linhas_arquivo_anual(ano))
+                else:
+                    texto.write('{"dados": [')
+                    for i, linha in enumerate(self.linhas_arquivo_anual(ano)):
+                        texto.write((',' if i else '') + json.dumps(linha, ensure_ascii=False))
+                    texto.write(']}')
+        return caminho
+
+
+class MockCamara:
+    """Servidor HTTP (em uma thread) com as rotas da API e contadores de requisições.
+
+    latencia/jitter: segundos de espera por resposta; itens_maximo: teto de
+    itens por página (a API real usa 100); taxa_429: fração das requisições
+    respondidas com 429 e Retry-After de retry_after segundos.
+    """
+
+    def __init__(self, fixtures=None, porta=0, latencia=0.0, jitter=0.0, itens_maximo=100, taxa_429=0.0,
+                 retry_after=1, seed=42):
+        self.fixtures = fixtures or Fixtures(seed=seed)
+        self.latencia = latencia
+        self.jitter = jitter
+        self.itens_maximo = itens_maximo
+        self.taxa_429 = taxa_429
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.zerar()
+        self._server = ThreadingHTTPServer(('127.0.0.1', porta), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def zerar(self):
+        with self._lock:
+            self._status = Counter()
+            self._rotas = Counter()
+            self._bytes = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'requisicoes': sum(self._status.values()),
+                'por_status': {str(status): n for status, n in sorted(self._status.items())},
+                'por_rota': dict(sorted(self._rotas.items())),
+                'bytes_enviados': self._bytes,
+            }
+
+    def _registrar(self, rota, status, tamanho):
+        with self._lock:
+            self._status[status] += 1
+            self._rotas[rota] += 1
+            self._bytes += tamanho
+
+    def _sortear_429(self):
+        with self._lock:
+            return self.taxa_429 and self._random.random() < self.taxa_429
+
+    def _pagina(self, caminho, query, dados):
+        """Recorta uma página de `dados` e monta os links como a API."""
+        itens = min(int(query.get('itens', 15)), self.itens_maximo)
+        pagina = max(int(query.get('pagina', 1)), 1)
+        ultima = max(1, -(-len(dados) // itens))
+        parametros = {k: v for k, v in query.items() if k != 'pagina'}
+        parametros['itens'] = itens
+
+        def href(numero):
+            return f"{self.url}{caminho}?{urlencode({**parametros, 'pagina': numero})}"
+
+        links = [{'rel': 'self', 'href': href(pagina)}]
+        if pagina < ultima:
+            links.append({'rel': 'next', 'href': href(pagina + 1)})
+        links += [{'rel': 'first', 'href': href(1)}, {'rel': 'last', 'href': href(ultima)}]
+        return {'dados': dados[(pagina - 1) * itens:pagina * itens], 'links': links}
+
+    def responder(self, caminho, query):
+        """(rota, status, corpo) para um GET; query com um valor por parâmetro."""
+        partes = caminho.strip('/').split('/')
+        fx = self.fixtures
+        if partes == ['legislaturas']:
+            return 'legislaturas', 200, self._pagina(caminho, query, fx.legislaturas())
+        if partes == ['deputados']:
+            if 'idLegislatura' in query:
+                deputados = fx.deputados(int(query['idLegislatura']))
+            else:
+                # Sem legislatura (deputados atuais ou em exercício num período): a mais recente
+                deputados = fx.deputados(fx.legislaturas()[0]['id'])
+            if 'dataInicio' in query or 'dataFim' in query:
+                deputados = [dep for dep in deputados
+                             if fx.em_exercicio(dep['id'], query.get('dataInicio'), query.get('dataFim'))]
+            return 'deputados', 200, self._pagina(caminho, query, deputados)
+        if len(partes) == 3 and partes[0] == 'deputados' and partes[1].isdigit():
+            deputado_id = int(partes[1])
+            if partes[2] == 'historico':
+                return 'historico', 200, {'dados': fx.historico(deputado_id), 'links': []}
+            if partes[2] == 'despesas':
+                if 'ano' in query:
+                    despesas = fx.despesas(deputado_id, int(query['ano']))
+                else:
+                    leg = fx.legislatura_do_deputado(deputado_id)
+                    anos = range(int(leg['dataInicio'][:4]), int(leg['dataFim'][:4]) + 1) if leg else []
+                    despesas = [d for ano in anos for d in fx.despesas(deputado_id, ano)]
+                if 'mes' in query:
+                    despesas = [d for d in despesas if d['mes'] == int(query['mes'])]
+                if 'ordenarPor' in query:
+                    despesas = sorted(despesas, key=lambda d: d[query['ordenarPor']],
+                                      reverse=query.get('ordem', 'ASC').upper() == 'DESC')
+                return 'despesas', 200, self._pagina(caminho, query, despesas)
+        return 'desconhecida', 404, {'status': 404, 'title': 'Recurso não encontrado'}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, formato, *args):
+                logger.debug(formato, *args)
+
+            def _enviar(self, rota, status, corpo=b'', cabecalhos=None):
+                self.send_response(status)
+                for chave, valor in (cabecalhos or {}).items():
+                    self.send_header(chave, valor)
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+                mock._registrar(rota, status, len(corpo))
+
+            def do_GET(self):
+                partes = urlsplit(self.path)
+                if partes.path == '/_stats':
+                    return self._enviar('_stats', 200, json.dumps(mock.estatisticas()).encode(),
+                                        {'Content-Type': 'application/json'})
+
+                espera = mock.latencia + (random.uniform(0, mock.jitter) if mock.jitter else 0)
+                if espera:
+                    time.sleep(espera)
+                if mock._sortear_429():
+                    return self._enviar('429', 429, b'', {'Retry-After': str(mock.retry_after)})
+
+                query = {chave: valores[-1] for chave, valores in parse_qs(partes.query).items()}
+                rota, status, conteudo = mock.responder(partes.path, query)
+                corpo = json.dumps(conteudo, ensure_ascii=False).encode('utf-8')
+                etag = f'"{hashlib.md5(corpo).hexdigest()}"'
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    return self._enviar(rota, 304, b'', {'ETag': etag})
+                self._enviar(rota, status, corpo, {'Content-Type': 'application/json', 'ETag': etag})
+
+        return Handler
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+
+def adicionar_argumentos(parser):
+    """Opções do mock (compartilhadas com o benchmark)."""
+    parser.add_argument('--fixtures', help="diretório com legislaturas.json, deputados.json e despesas/<id>.json")
+    parser.add_argument('--legislaturas', type=int, nargs='+', default=[57])
+    parser.add_argument('--deputados', type=int, default=20, help="deputados por legislatura")
+    parser.add_argument('--despesas-por-mes', type=int, default=30, help="média de despesas por deputado e mês")
+    parser.add_argument('--preenchimento', type=int, default=0, help="bytes extras por despesa")
+    parser.add_argument('--suplentes', type=float, default=0.0,
+                        help="fração dos deputados em exercício só em parte da legislatura")
+    parser.add_argument('--novas', type=float, default=0.0,
+                        help="fração dos meses (deputado, ano, mes) com uma despesa a mais")
+    parser.add_argument('--latencia', type=float, default=0.0, help="segundos por resposta")
+    parser.add_argument('--jitter', type=float, default=0.0, help="segundos aleatórios somados à latência")
+    parser.add_argument('--itens-maximo', type=int, default=100, help="teto de itens por página")
+    parser.add_argument('--taxa-429', type=float, default=0.0, help="fração de respostas 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def criar_fixtures(args):
+    return Fixtures(args.fixtures, args.legislaturas, args.deputados, args.despesas_por_mes,
+                    args.preenchimento, args.seed, args.suplentes, args.novas)
+
+
+def criar_mock(args, porta=0):
+    return MockCamara(criar_fixtures(args), porta=porta, latencia=args.latencia, jitter=args.jitter,
+                      itens_maximo=args.itens_maximo, taxa_429=args.taxa_429, retry_after=args.retry_after,
+                      seed=args.seed)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Mock local da API de Dados Abertos da Câmara")
+    parser.add_argument('--porta', type=int, default=8800)
+    parser.add_argument('--arquivo-anual', type=int, nargs='+', metavar='ANO',
+                        help="só grava os arquivos anuais desses anos (em --destino) e sai")
+    parser.add_argument('--destino', default='.')
+    parser.add_argument('--formato-arquivo', choices=['csv', 'json'], default='csv')
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+
+    if args.arquivo_anual:
+        fixtures = criar_fixtures(args)
+        for ano in args.arquivo_anual:
+            logger.info(f"Arquivo anual gravado em {fixtures.gravar_arquivo_anual(ano, args.destino, args.formato_arquivo)}")
+        raise SystemExit(0)
+
+    mock = criar_mock(args, porta=args.porta)
+    logger.info(f"Mock da API da Câmara em {mock.url} (CAMARA_API_BASE_URL={mock.url})")
+    try:
+        mock._server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info(f"Encerrando: {mock.estatisticas()}")
@@ -21,12 +21,14 @@ CREATE OR REPLACE TABLE raw.despesas (
     tipo_despesa STRING,
     tipo_documento STRING,
     url_documento STRING,
-    valor_documento FLOAT,
-    valor_glosa FLOAT,
-    valor_liquido FLOAT,
+    valor_documento NUMBER(12,2),
+    valor_glosa NUMBER(12,2),
+    valor_liquido NUMBER(12,2),
     num_subcota INT,
     num_especificacao_subcota INT
-);
+)
+-- A carga incremental (carga_despesas) faz MERGE só das partições alteradas
+CLUSTER BY (ano, mes);
 
 INSERT INTO raw.despesas (
     deputado_id, ano, cnpj_cpf_fornecedor, cod_documento, cod_lote, cod_tipo_documento, data_documento,
@@ -49,9 +51,9 @@ SELECT
     $1:txtDescricao::STRING,
     $1:indTipoDocumento::STRING,
     $1:url_documento::STRING,
-    $1:vlrDocumento::FLOAT,
-    $1:vlrGlosa::FLOAT,
-    $1:vlrLiquido::FLOAT,
+    $1:vlrDocumento::NUMBER(12,2),
+    $1:vlrGlosa::NUMBER(12,2),
+    $1:vlrLiquido::NUMBER(12,2),
     $1:numSubCota::INT,
     $1:numEspecificacaoSubCota::INT
 FROM @camara/despesas/parquet/
@@ -19,12 +19,12 @@ CREATE OR REPLACE TABLE despesas_deputados_raw (
     codTipoDocumento INT,
     dataDocumento DATE,
     numDocumento VARCHAR,
-    valorDocumento FLOAT,
+    valorDocumento NUMBER(12,2),
     urlDocumento VARCHAR,
     nomeFornecedor VARCHAR,
     cnpjCpfFornecedor VARCHAR,
-    valorLiquido FLOAT,
-    valorGlosa FLOAT,
+    valorLiquido NUMBER(12,2),
+    valorGlosa NUMBER(12,2),
     numRessarcimento VARCHAR,
     codLote INT,
     parcela INT,
@@ -40,7 +40,7 @@ CREATE OR REPLACE STORAGE INTEGRATION s3_integration_camara
   STORAGE_PROVIDER = 'S3'
   ENABLED = TRUE
   STORAGE_AWS_ROLE_ARN = 'arn:aws:iam::xxxxxxx:role/snowflake-listen'
-  STORAGE_ALLOWED_LOCATIONS = ('s3://learnsnowflakedbt-heitor/camara/despesas/incremental/');
+  STORAGE_ALLOWED_LOCATIONS = ('s3://learnsnowflakedbt-heitor/camara/despesas/dataset/');
 
 -- then grant usage on it to your regular role (if that role needs to reference it)
 GRANT USAGE ON INTEGRATION s3_integration_camara TO ROLE role_ingestao;
@@ -51,9 +51,10 @@ CREATE OR REPLACE FILE FORMAT parquet_format
   TYPE = PARQUET;
   
   -- Cria o stage externo que aponta para o S3
+  -- (dataset particionado ano=/mes= escrito pelas DAGs e pelos scripts de ingestão)
 CREATE OR REPLACE STAGE stage_despesas_s3
   STORAGE_INTEGRATION = s3_integration_camara
-  URL = 's3://learnsnowflakedbt-heitor/camara/despesas/incremental/'
+  URL = 's3://learnsnowflakedbt-heitor/camara/despesas/dataset/'
   FILE_FORMAT = parquet_format;
 
 
@@ -67,6 +68,7 @@ CREATE OR REPLACE PIPE pipe_despesas_s3
 AS
 COPY INTO despesas_deputados_raw
 FROM @stage_despesas_s3
+PATTERN = '.*[.]parquet'
 MATCH_BY_COLUMN_NAME = 'CASE_INSENSITIVE';
 
 
@@ -80,7 +82,11 @@ WHEN
   SYSTEM$STREAM_HAS_DATA('stream_despesas_raw')
 AS
 MERGE INTO raw.despesas AS target
-USING stream_despesas_raw AS source
+-- A compactação do dataset reescreve arquivos já carregados: uma linha por despesa no lote
+USING (
+  SELECT * FROM stream_despesas_raw
+  QUALIFY ROW_NUMBER() OVER (PARTITION BY deputado_id, codDocumento ORDER BY codLote DESC) = 1
+) AS source
   ON target.deputado_id = source.deputado_id AND target.cod_Documento = source.codDocumento
 WHEN MATCHED THEN
   -- Se a despesa já existe, atualiza os valores
@@ -120,6 +126,15 @@ WHEN NOT MATCHED THEN
   ALTER TASK task_merge_despesas RESUME;
 --ALTER TASK task_merge_despesas SUSPEND;
 
+-- Com a DAG carga_despesas (disparada pelos assets das partições gravadas) fazendo o MERGE direto do stage,
+-- só das partições alteradas (airflow/include/camara/warehouse.py), o pipe e a task ficam parados para não
+-- carregar os mesmos arquivos duas vezes:
+-- ALTER PIPE pipe_despesas_s3 SET PIPE_EXECUTION_PAUSED = TRUE;
+-- ALTER TASK task_merge_despesas SUSPEND;
+
+-- O alvo é clusterizado pelas partições que o MERGE poda (a carga_despesas também aplica a chave a cada execução)
+ALTER TABLE raw.despesas CLUSTER BY (ano, mes);
+
 
 DESC PIPE pipe_despesas_s3;
 DESCRIBE TASK raw.task_merge_despesas;